@@ -1,4 +1,5 @@
-from .aggregator import CodeAggregator, DirectoryTreeGenerator
+from .aggregator import CodeAggregator, DirectoryTreeGenerator, FileRecord
+from .scanner import DirectorySnapshot
 
 # Conditionally import TUI components based on platform
 import platform
@@ -36,17 +37,25 @@ from .formatters import (
 )
 from .config import ConfigManager
 
-import importlib.metadata
 
-try:
-    __version__ = importlib.metadata.version("promptprep")
-except importlib.metadata.PackageNotFoundError:
-    # Handle case where package is not installed (e.g., running from source)
-    __version__ = "0.0.0-dev"
+def __getattr__(name):
+    # importlib.metadata is slow to import, so the version is only looked up on request
+    if name == "__version__":
+        import importlib.metadata
+
+        try:
+            return importlib.metadata.version("promptprep")
+        except importlib.metadata.PackageNotFoundError:
+            # Handle case where package is not installed (e.g., running from source)
+            return "0.0.0-dev"
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
     "CodeAggregator",
     "DirectoryTreeGenerator",
+    "FileRecord",
+    "DirectorySnapshot",
     "select_files_interactive",
     "FileSelector",
     "BaseFormatter",
@@ -1,15 +1,180 @@
+import collections
+import functools
+import hashlib
+import itertools
+import mmap
 import os
-import subprocess
-import platform
-from typing import Optional, Set, Dict
-from tqdm import tqdm
-import ast
-import tokenize
+from typing import (
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 import io
 import warnings
-import tiktoken
-import difflib
-from .formatters import get_formatter, CustomTemplateFormatter
+from .cache import ProcessedFileCache
+from .comments import LineCounts, count_lines, strip_comments
+from .formatters import (
+    get_formatter,
+    BinaryRecordFormatter,
+    CustomTemplateFormatter,
+    HighlightedFormatter,
+    RecordFormatter,
+    TemplateFile,
+    TemplateFiles,
+)
+from .incremental import RunManifest
+from .matcher import PathMatcher
+from .metadata import CodebaseStats
+from .outline import OutlineCache, UnsupportedLanguageError, get_extractor
+from .profiling import NullProfiler
+from .scanner import DirectorySnapshot, ScannedFile
+from .writer import OutputWriter
+
+T = TypeVar("T")
+U = TypeVar("U")
+
+# tiktoken, tqdm, ast, difflib and the worker pools are imported where they're
+# used, so the CLI starts quickly when a run doesn't need them.
+
+# The aggregator a worker process renders files with, set up once per worker
+_worker_aggregator: Optional["CodeAggregator"] = None
+
+
+def _decode_source(raw: bytes) -> str:
+    """Decodes file bytes the way text-mode reading does, newlines included."""
+    return (
+        raw.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+    )
+
+
+# How much of a memory-mapped file is checked at a time
+_VERBATIM_CHUNK_SIZE = 1024 * 1024
+
+
+def _reads_verbatim(data: Union[bytes, mmap.mmap]) -> bool:
+    """Whether the bytes are the same as their decoded text, so need no decoding.
+
+    That's ASCII without carriage returns: decoding translates newlines and
+    may drop invalid UTF-8, but leaves everything else alone.
+    """
+    if isinstance(data, bytes):
+        return data.isascii() and b"\r" not in data
+    if data.find(b"\r") != -1:
+        return False
+    return all(
+        data[i : i + _VERBATIM_CHUNK_SIZE].isascii()
+        for i in range(0, len(data), _VERBATIM_CHUNK_SIZE)
+    )
+
+
+class FileRecord(NamedTuple):
+    """One file's part of an aggregation, as yielded by iter_files and iter_sections."""
+
+    path: str  # Relative to the aggregated directory
+    size: int  # Bytes on disk
+    mtime: float
+    tokens: Optional[int]  # None unless tokens are counted
+    content: str
+    lines: Optional[LineCounts] = None  # Only when metadata is collected
+
+
+class _RawSection(NamedTuple):
+    """A file section whose content goes to the output as the file's own bytes."""
+
+    before: str
+    data: Union[bytes, mmap.mmap]
+    after: str
+
+    def text(self) -> str:
+        """The whole section as text; the bytes are ASCII, so decoding is exact."""
+        try:
+            return self.before + self.data[:].decode("ascii") + self.after
+        finally:
+            if isinstance(self.data, mmap.mmap):
+                self.data.close()
+
+    def write_to(self, writer: OutputWriter) -> None:
+        writer.write(self.before)
+        writer.write_bytes(self.data)
+        writer.write(self.after)
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+
+class _LazyTemplateFiles(TemplateFiles):
+    """A custom template's files, processed only when the template reaches them.
+
+    A loop or ${FILES} processes the files on the worker pool in order and
+    holds only a few at a time; ${FILE_CONTENT:path} processes just that
+    file. The first full pass also adds each file's line counts to stats.
+    """
+
+    def __init__(
+        self,
+        aggregator: "CodeAggregator",
+        entries: List[ScannedFile],
+        stats: CodebaseStats,
+    ):
+        self.aggregator = aggregator
+        self.entries = {entry.rel_path: entry for entry in entries}
+        self.stats = stats
+        self.counted = False
+
+    def __getitem__(self, path: str) -> str:
+        return self.aggregator._process_for_template(self.entries[path].path)[1]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, path: object) -> bool:
+        return path in self.entries
+
+    def records(self, with_content: bool = True) -> Iterator[TemplateFile]:
+        entries = list(self.entries.values())
+        if not with_content:
+            for entry in entries:
+                yield TemplateFile(entry.rel_path, None, entry.size, entry.mtime)
+            return
+
+        from tqdm import tqdm
+
+        counting = not self.counted
+        for record in tqdm(
+            self.aggregator._iter_file_records(entries),
+            total=len(entries),
+            desc="Aggregating files",
+            unit="file",
+            leave=False,
+        ):
+            if counting:
+                self.stats.add(record.path, record.size, record.lines)
+            yield TemplateFile(
+                record.path, record.content, record.size, record.mtime, record.tokens
+            )
+        self.counted = True
+
+
+def _init_worker(aggregator: "CodeAggregator") -> None:
+    """Keeps a copy of the aggregator in a freshly started worker process."""
+    global _worker_aggregator
+    _worker_aggregator = aggregator
+
+
+def _run_in_worker(method_name: str, item):
+    """Runs one of the aggregator's rendering methods inside a worker process."""
+    return getattr(_worker_aggregator, method_name)(item)
 
 
 class DirectoryTreeGenerator:
@@ -35,52 +200,71 @@ class DirectoryTreeGenerator:
         self.exclude_files = exclude_files or set()
         self.programming_extensions = programming_extensions
 
-    def generate(self, start_path: str) -> str:
-        """Creates an ASCII representation of the directory structure starting from the given path."""
+    def generate(
+        self,
+        start_path: str,
+        snapshot: Optional[DirectorySnapshot] = None,
+        matcher: Optional[PathMatcher] = None,
+    ) -> str:
+        """Creates an ASCII representation of the directory structure starting from the given path.
+
+        Args:
+            start_path: The directory to draw
+            snapshot: A scan of start_path to reuse instead of walking it again
+            matcher: Compiled rules to filter files with, instead of this generator's own
+        """
         if not os.path.exists(start_path):
             raise FileNotFoundError(f"Directory not found: {start_path}")
 
+        if matcher is None:
+            matcher = PathMatcher(
+                self.exclude_dirs,
+                self.exclude_files,
+                self.include_files,
+                self.programming_extensions,
+            )
+        if snapshot is None:
+            snapshot = DirectorySnapshot.scan(start_path, matcher=matcher)
+
         tree = ""
-        for root, dirs, files in os.walk(start_path):
-            rel_path = os.path.relpath(root, start_path)
-            if rel_path == ".":
-                rel_path = ""
-            path_parts = rel_path.split(os.sep) if rel_path else []
-            level = len(path_parts)
+        for directory in snapshot.directories:
+            level = directory.depth
             indent = "│   " * level + ("├── " if level > 0 else "")
-            current_dir = (
-                os.path.basename(root)
-                if rel_path
-                else os.path.basename(start_path.rstrip(os.sep)) or start_path
-            )
-            if current_dir in self.exclude_dirs:
-                tree += f"{indent}{current_dir}/ [EXCLUDED]\n"
-                dirs[:] = []  # Skip this directory's contents
+            if directory.excluded:
+                tree += f"{indent}{directory.name}/ [EXCLUDED]\n"
                 continue
-            tree += f"{indent}{current_dir}/\n"
+            tree += f"{indent}{directory.name}/\n"
 
             # Filter files based on include_files, exclude_files, and programming_extensions
-            filtered_files = files
-            if self.include_files or self.exclude_files or self.programming_extensions:
-                filtered_files = []
-                for f in files:
-                    file_path = os.path.join(rel_path, f) if rel_path else f
-                    if f in self.exclude_files:
-                        continue
-                    if self.include_files and file_path not in self.include_files:
-                        continue
-                    if self.programming_extensions:
-                        _, ext = os.path.splitext(f)
-                        if ext.lower() not in self.programming_extensions:
-                            continue
-                    filtered_files.append(f)
-
-            for f in filtered_files:
-                tree += f"{'│   ' * (level + 1)}├── {f}\n"
+            for f in directory.files:
+                if matcher.selects(f.rel_path, f.name):
+                    tree += f"{'│   ' * (level + 1)}├── {f.name}\n"
         return tree
 
 
+class _MatcherRule:
+    """A rule set on CodeAggregator; replacing it recompiles the matcher."""
+
+    def __set_name__(self, owner, name):
+        self.name = "_" + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return getattr(obj, self.name)
+
+    def __set__(self, obj, value):
+        setattr(obj, self.name, value)
+        obj._matcher = None
+
+
 class CodeAggregator:
+    include_files = _MatcherRule()
+    exclude_dirs = _MatcherRule()
+    exclude_files = _MatcherRule()
+    programming_extensions = _MatcherRule()
+    use_gitignore = _MatcherRule()
+
     DEFAULT_PROGRAMMING_EXTENSIONS = {
         # General Programming Languages
         ".py",
@@ -156,6 +340,14 @@ class CodeAggregator:
     }
     DEFAULT_MAX_FILE_SIZE_MB = 100.0
     DEFAULT_TOKEN_MODEL = "cl100k_base"
+    EXECUTOR_TYPES = ("auto", "thread", "process")
+    # Files rendered together so their tokens can be counted in one batch
+    TOKEN_BATCH_SIZE = 32
+    # A file's size divided by this is the guess at its token count that
+    # decides which files a token budget renders ahead of time
+    BUDGET_BYTES_PER_TOKEN = 8
+    # Files copied through undecoded are memory-mapped from this size on
+    MMAP_THRESHOLD = 1024 * 1024
 
     def __init__(
         self,
@@ -176,9 +368,20 @@ class CodeAggregator:
         template_file: Optional[str] = None,
         incremental: bool = False,
         last_run_timestamp: Optional[float] = None,
+        jobs: int = 1,
+        executor: str = "auto",
+        read_ahead: int = 0,
+        use_cache: bool = False,
+        cache_dir: Optional[str] = None,
+        token_budget: Optional[int] = None,
+        priority_patterns: Optional[List[str]] = None,
+        rank_by_imports: bool = False,
+        use_gitignore: bool = False,
+        profiler: Optional[NullProfiler] = None,
     ):
         self.directory = directory or os.getcwd()
         self.output_file = output_file
+        self.use_gitignore = use_gitignore
         self.include_files = include_files or set()
         self.programming_extensions = (
             programming_extensions or self.DEFAULT_PROGRAMMING_EXTENSIONS
@@ -195,14 +398,34 @@ class CodeAggregator:
         self.summary_mode = summary_mode
         self.include_comments = include_comments
         self.include_metadata = collect_metadata
-        self.count_tokens = count_tokens
+        # Fitting a budget needs every section's token count
+        self.token_budget = token_budget
+        self.priority_patterns = priority_patterns or []
+        # Costs a read of every script before any file is rendered
+        self.rank_by_imports = rank_by_imports
+        self.count_tokens = count_tokens or token_budget is not None
         self.token_model = token_model
         self.output_format = output_format
         self.line_numbers = line_numbers
         self.template_file = template_file
         self.incremental = incremental
         self.last_run_timestamp = last_run_timestamp
+        self.jobs = max(1, jobs or 1)
+        if executor not in self.EXECUTOR_TYPES:
+            raise ValueError(
+                f"Unknown executor '{executor}'. Choose from: {', '.join(self.EXECUTOR_TYPES)}"
+            )
+        self.executor = executor
+        self.read_ahead = max(0, read_ahead or 0)
+        self.profiler = profiler or NullProfiler()
+        self.outlines = OutlineCache()
         self.file_mod_times: Dict[str, float] = {}
+        self.snapshot: Optional[DirectorySnapshot] = None
+        self.total_tokens = 0
+        self.section_records: List[dict] = []
+        self._token_counts: Dict[bytes, int] = {}
+        self.budget_levels: Dict[str, int] = {}
+        self.stats = CodebaseStats()
         self.metadata = {
             "total_files": 0,
             "total_lines": 0,
@@ -215,6 +438,8 @@ class CodeAggregator:
         self.tokenizer = None
         if self.count_tokens:
             try:
+                import tiktoken
+
                 self.tokenizer = tiktoken.get_encoding(self.token_model)
             except Exception as e:
                 warnings.warn(
@@ -230,48 +455,112 @@ class CodeAggregator:
             )
             self.formatter = get_formatter("plain", None)
 
+        # Processed output is only reused for identical content and settings
+        self.cache: Optional[ProcessedFileCache] = None
+        if use_cache or cache_dir:
+            self.cache = ProcessedFileCache(
+                cache_dir,
+                formatter=type(self.formatter).__name__,
+                output_format=self.output_format,
+                summary_mode=self.summary_mode,
+                include_comments=self.include_comments,
+                line_numbers=self.line_numbers,
+            )
+
+    @property
+    def matcher(self) -> PathMatcher:
+        """The include/exclude rules compiled for fast matching.
+
+        Compiled on first use and again whenever one of the rule sets is
+        replaced.
+        """
+        if self._matcher is None:
+            self._matcher = PathMatcher(
+                self.exclude_dirs,
+                self.exclude_files,
+                self.include_files,
+                self.programming_extensions,
+                self.use_gitignore,
+            )
+        return self._matcher
+
     def is_programming_file(self, filename: str) -> bool:
-        _, ext = os.path.splitext(filename)
-        return ext.lower() in self.programming_extensions
+        return self.matcher.is_programming_file(filename)
 
     def should_exclude(self, path: str) -> bool:
-        normalized_path = os.path.normpath(path)
-        parts = normalized_path.split(os.sep)
-        for part in parts[:-1]:
-            if part in self.exclude_dirs:
-                return True
-        if parts[-1] in self.exclude_files:
-            return True
-        return False
+        return self.matcher.excludes_path(path)
 
     def should_include(self, file_path: str) -> bool:
         if not self.include_files:
             return True
         rel_file_path = os.path.relpath(file_path, self.directory)
-        return rel_file_path in self.include_files
+        return self.matcher.is_included(rel_file_path)
+
+    def _scanned(self, file_path: str) -> Optional[ScannedFile]:
+        """The scan's record of a file, so its stat results can be reused."""
+        if self.snapshot is None:
+            return None
+        return self.snapshot.get(file_path)
 
     def is_file_size_within_limit(self, file_path: str) -> bool:
         """Check if the file size is within our configured limit."""
-        file_size_bytes = os.path.getsize(file_path)
+        entry = self._scanned(file_path)
+        file_size_bytes = entry.size if entry else os.path.getsize(file_path)
         file_size_mb = file_size_bytes / (1024 * 1024)  # Convert to MB
         return file_size_mb <= self.max_file_size_mb
 
     def count_text_tokens(self, text: str) -> int:
         """Count the number of tokens in a text string using our tokenizer."""
         if not self.tokenizer:
+            import tiktoken
+
             self.tokenizer = tiktoken.get_encoding(self.token_model)
 
         try:
-            tokens = self.tokenizer.encode(text)
+            with self.profiler.stage("tokenize"):
+                tokens = self.tokenizer.encode(text)
+            self.profiler.count("tokens_encoded", len(tokens))
             return len(tokens)
         except Exception as e:
             warnings.warn(f"Error counting tokens: {e}. Returning estimated count.")
             # Fallback to a rough approximation when tokenizer fails
             return len(text.split())
 
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        """Counts the tokens in many texts at once.
+
+        Counts are remembered by content hash, so repeated text (identical
+        files, common headers) is only encoded once per run. Falls back to
+        count_text_tokens when the tokenizer can't encode in batches.
+        """
+        digests = [hashlib.sha256(text.encode("utf-8")).digest() for text in texts]
+        pending = {}
+        for digest, text in zip(digests, texts):
+            if digest not in self._token_counts:
+                pending.setdefault(digest, text)
+
+        if pending:
+            pending_texts = list(pending.values())
+            try:
+                if self.tokenizer is None:
+                    raise AttributeError("no tokenizer loaded")
+                with self.profiler.stage("tokenize"):
+                    encoded = self.tokenizer.encode_ordinary_batch(
+                        pending_texts,
+                        num_threads=max(1, (os.cpu_count() or 1) // self.jobs),
+                    )
+                counts = [len(tokens) for tokens in encoded]
+                self.profiler.count("tokens_encoded", sum(counts))
+            except Exception:
+                counts = [self.count_text_tokens(text) for text in pending_texts]
+            self._token_counts.update(zip(pending, counts))
+
+        return [self._token_counts[digest] for digest in digests]
+
     def _get_file_mod_time(self, file_path: str) -> float:
         """Get the last modified time of a file."""
-        return os.path.getmtime(file_path)
+        entry = self._scanned(file_path)
+        return entry.mtime if entry else os.path.getmtime(file_path)
 
     def _is_file_changed(self, file_path: str) -> bool:
         """Check if a file has been modified since our last run."""
@@ -280,207 +569,1047 @@ class CodeAggregator:
         mod_time = self._get_file_mod_time(file_path)
         return mod_time > self.last_run_timestamp
 
+    def _keeps_run_manifest(self) -> bool:
+        """Incremental runs without a timestamp patch the previous output instead."""
+        return (
+            self.incremental
+            and self.last_run_timestamp is None
+            and self.token_budget is None
+            and not isinstance(
+                self.formatter, (CustomTemplateFormatter, RecordFormatter)
+            )
+        )
+
+    def _manifest_options(self) -> dict:
+        """The settings a previous output must share for its sections to be reused."""
+        return {
+            "directory": os.path.abspath(self.directory),
+            "formatter": type(self.formatter).__name__,
+            "output_format": self.output_format,
+            "summary_mode": self.summary_mode,
+            "include_comments": self.include_comments,
+            "line_numbers": self.line_numbers,
+            "count_tokens": self.count_tokens,
+            "token_model": self.token_model,
+        }
+
+    def scan(self) -> DirectorySnapshot:
+        """Walks the project directory once and keeps the result for this run."""
+        with self.profiler.stage("scan"):
+            self.snapshot = DirectorySnapshot.scan(self.directory, matcher=self.matcher)
+        if self.profiler.enabled:
+            listed = sum(not d.excluded for d in self.snapshot.directories)
+            files = len(self.snapshot)
+            self.profiler.count("directories_scanned", listed)
+            self.profiler.count("files_scanned", files)
+            # One listing per directory and one stat per file (DirectorySnapshot.scan)
+            self.profiler.count("syscalls.scandir", listed)
+            self.profiler.count("syscalls.stat", files)
+        return self.snapshot
+
+    def _select_files(
+        self, snapshot: DirectorySnapshot
+    ) -> Tuple[List[ScannedFile], List[Tuple[str, float]]]:
+        """Picks the programming files to aggregate from a scan.
+
+        Returns:
+            The files to include and (path, size in MB) pairs for files over the size limit
+        """
+        selected = []
+        skipped = []
+        max_size_bytes = self.max_file_size_mb * 1024 * 1024
+        for entry in snapshot.iter_files():
+            if not self.matcher.selects(entry.rel_path, entry.name):
+                continue
+            if entry.size > max_size_bytes:
+                skipped.append((entry.rel_path, entry.size / (1024 * 1024)))
+                continue
+            selected.append(entry)
+        return selected, skipped
+
+    def _files_to_process(
+        self, snapshot: DirectorySnapshot
+    ) -> Tuple[List[ScannedFile], List[Tuple[str, float]]]:
+        """The files this run covers: selected, within the size limit and,
+        for incremental runs, changed since the last one.
+
+        Returns:
+            The files to process and (path, size in MB) pairs for files over the size limit
+        """
+        with self.profiler.stage("select"):
+            selected_files, skipped_files_data = self._select_files(snapshot)
+            files_to_process = [
+                entry for entry in selected_files if self._is_file_changed(entry.path)
+            ]
+        self.profiler.count("files_selected", len(files_to_process))
+        self.profiler.count("files_too_large", len(skipped_files_data))
+        return files_to_process, skipped_files_data
+
+    def iter_sections(self) -> Iterator[FileRecord]:
+        """Yields each file's section of the output, in output order, as it's rendered.
+
+        The content is exactly what aggregate_code() would write for the file
+        (header included) in the configured format, without the tree,
+        metadata or skipped-files list around it. Sections are rendered
+        lazily, so only a few are held in memory at a time. With a token
+        budget, only the sections that fit are yielded.
+        """
+        entries, _ = self._files_to_process(self.scan())
+        if self.token_budget is not None:
+            sections = self._iter_budgeted_sections(entries, self.token_budget)
+        else:
+            sections = self._iter_file_sections(entries, None)
+        for entry, section, tokens, _, _, lines in sections:
+            if isinstance(section, _RawSection):
+                section = section.text()
+            yield FileRecord(
+                entry.rel_path,
+                entry.size,
+                entry.mtime,
+                tokens if self.count_tokens else None,
+                section,
+                lines,
+            )
+
+    def iter_files(self) -> Iterator[FileRecord]:
+        """Yields each file's processed content, in output order.
+
+        The content has comments stripped, is summarized and carries line
+        numbers as configured, but isn't wrapped in the output format: it's
+        the text a custom template's ${FILES} would get. Files are processed
+        lazily, so only a few are held in memory at a time.
+        """
+        entries, _ = self._files_to_process(self.scan())
+        yield from self._iter_file_records(entries)
+
+    def _iter_file_records(self, entries: List[ScannedFile]) -> Iterator[FileRecord]:
+        """Processes files on the worker pool, yielding their records in order."""
+        paths = [entry.path for entry in entries]
+        batches = [
+            paths[i : i + self.TOKEN_BATCH_SIZE]
+            for i in range(0, len(paths), self.TOKEN_BATCH_SIZE)
+        ]
+        results = itertools.chain.from_iterable(
+            self._map_files(self._process_record_batch, batches)
+        )
+        for entry, (content, tokens, lines) in zip(entries, results):
+            yield FileRecord(
+                entry.rel_path, entry.size, entry.mtime, tokens, content, lines
+            )
+
+    def _process_record_batch(
+        self, file_paths: List[str]
+    ) -> List[Tuple[str, Optional[int], Optional[LineCounts]]]:
+        """Processes a batch of files for their records.
+
+        The tokens of the whole batch are counted with a single batched
+        encode, as in _render_batch.
+
+        Returns:
+            For each file: its processed content, its token count (None when
+            tokens aren't counted) and its line counts
+        """
+        processed = [self._process_for_template(path) for path in file_paths]
+        contents = [content for _, content, _ in processed]
+        if self.count_tokens:
+            counts = self.count_tokens_batch(contents)
+        else:
+            counts = [None] * len(contents)
+        return [
+            (content, tokens, lines)
+            for (_, content, lines), tokens in zip(processed, counts)
+        ]
+
     def aggregate_code(self) -> str:
         """Brings together the directory tree and content of programming files into a single document."""
+        if isinstance(self.formatter, BinaryRecordFormatter):
+            raise ValueError(
+                "Binary output isn't text; use write_to_file or write_to_stream"
+            )
+        buffer = io.BytesIO()
+        self.write_to_stream(buffer)
+        return buffer.getvalue().decode("utf-8")
+
+    def write_to_stream(
+        self, stream: BinaryIO, previous_run: Optional[RunManifest] = None
+    ) -> None:
+        """Streams the aggregated document to a binary file object, section by section.
+
+        Only one file's content is held in memory at a time, so this works for
+        outputs far larger than the available RAM.
+
+        Args:
+            stream: Where to write, e.g. an open file or sys.stdout.buffer
+            previous_run: Manifest of an earlier output whose unchanged file
+                sections are copied instead of being processed again
+        """
+        with self.profiler.session():
+            self._write_document(stream, previous_run)
+
+    def _write_document(
+        self, stream: BinaryIO, previous_run: Optional[RunManifest]
+    ) -> None:
+        writer = OutputWriter(stream)
         is_custom_format = isinstance(self.formatter, CustomTemplateFormatter)
-        tree = self.tree_generator.generate(self.directory)
+        snapshot = self.scan()
+        with self.profiler.stage("tree"):
+            tree = self.tree_generator.generate(
+                self.directory, snapshot=snapshot, matcher=self.matcher
+            )
 
         if "Directory not found" in tree:
             error_message = f"Directory not found: {self.directory}"
-            return self.formatter.format_error(error_message)
-
-        # Find files to process
-        files_to_process = []
-        skipped_files_data = []
-        for root, dirs, files in os.walk(self.directory):
-            rel_path_for_exclusion_check = os.path.relpath(root, self.directory)
-            if rel_path_for_exclusion_check == ".":
-                rel_path_for_exclusion_check = ""
-
-            dirs[:] = [
-                d
-                for d in dirs
-                if d not in self.exclude_dirs
-                and not any(
-                    part in self.exclude_dirs
-                    for part in os.path.join(rel_path_for_exclusion_check, d).split(
-                        os.sep
-                    )
-                )
-            ]
+            writer.write(self.formatter.format_error(error_message))
+            return
 
-            current_dir = os.path.basename(root)
-            if current_dir in self.exclude_dirs:
-                continue
+        files_to_process, skipped_files_data = self._files_to_process(snapshot)
 
-            for file in files:
-                if not self.is_programming_file(file):
-                    continue
-                file_path = os.path.join(root, file)
-                rel_file_path = os.path.relpath(file_path, self.directory)
-                if self.should_exclude(rel_file_path) or not self.should_include(
-                    file_path
-                ):
-                    continue
+        if isinstance(self.formatter, RecordFormatter):
+            self._write_records(writer, tree, files_to_process, skipped_files_data)
+        elif is_custom_format:
+            self._write_custom_template(
+                writer, tree, files_to_process, skipped_files_data
+            )
+        else:
+            self._write_standard_format(
+                writer,
+                tree,
+                files_to_process,
+                skipped_files_data,
+                snapshot,
+                previous_run,
+            )
 
-                if not self.is_file_size_within_limit(file_path):
-                    skipped_files_data.append(
-                        (rel_file_path, os.path.getsize(file_path) / (1024 * 1024))
-                    )
-                    continue
+    def _write_records(
+        self,
+        writer: OutputWriter,
+        tree: str,
+        files_to_process: List[ScannedFile],
+        skipped_files_data: List[Tuple[str, float]],
+    ) -> None:
+        """Writes one record per file for the machine-readable formats.
 
-                if self._is_file_changed(file_path):
-                    files_to_process.append(file_path)
-
-        # Custom format processing
-        if is_custom_format:
-            aggregated_data = {
-                "directory_tree": tree,
-                "files_content": {},
-                "metadata": {},
-                "skipped_files": skipped_files_data,
-                "title": f"Code Aggregation - {os.path.basename(self.directory)}",
-            }
-            if self.include_metadata or self.count_tokens:
-                aggregated_data["metadata"] = self.collect_metadata()
-                if self.count_tokens:
-                    aggregated_data["metadata"]["token_model"] = self.token_model
+        Each file's record carries its processed content (as iter_files gives
+        it) with its path, language, size, modification time and, when
+        counting, its tokens. The metadata comes last, once it's known.
+        """
+        formatter = self.formatter
 
-            # Process files for the template
-            for file_path in tqdm(
-                files_to_process, desc="Aggregating files", unit="file", leave=False
-            ):
-                rel_file_path = os.path.relpath(file_path, self.directory)
-                try:
-                    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                        content = f.read()
-                        if not self.include_comments:
-                            content = "\n".join(
-                                line
-                                for line in content.splitlines()
-                                if not line.strip().startswith("#")
-                            )
-                        if self.summary_mode:
-                            content = self._extract_summary(content, file_path)
-
-                        if self.line_numbers:
-                            lines = content.splitlines()
-                            padding = len(str(len(lines)))
-                            content = "\n".join(
-                                f"{str(i).rjust(padding)} | {line}"
-                                for i, line in enumerate(lines, 1)
-                            )
-
-                        aggregated_data["files_content"][rel_file_path] = content
-                except Exception as e:
-                    aggregated_data["files_content"][
-                        rel_file_path
-                    ] = f"# Error reading file {rel_file_path}: {e}\n"
-
-            # Render the custom template
-            return self.formatter.render_template(
-                aggregated_data["directory_tree"],
-                aggregated_data["files_content"],
-                aggregated_data["metadata"],
-                aggregated_data["skipped_files"],
-                aggregated_data["title"],
+        def emit(record: dict) -> None:
+            with self.profiler.stage("write"):
+                writer.write_bytes(
+                    formatter.encode_record(record, writer.bytes_written)
+                )
+
+        writer.write_bytes(formatter.begin())
+        emit({"type": "tree", "tree": tree})
+        stats = CodebaseStats()
+        total_tokens = 0
+        for record in self._iter_file_records(files_to_process):
+            emit(
+                formatter.file_record(
+                    record.path,
+                    record.content,
+                    size=record.size,
+                    mtime=record.mtime,
+                    tokens=record.tokens,
+                )
             )
+            stats.add(record.path, record.size, record.lines)
+            total_tokens += record.tokens or 0
+        if skipped_files_data:
+            emit(formatter.skipped_record(skipped_files_data))
+        if self.include_metadata:
+            emit({"type": "metadata", **self._metadata_dict(stats, total_tokens)})
+        writer.write_bytes(formatter.end(writer.bytes_written))
+        self.total_tokens = total_tokens
+        self.stats = stats
+        self.profiler.count("bytes_written", writer.bytes_written)
 
-        # Standard format processing
-        else:
-            aggregated = ""
-            total_tokens = 0
-            metadata_dict = {}
-            if self.include_metadata or self.count_tokens:
-                metadata_dict = self.collect_metadata()
+    def _write_custom_template(
+        self,
+        writer: OutputWriter,
+        tree: str,
+        files_to_process: List[ScannedFile],
+        skipped_files_data: List[Tuple[str, float]],
+    ) -> None:
+        """Fills in the user's template, processing files as it gets to them.
+
+        The template is written out piece by piece as it's rendered, so
+        neither the document nor the files' contents are held in memory.
+        The metadata is only known once every file has been counted, so
+        whatever follows a ${METADATA} goes to a scratch file until then.
+        """
+        stats = CodebaseStats()
+        files = _LazyTemplateFiles(self, files_to_process, stats)
+        defer_metadata = self._collects_line_counts()
+        slot = self.formatter.METADATA_SLOT
+        # Offsets in the scratch file where the metadata goes
+        gaps: List[int] = []
+        spool = None
+        out = writer
+        try:
+            for piece in self.formatter.iter_render(
+                tree,
+                files,
+                None if defer_metadata else {},
+                skipped_files_data,
+                f"Code Aggregation - {os.path.basename(self.directory)}",
+            ):
+                if piece is slot:
+                    if spool is None:
+                        import tempfile
+
+                        spool = OutputWriter(tempfile.TemporaryFile())
+                    gaps.append(spool.bytes_written)
+                    out = spool
+                else:
+                    with self.profiler.stage("write"):
+                        out.write(piece)
+
+            if spool is not None:
+                if not files.counted:
+                    # The template didn't go through every file, but the
+                    # metadata describes them all
+                    for entry, lines in zip(
+                        files_to_process,
+                        self._map_files(
+                            self._line_counts,
+                            [entry.path for entry in files_to_process],
+                        ),
+                    ):
+                        stats.add(entry.rel_path, entry.size, lines)
+                metadata = stats.to_dict()
                 if self.count_tokens:
-                    metadata_dict["token_model"] = self.token_model
-                    metadata_dict["total_tokens"] = "[placeholder]"
+                    metadata["token_model"] = self.token_model
+                metadata_section = self.formatter.format_metadata(metadata)
+                spool.stream.flush()
+                with self.profiler.stage("write"):
+                    start = 0
+                    for gap in gaps:
+                        writer.copy_range(spool.stream, start, gap - start)
+                        writer.write(metadata_section)
+                        start = gap
+                    writer.copy_range(spool.stream, start, spool.bytes_written - start)
+        finally:
+            if spool is not None:
+                spool.stream.close()
+        self.stats = stats
+
+    def _line_counts(self, file_path: str) -> Optional[LineCounts]:
+        """Reads a file just to count its lines, for metadata the template didn't need the files for."""
+        try:
+            with self.profiler.stage("read"):
+                with open(file_path, "rb") as f:
+                    raw = f.read()
+        except OSError:
+            return None
+        self.profiler.count("files_read")
+        self.profiler.count("bytes_read", len(raw))
+        return self._count_source_lines(raw, file_path)
+
+    def _process_for_template(
+        self, file_path: str
+    ) -> Tuple[str, str, Optional[LineCounts]]:
+        """Reads and processes one file for a custom template.
+
+        Returns:
+            The file's relative path, its processed content and its line
+            counts (None when they aren't collected or the file couldn't be read)
+        """
+        rel_file_path = os.path.relpath(file_path, self.directory)
+        try:
+            with self.profiler.stage("read"):
+                with open(file_path, "rb") as f:
+                    raw = f.read()
+            self.profiler.count("files_read")
+            self.profiler.count("bytes_read", len(raw))
+            content, _, _ = self._load_processed(
+                file_path, self._prepare_template_content, raw
+            )
+            return rel_file_path, content, self._count_source_lines(raw, file_path)
+        except Exception as e:
+            return rel_file_path, f"# Error reading file {rel_file_path}: {e}\n", None
+
+    def _prepare_template_content(self, content: str, file_path: str) -> str:
+        """Applies comment stripping, summaries and line numbers for templates."""
+        if not self.include_comments:
+            with self.profiler.stage("comments"):
+                content = strip_comments(content, file_path)
+        if self.summary_mode:
+            with self.profiler.stage("summary"):
+                content = self._extract_summary(content, file_path)
+
+        if self.line_numbers:
+            lines = content.splitlines()
+            padding = len(str(len(lines)))
+            content = "\n".join(
+                f"{str(i).rjust(padding)} | {line}" for i, line in enumerate(lines, 1)
+            )
+        return content
 
-                if self.include_metadata:
-                    metadata_section = self.formatter.format_metadata(metadata_dict)
-                    aggregated += metadata_section + "\n\n"
-                    if self.count_tokens:
-                        metadata_tokens = self.count_text_tokens(metadata_section)
-                        total_tokens += metadata_tokens
+    def _write_standard_format(
+        self,
+        writer: OutputWriter,
+        tree: str,
+        files_to_process: List[ScannedFile],
+        skipped_files_data: List[Tuple[str, float]],
+        snapshot: DirectorySnapshot,
+        previous_run: Optional[RunManifest] = None,
+    ) -> None:
+        """Writes the metadata, tree, files and skipped list one section at a time.
 
-            tree_section = self.formatter.format_directory_tree(tree)
-            aggregated += tree_section
-            if self.count_tokens:
-                tree_tokens = self.count_text_tokens(tree_section)
-                total_tokens += tree_tokens
+        Sections of files that haven't changed since previous_run are copied
+        straight from the previous output. The byte range of every file section
+        is kept in self.section_records for the next run's manifest.
+        """
+        title = f"Code Aggregation - {os.path.basename(self.directory)}"
+        has_html_wrapper = hasattr(self.formatter, "get_html_header")
+        if has_html_wrapper:
+            writer.write(self.formatter.get_html_header(title))
+
+        total_tokens = 0
+        # The metadata describes the files as they're written, so it's only
+        # known once the body is done: the body goes to a scratch file and the
+        # metadata is written in front of it
+        defer_metadata = self.include_metadata
+        stats = CodebaseStats()
+        reserved_tokens = 0
+        if defer_metadata and self.token_budget is not None:
+            # Set tokens aside for the metadata before its counts are known
+            reserved_tokens = self.count_text_tokens(
+                self.formatter.format_metadata(
+                    self._metadata_dict(
+                        CodebaseStats.upper_bound(files_to_process),
+                        self.token_budget,
+                    )
+                )
+            )
+            total_tokens += reserved_tokens
 
-            for file_path in tqdm(
-                files_to_process, desc="Aggregating files", unit="file", leave=False
-            ):
-                rel_file_path = os.path.relpath(file_path, self.directory)
-                header = self.formatter.format_file_header(rel_file_path)
-                aggregated += header
-                if self.count_tokens:
-                    total_tokens += self.count_text_tokens(header)
+        from tqdm import tqdm
 
-                try:
-                    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                        content = f.read()
-
-                        if not self.include_comments:
-                            processed_lines = []
-                            for line in content.splitlines():
-                                code_part = line.split("#", 1)[0]
-                                if code_part.strip() or not line.strip():
-                                    processed_lines.append(code_part.rstrip())
-                            content = "\n".join(processed_lines)
-
-                        if self.summary_mode:
-                            content = self._extract_summary(content, file_path)
-
-                        formatted_content = self.formatter.format_code_content(
-                            content, file_path
-                        )
+        if defer_metadata:
+            import tempfile
 
-                        if self.line_numbers:
-                            lines = formatted_content.splitlines()
-                            padding = len(str(len(lines)))
-                            formatted_content = "\n".join(
-                                f"{str(i).rjust(padding)} | {line}"
-                                for i, line in enumerate(lines, 1)
-                            )
-
-                        if self.count_tokens:
-                            file_tokens = self.count_text_tokens(formatted_content)
-                            total_tokens += file_tokens
-
-                        aggregated += formatted_content
-                except Exception as e:
-                    error_msg = f"Error reading file {rel_file_path}: {e}"
-                    formatted_error = self.formatter.format_error(error_msg)
-                    aggregated += formatted_error
-                    if self.count_tokens:
-                        total_tokens += self.count_text_tokens(formatted_error)
+            body = OutputWriter(tempfile.TemporaryFile())
+        else:
+            body = writer
+        previous_output = None
+        if previous_run is not None:
+            try:
+                previous_output = open(previous_run.output_file, "rb")
+            except OSError:
+                previous_run = None
+        section_records = []
+        try:
+            tree_section = self.formatter.format_directory_tree(tree)
+            body.write(tree_section)
+            if self.count_tokens:
+                total_tokens += self.count_text_tokens(tree_section)
 
+            skipped_section = ""
             if skipped_files_data:
                 skipped_section = self.formatter.format_skipped_files(
                     [(path, size_mb) for path, size_mb in skipped_files_data]
                 )
-                aggregated += skipped_section
                 if self.count_tokens:
                     total_tokens += self.count_text_tokens(skipped_section)
 
-            if self.count_tokens and "[placeholder]" in aggregated:
-                formatted_token_count = f"{total_tokens:,}"
-                aggregated = aggregated.replace("[placeholder]", formatted_token_count)
+            if self.token_budget is not None:
+                if total_tokens > self.token_budget:
+                    warnings.warn(
+                        f"The directory tree, skipped-files list and metadata need up "
+                        f"to {total_tokens:,} tokens, more than the token budget of "
+                        f"{self.token_budget:,}, so no file sections fit."
+                    )
+                sections = self._iter_budgeted_sections(
+                    files_to_process, self.token_budget - total_tokens
+                )
+            else:
+                sections = self._iter_file_sections(files_to_process, previous_run)
+
+            for entry, section, section_tokens, digest, reused, lines in tqdm(
+                sections,
+                total=len(files_to_process),
+                desc="Aggregating files",
+                unit="file",
+                leave=False,
+            ):
+                start = body.bytes_written
+                with self.profiler.stage("write"):
+                    if reused is not None:
+                        body.copy_range(
+                            previous_output,
+                            reused["start"],
+                            reused["end"] - reused["start"],
+                        )
+                        self.profiler.count("sections_reused")
+                    elif isinstance(section, _RawSection):
+                        section.write_to(body)
+                    else:
+                        body.write(section)
+                total_tokens += section_tokens
+                stats.add(entry.name, entry.size, lines)
+                section_records.append(
+                    {
+                        "path": entry.rel_path,
+                        "size": entry.size,
+                        # Sections that failed to read never match, so they're retried
+                        "mtime": entry.mtime if digest else None,
+                        "hash": digest,
+                        "start": start,
+                        "end": body.bytes_written,
+                        "tokens": section_tokens,
+                        "lines": list(lines) if lines is not None else None,
+                    }
+                )
+
+            body.write(skipped_section)
+
+            if defer_metadata:
+                if self.count_tokens:
+                    total_tokens = self._total_with_metadata(
+                        stats, total_tokens - reserved_tokens
+                    )
+                metadata = self._metadata_dict(stats, total_tokens)
+                writer.write(self.formatter.format_metadata(metadata) + "\n\n")
+                body_offset = writer.bytes_written
+                for record in section_records:
+                    record["start"] += body_offset
+                    record["end"] += body_offset
+                body.stream.seek(0)
+                with self.profiler.stage("write"):
+                    writer.copy_from(body.stream)
+        finally:
+            if defer_metadata:
+                body.stream.close()
+            if previous_output is not None:
+                previous_output.close()
+
+        self.total_tokens = total_tokens
+        self.section_records = section_records
+        self.stats = stats
+        if has_html_wrapper:
+            writer.write(self.formatter.get_html_footer())
+        self.profiler.count("bytes_written", writer.bytes_written)
+
+    def _iter_file_sections(
+        self,
+        entries: List[ScannedFile],
+        previous_run: Optional[RunManifest],
+    ) -> Iterator[
+        Tuple[
+            ScannedFile,
+            Optional[str],
+            int,
+            Optional[str],
+            Optional[dict],
+            Optional[LineCounts],
+        ]
+    ]:
+        """Yields (entry, section, tokens, source hash, reused record, line counts) in order.
+
+        Files the previous run already rendered come back with section set to
+        None and the previous run's record; everything else is rendered.
+        """
+        reusable = {}
+        if previous_run is not None:
+            for entry in entries:
+                record = previous_run.find_unchanged(entry)
+                # Sections from runs without metadata have no line counts
+                if record is not None and (
+                    record.get("lines") is not None or not self._collects_line_counts()
+                ):
+                    reusable[entry.rel_path] = record
+
+        stale = [entry.path for entry in entries if entry.rel_path not in reusable]
+        # Batching only pays off when counting tokens or sending work to other
+        # processes, and must still leave enough batches to keep every worker busy
+        batch_size = 1
+        if self.count_tokens or (self.jobs > 1 and self._uses_processes()):
+            batch_size = max(
+                1, min(self.TOKEN_BATCH_SIZE, len(stale) // (self.jobs * 2))
+            )
+        rendered = self._render_files(stale, batch_size)
+        for entry in entries:
+            record = reusable.get(entry.rel_path)
+            if record is not None:
+                lines = record.get("lines")
+                yield (
+                    entry,
+                    None,
+                    record["tokens"],
+                    record["hash"],
+                    record,
+                    LineCounts(*lines) if lines is not None else None,
+                )
+            else:
+                section, tokens, digest, lines = next(rendered)
+                yield entry, section, tokens, digest, None, lines
+
+    def _iter_budgeted_sections(
+        self, entries: List[ScannedFile], budget: int
+    ) -> Iterator[
+        Tuple[ScannedFile, str, int, Optional[str], None, Optional[LineCounts]]
+    ]:
+        """Yields the sections that fit in budget, in the usual output order.
+
+        Files are visited best-first (see budget.rank_files). Each one gets the
+        most detail that still fits: its full content, then its summary (Python
+        files only), then just its header. Files whose header doesn't fit are
+        left out. Every decision is made on real token counts.
+
+        A guess from each file's size decides which full renders run ahead on
+        the worker pool: files queued for them count against the budget at
+        their guessed cost, so few prefetched renders go unused. A file the
+        guess passed over is rendered when it's reached, if its header fits.
+        """
+        from .budget import rank_files
+
+        ranked = rank_files(entries, self.priority_patterns, self.rank_by_imports)
+        remaining = budget
+        # (entry, guess) for each ranked file the prefetch has got to, with a
+        # guess of None for files it passed over
+        decided = collections.deque()
+        # Guessed cost of the renders prefetched and of those used so far.
+        # With read_ahead the prefetch runs on another thread, so each side
+        # keeps its own total.
+        queued = used = 0
+
+        def prefetch_paths() -> Iterator[str]:
+            nonlocal queued
+            for entry in ranked:
+                guess = self._estimate_tokens(entry)
+                if guess > remaining - (queued - used):
+                    decided.append((entry, None))
+                    continue
+                decided.append((entry, guess))
+                queued += guess
+                yield entry.path
+
+        prefetched = self._render_files(prefetch_paths(), self.TOKEN_BATCH_SIZE)
+        rendered = collections.deque()
+        chosen = {}
+        levels = collections.Counter()
+        while remaining > 0:
+            if not decided:
+                # Advancing the prefetch decides on more files
+                rendered.extend(itertools.islice(prefetched, 1))
+                if not decided:
+                    break
+            entry, guess = decided.popleft()
+            full = None
+            if guess is not None:
+                if not rendered:
+                    rendered.append(next(prefetched))
+                full = rendered.popleft()
+                used += guess
+
+            # Every level includes the header, so it bounds them all
+            header = self.formatter.format_file_header(entry.rel_path)
+            header_tokens = self.count_tokens_batch([header])[0]
+            if header_tokens > remaining:
+                levels["omitted"] += 1
+                continue
+            if full is None:
+                full = self._render_batch([entry.path])[0]
+
+            section, tokens, digest, lines = full
+            level = "full"
+            if tokens > remaining:
+                section, tokens, level = self._render_reduced(
+                    entry, header, header_tokens, remaining
+                )
+            levels[level] += 1
+            chosen[entry.rel_path] = (section, tokens, digest, lines)
+            remaining -= tokens
+
+        levels["omitted"] += len(entries) - sum(levels.values())
+        self.budget_levels = dict(levels)
+        for entry in entries:
+            if entry.rel_path in chosen:
+                section, tokens, digest, lines = chosen[entry.rel_path]
+                yield entry, section, tokens, digest, None, lines
+
+    def _estimate_tokens(self, entry: ScannedFile) -> int:
+        """A rough guess at what a file costs in full, from its size alone."""
+        if self.summary_mode:
+            # A summary's size has little to do with the file's
+            return 0
+        return entry.size // self.BUDGET_BYTES_PER_TOKEN
+
+    def _render_reduced(
+        self, entry: ScannedFile, header: str, header_tokens: int, remaining: int
+    ) -> Tuple[str, int, str]:
+        """Renders a file that didn't fit in full as a summary or a bare header.
+
+        Args:
+            entry: The file
+            header: Its header, which fits in remaining
+            header_tokens: The header's token count
+            remaining: Tokens left in the budget
+
+        Returns:
+            The section, its token count and the level used ("summary" or
+            "header")
+        """
+        if get_extractor(entry.name) and not self.summary_mode:
+            try:
+                summary, _, _ = self._load_processed(entry.path, self._format_summary)
+            except Exception:
+                summary = None
+            if summary and summary.strip():
+                summary_tokens = header_tokens + self.count_tokens_batch([summary])[0]
+                if summary_tokens <= remaining:
+                    return header + summary, summary_tokens, "summary"
+
+        return header, header_tokens, "header"
+
+    def _render_files(
+        self, file_paths: Iterable[str], batch_size: int
+    ) -> Iterator[Tuple[str, int, Optional[str], Optional[LineCounts]]]:
+        """Renders files batch_size at a time on the worker pool, yielding results in order.
+
+        file_paths may be a lazy iterator; it's only advanced as far as the
+        batches in flight need.
+
+        With read_ahead set, reading is a stage of its own: up to read_ahead
+        files are fetched in the background (see readahead.read_ahead) while
+        earlier ones are formatted, so slow storage is kept busy.
+        """
+        if not self.read_ahead:
+            if isinstance(file_paths, list):
+                batches = [
+                    file_paths[i : i + batch_size]
+                    for i in range(0, len(file_paths), batch_size)
+                ]
+            else:
+                paths = iter(file_paths)
+                batches = iter(lambda: list(itertools.islice(paths, batch_size)), [])
+            return itertools.chain.from_iterable(
+                self._map_files(self._render_batch, batches)
+            )
+
+        from .readahead import read_ahead
+
+        sources = read_ahead(file_paths, self._read_for_render, depth=self.read_ahead)
+        batches = iter(lambda: list(itertools.islice(sources, batch_size)), [])
+        return itertools.chain.from_iterable(
+            self._map_files(self._render_prefetched, batches)
+        )
+
+    def _uses_processes(self) -> bool:
+        """Whether the worker pool is made of processes.
+
+        "auto" picks processes when formatting is CPU-bound Python that
+        threads can't run in parallel (syntax highlighting and summaries),
+        and threads otherwise.
+        """
+        if self.executor == "auto":
+            return self.summary_mode or (
+                isinstance(self.formatter, HighlightedFormatter)
+                and self.formatter.pygments_formatter is not None
+            )
+        return self.executor == "process"
+
+    def _map_files(self, func: Callable[[U], T], items: Iterable[U]) -> Iterator[T]:
+        """Applies func to each file (or batch of files), yielding results in order.
+
+        With jobs > 1 the work runs on a thread or process pool. Only a small
+        window of items is in flight at once, so memory stays bounded no matter
+        how many files there are. items may be a lazy iterator.
+        """
+        if self.jobs <= 1 or (isinstance(items, list) and len(items) < 2):
+            for item in items:
+                yield func(item)
+            return
+
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        if self._uses_processes():
+            pool = ProcessPoolExecutor(
+                max_workers=self.jobs,
+                initializer=_init_worker,
+                initargs=(self,),
+            )
+            submit = functools.partial(pool.submit, _run_in_worker, func.__name__)
+        else:
+            pool = ThreadPoolExecutor(max_workers=self.jobs)
+            submit = functools.partial(pool.submit, func)
+
+        with pool:
+            remaining = iter(items)
+            pending = collections.deque(
+                submit(item) for item in itertools.islice(remaining, self.jobs * 2)
+            )
+            while pending:
+                result = pending.popleft().result()
+                for item in itertools.islice(remaining, 1):
+                    pending.append(submit(item))
+                yield result
+
+    def __getstate__(self) -> dict:
+        """Leaves out per-run state when the aggregator is sent to worker processes."""
+        state = self.__dict__.copy()
+        state["snapshot"] = None
+        state["tokenizer"] = None  # Reloaded lazily in the worker
+        state["profiler"] = NullProfiler()  # Timings can't come back from workers
+        return state
+
+    def _render_prefetched(
+        self, batch: List[Tuple[str, Union[bytes, mmap.mmap, Exception]]]
+    ) -> List[Tuple[str, int, Optional[str], Optional[LineCounts]]]:
+        """Renders a batch of (path, bytes or read error) pairs that were read ahead."""
+        return self._render_batch(
+            [path for path, _ in batch], [source for _, source in batch]
+        )
+
+    def _render_batch(
+        self,
+        file_paths: List[str],
+        sources: Optional[List[Union[bytes, mmap.mmap, Exception]]] = None,
+    ) -> List[Tuple[str, int, Optional[str], Optional[LineCounts]]]:
+        """Reads and formats a batch of files.
+
+        The tokens of every header and body in the batch are counted with a
+        single batched encode, so the tokenizer can spread the work over its
+        own threads.
+
+        When the formatter would use a file's content unchanged and the bytes
+        are plain ASCII, the section carries the raw bytes (memory-mapped for
+        large files) and they're written out without being decoded.
+
+        Args:
+            file_paths: The files to render
+            sources: Their bytes (or the error reading them) if they've
+                already been read, otherwise they're read here
+
+        Returns:
+            For each file: its section, its token count, when a run manifest
+            is kept the hash of the bytes that were rendered, and when metadata
+            is collected its line counts (both None on read errors)
+        """
+        headers, contents, known_tokens, cache_keys, digests = [], [], [], [], []
+        line_counts = []
+        for index, file_path in enumerate(file_paths):
+            rel_file_path = os.path.relpath(file_path, self.directory)
+            headers.append(self.formatter.format_file_header(rel_file_path))
+            digest = None
+            lines = None
+            affixes = (
+                self.formatter.verbatim_affixes(rel_file_path)
+                if self._copies_content()
+                else None
+            )
+            try:
+                if sources is None:
+                    raw = self._read_for_render(file_path)
+                else:
+                    raw = sources[index]
+                    if isinstance(raw, Exception):
+                        raise raw
+                if self._keeps_run_manifest():
+                    digest = hashlib.sha256(raw).hexdigest()
+                lines = self._count_source_lines(raw, file_path)
+                if affixes is not None and _reads_verbatim(raw):
+                    content, tokens, key = (
+                        _RawSection(affixes[0], raw, affixes[1]),
+                        0,
+                        None,
+                    )
+                    self.profiler.count("files_passed_through")
+                else:
+                    if isinstance(raw, mmap.mmap):
+                        with raw:
+                            raw = raw[:]
+                    content, tokens, key = self._load_processed(
+                        file_path, self._format_content, raw
+                    )
+            except Exception as e:
+                digest = lines = None
+                error_msg = f"Error reading file {rel_file_path}: {e}"
+                content, tokens, key = (
+                    self.formatter.format_error(error_msg),
+                    None,
+                    None,
+                )
+            contents.append(content)
+            known_tokens.append(tokens)
+            cache_keys.append(key)
+            digests.append(digest)
+            line_counts.append(lines)
+
+        if not self.count_tokens:
+            return [
+                (
+                    (
+                        content._replace(before=header + content.before)
+                        if isinstance(content, _RawSection)
+                        else header + content
+                    ),
+                    0,
+                    digest,
+                    lines,
+                )
+                for header, content, digest, lines in zip(
+                    headers, contents, digests, line_counts
+                )
+            ]
+
+        uncounted = [i for i, tokens in enumerate(known_tokens) if tokens is None]
+        counts = self.count_tokens_batch(headers + [contents[i] for i in uncounted])
+        for i, tokens in zip(uncounted, counts[len(headers) :]):
+            known_tokens[i] = tokens
+            if cache_keys[i] is not None:
+                self.cache.add_tokens(
+                    cache_keys[i], contents[i], self.token_model, tokens
+                )
 
-            if hasattr(self.formatter, "get_full_html"):
-                title = f"Code Aggregation - {os.path.basename(self.directory)}"
-                aggregated = self.formatter.get_full_html(aggregated, title)
+        return [
+            (header + content, header_tokens + content_tokens, digest, lines)
+            for header, content, header_tokens, content_tokens, digest, lines in zip(
+                headers, contents, counts, known_tokens, digests, line_counts
+            )
+        ]
+
+    def _collects_line_counts(self) -> bool:
+        """Whether files' lines are counted for the metadata as they're rendered.
+
+        Custom templates have always had the stats when counting tokens.
+        """
+        if isinstance(self.formatter, CustomTemplateFormatter):
+            return self.include_metadata or self.count_tokens
+        return self.include_metadata
+
+    def _count_source_lines(
+        self, raw: Union[bytes, mmap.mmap], file_path: str
+    ) -> Optional[LineCounts]:
+        """Counts the lines of bytes already read, if metadata is collected."""
+        if not self._collects_line_counts():
+            return None
+        with self.profiler.stage("metadata"):
+            return count_lines(_decode_source(raw[:]), file_path)
+
+    def _copies_content(self) -> bool:
+        """Whether file content reaches the formatter unchanged (no stripping,
+        summaries, line numbers or token counts need the decoded text)."""
+        return (
+            self.include_comments
+            and not self.summary_mode
+            and not self.line_numbers
+            and not self.count_tokens
+        )
+
+    def _read_for_render(self, file_path: str) -> Union[bytes, mmap.mmap]:
+        """Reads a file for _render_batch, mapping it if its bytes may be copied as they are."""
+        mappable = (
+            self._copies_content()
+            and self.formatter.verbatim_affixes(
+                os.path.relpath(file_path, self.directory)
+            )
+            is not None
+        )
+        with self.profiler.stage("read"):
+            raw = self._read_source(file_path, mappable=mappable)
+        self.profiler.count("files_read")
+        self.profiler.count("bytes_read", len(raw))
+        return raw
+
+    def _read_source(
+        self, file_path: str, mappable: bool = False
+    ) -> Union[bytes, mmap.mmap]:
+        """Reads a file's bytes, or maps large files into memory if mappable.
+
+        Maps can't be sent between processes, so a process pool always reads.
+        """
+        with open(file_path, "rb") as f:
+            if (
+                mappable
+                and (self.jobs <= 1 or not self._uses_processes())
+                and os.fstat(f.fileno()).st_size >= self.MMAP_THRESHOLD
+            ):
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return f.read()
+
+    def _format_summary(self, content: str, file_path: str) -> str:
+        """Formats a file's summary, whether or not summary mode is on."""
+        return self._format_content(content, file_path, summarize=True)
+
+    def _format_content(
+        self, content: str, file_path: str, summarize: bool = False
+    ) -> str:
+        """Applies comment stripping, summaries, formatting and line numbers."""
+        if not self.include_comments:
+            with self.profiler.stage("comments"):
+                content = strip_comments(content, file_path)
+
+        if self.summary_mode or summarize:
+            with self.profiler.stage("summary"):
+                content = self._extract_summary(content, file_path)
+
+        with self.profiler.stage("format"):
+            formatted_content = self.formatter.format_code_content(content, file_path)
+
+            if self.line_numbers:
+                lines = formatted_content.splitlines()
+                padding = len(str(len(lines)))
+                formatted_content = "\n".join(
+                    f"{str(i).rjust(padding)} | {line}"
+                    for i, line in enumerate(lines, 1)
+                )
+        return formatted_content
+
+    def _load_processed(
+        self,
+        file_path: str,
+        process: Callable[[str, str], str],
+        raw: Optional[bytes] = None,
+    ) -> Tuple[str, Optional[int], Optional[str]]:
+        """Reads a file and runs process on its text, going through the cache if enabled.
+
+        Args:
+            file_path: The file to process
+            process: Turns the decoded text into the output for this file
+            raw: The file's bytes, if the caller has already read them
 
-            return aggregated
+        Returns:
+            The processed text, its token count if the cache already knows it,
+            and the cache key (None when caching is off)
+        """
+        if raw is None:
+            with self.profiler.stage("read"):
+                with open(file_path, "rb") as f:
+                    raw = f.read()
+            self.profiler.count("files_read")
+            self.profiler.count("bytes_read", len(raw))
+
+        key = None
+        if self.cache is not None:
+            with self.profiler.stage("cache"):
+                key = self.cache.make_key(
+                    raw, process.__name__, os.path.basename(file_path)
+                )
+                entry = self.cache.get(key)
+            if entry is not None:
+                self.profiler.count("cache_hits")
+                return entry["content"], entry["tokens"].get(self.token_model), key
+            self.profiler.count("cache_misses")
+
+        text = process(_decode_source(raw), file_path)
+        if key is not None:
+            with self.profiler.stage("cache"):
+                self.cache.put(key, {"content": text, "tokens": {}})
+        return text, None, key
 
     def write_to_file(
         self, content: Optional[str] = None, filename: Optional[str] = None
     ) -> None:
-        """Writes the aggregated content to a file with appropriate extension based on format."""
-        content = content or self.aggregate_code()
+        """Writes the aggregated content to a file with appropriate extension based on format.
+
+        When no content is given, the document is streamed straight to disk
+        instead of being built in memory first.
+        """
         filename = filename or self.output_file
 
         # Add HTML extension if needed
@@ -491,6 +1620,9 @@ class CodeAggregator:
             root, _ = os.path.splitext(filename)
             filename = f"{root}.html"
 
+        if self.output_format == "jsonl" and not filename.lower().endswith(".jsonl"):
+            filename = f"{os.path.splitext(filename)[0]}.jsonl"
+
         # Add Markdown extension if needed
         if self.output_format == "markdown" and not filename.lower().endswith(
             (".md", ".markdown")
@@ -504,16 +1636,52 @@ class CodeAggregator:
             if output_dir and not os.path.exists(output_dir):
                 os.makedirs(output_dir)
 
-            with open(filename, "w", encoding="utf-8") as f:
-                f.write(content)
+            if content:
+                with open(filename, "w", encoding="utf-8") as f:
+                    f.write(content)
+            else:
+                self._stream_to_file(filename)
 
             # Update the output_file attribute to match the actual filename used
             self.output_file = filename
+        except FileNotFoundError:
+            # A missing source directory is not a write error
+            raise
         except IOError as e:
             raise IOError(f"Error writing to file {filename}: {e}")
 
+    def _stream_to_file(self, filename: str) -> None:
+        """Streams the document into a scratch file, then moves it into place.
+
+        Readers never see a half-written output, and the previous output (if it
+        lives inside the scanned directory) is read as it was before this run.
+        """
+        previous_run = None
+        if self._keeps_run_manifest():
+            previous_run = RunManifest.load(filename, self._manifest_options())
+
+        tmp_filename = f"{filename}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_filename, "wb") as f:
+                self.write_to_stream(f, previous_run)
+            os.replace(tmp_filename, filename)
+        except BaseException:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+            raise
+
+        if self._keeps_run_manifest():
+            RunManifest(
+                filename,
+                self._manifest_options(),
+                self.section_records,
+            ).save()
+
     def copy_to_clipboard(self, content: Optional[str] = None) -> bool:
         """Copies the content to clipboard, with platform-specific handling."""
+        import platform
+        import subprocess
+
         content = content or self.aggregate_code()
         try:
             system = platform.system()
@@ -552,43 +1720,60 @@ class CodeAggregator:
             print(f"Error copying to clipboard: {e}")
             return False
 
-    def collect_metadata(self) -> dict:
-        """Gathers stats about the codebase like lines of code and comment ratio."""
-        total_lines = 0
-        comment_lines = 0
-        code_files = 0
+    def collect_metadata(self, snapshot: Optional[DirectorySnapshot] = None) -> dict:
+        """Gathers stats about the codebase like lines of code and comment ratio.
 
-        for root, _, files in os.walk(self.directory):
-            for file in files:
-                if not self.is_programming_file(file):
-                    continue
-                file_path = os.path.join(root, file)
-                rel_file_path = os.path.relpath(file_path, self.directory)
-                if self.should_exclude(rel_file_path) or not self.should_include(
-                    file_path
-                ):
-                    continue
+        Output runs collect the same stats as they write each file; this is
+        for getting them on their own. Only the files an output would include
+        are counted, so files over the size limit are left out.
 
-                code_files += 1
-                try:
-                    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                        lines = f.readlines()
-                        total_lines += len(lines)
-                        comment_lines += sum(
-                            1 for line in lines if line.strip().startswith("#")
-                        )
-                except Exception:
-                    pass
+        Args:
+            snapshot: A scan of the project to reuse instead of walking it again
+        """
+        if snapshot is None:
+            snapshot = self.scan()
 
-        comment_ratio = (comment_lines / total_lines) if total_lines else 0
-        return {
-            "total_lines": total_lines,
-            "comment_lines": comment_lines,
-            "comment_ratio": comment_ratio,
-            "code_files": code_files,
-        }
+        stats = CodebaseStats()
+        for entry in self._select_files(snapshot)[0]:
+            try:
+                with open(entry.path, "rb") as f:
+                    raw = f.read()
+            except OSError:
+                continue
+            stats.add(
+                entry.name, entry.size, count_lines(_decode_source(raw), entry.name)
+            )
+        return stats.to_dict()
+
+    def _total_with_metadata(self, stats: CodebaseStats, body_tokens: int) -> int:
+        """The output's token count once the metadata, which reports it, is added.
+
+        The metadata's own size depends on the total it shows, so the count is
+        repeated until the two agree (almost always at once).
+        """
+        total_tokens = body_tokens
+        for _ in range(3):
+            metadata_tokens = self.count_text_tokens(
+                self.formatter.format_metadata(self._metadata_dict(stats, total_tokens))
+            )
+            if body_tokens + metadata_tokens == total_tokens:
+                break
+            total_tokens = body_tokens + metadata_tokens
+        return total_tokens
+
+    def _metadata_dict(self, stats: CodebaseStats, total_tokens: int) -> dict:
+        """The metadata block's entries for an output."""
+        metadata = stats.to_dict()
+        if self.count_tokens:
+            metadata["token_model"] = self.token_model
+            if self.token_budget is not None:
+                metadata["token_budget"] = f"{self.token_budget:,}"
+            metadata["total_tokens"] = f"{total_tokens:,}"
+        return metadata
 
     def _process_file(self, file_path):
+        import tokenize
+
         try:
             with open(file_path, "r", encoding="utf-8") as f:
                 content = f.read()
@@ -660,53 +1845,11 @@ class CodeAggregator:
             return f"\n# Error reading file {file_path}: {e}\n"
 
     def _extract_summary(self, content, file_path):
-        """Extracts class/function definitions and their docstrings for a file summary."""
+        """Outlines a file's declarations (signatures, types, docstrings) for a summary."""
         try:
-            tree = ast.parse(content, filename=file_path)
-            summary_lines = []
-
-            def process_node_body(body_items, indent=""):
-                for item in body_items:
-                    if isinstance(
-                        item, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
-                    ):
-                        # Get decorators
-                        for decorator in getattr(item, "decorator_list", []):
-                            if isinstance(decorator, ast.Name):
-                                summary_lines.append(f"{indent}@{decorator.id}")
-                            else:
-                                summary_lines.append(f"{indent}@decorator")
-
-                        # Add the declaration line
-                        if isinstance(item, ast.ClassDef):
-                            summary_lines.append(f"{indent}class {item.name}:")
-                            # Process class body to find methods
-                            process_node_body(item.body, indent + "    ")
-                        elif isinstance(item, ast.AsyncFunctionDef):
-                            summary_lines.append(f"{indent}async def {item.name}():")
-                        else:  # Regular function
-                            summary_lines.append(f"{indent}def {item.name}():")
-
-                        # Add docstring if present
-                        docstring = ast.get_docstring(item)
-                        if docstring:
-                            docstring_lines = docstring.strip().split("\n")
-                            if len(docstring_lines) == 1:
-                                summary_lines.append(
-                                    f'{indent}    """{docstring_lines[0]}"""'
-                                )
-                            else:
-                                summary_lines.append(f'{indent}    """')
-                                for line in docstring_lines:
-                                    summary_lines.append(f"{indent}    {line}")
-                                summary_lines.append(f'{indent}    """')
-
-                        if indent == "":  # Only add empty line after top-level items
-                            summary_lines.append("")
-
-            # Process the main body of the module
-            process_node_body(tree.body)
-            return "\n".join(summary_lines)
+            return self.outlines.extract(content, file_path)
+        except UnsupportedLanguageError:
+            return f"# No summary available for {os.path.basename(file_path)} (unsupported file type)\n"
         except SyntaxError:
             return f"# Could not parse {os.path.basename(file_path)} for summary (SyntaxError)\n"
         except Exception as e:
@@ -780,6 +1923,8 @@ class CodeAggregator:
             with open(file2, "r", encoding="utf-8") as f:
                 content2 = f.readlines()
 
+            import difflib
+
             # Generate diff
             diff = difflib.unified_diff(
                 content1,
@@ -0,0 +1,169 @@
+"""Decides which files matter most when the output has to fit a token budget.
+
+Files are scored on whether their path matches one of the user's priority
+patterns, how recently they changed and how small they are, and optionally
+on how many other files import them. The aggregator then walks the files
+best-first and gives each one the most detail that still fits.
+"""
+
+import fnmatch
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from .scanner import ScannedFile
+
+# How much each signal counts towards a file's priority
+PATTERN_WEIGHT = 4.0
+CENTRALITY_WEIGHT = 2.0
+RECENCY_WEIGHT = 1.0
+SIZE_WEIGHT = 1.0
+
+# Only the start of a file is scanned for imports, to keep ranking cheap
+IMPORT_SCAN_BYTES = 64 * 1024
+
+_PYTHON_IMPORT = re.compile(
+    r"^\s*(?:from\s+(\.*[\w.]*)\s+import|import\s+([\w.]+(?:\s*,\s*[\w.]+)*))",
+    re.MULTILINE,
+)
+_SCRIPT_IMPORT = re.compile(
+    r"""(?:from\s+|require\(\s*|import\s*\(\s*|import\s+)['"](\.{1,2}/[^'"]+)['"]"""
+)
+_SCRIPT_EXTENSIONS = (".js", ".jsx", ".ts", ".tsx")
+
+
+def _python_module_names(rel_path: str) -> List[str]:
+    """The dotted names a Python file can be imported as, e.g. pkg.mod and mod."""
+    parts = os.path.splitext(rel_path)[0].split(os.sep)
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    return [".".join(parts[i:]) for i in range(len(parts)) if parts[i:]]
+
+
+def _resolve_python_import(module: str, importer: str) -> List[str]:
+    """Turns an import (possibly relative) into candidate dotted names."""
+    if not module.startswith("."):
+        return [module]
+    level = len(module) - len(module.lstrip("."))
+    package = os.path.dirname(importer).split(os.sep)
+    if level > 1:
+        package = package[: -(level - 1)] if level - 1 <= len(package) else []
+    base = [part for part in package if part]
+    rest = module[level:]
+    return [".".join(base + ([rest] if rest else []))]
+
+
+def _read_head(file_path: str) -> str:
+    try:
+        with open(file_path, "rb") as f:
+            return f.read(IMPORT_SCAN_BYTES).decode("utf-8", errors="ignore")
+    except OSError:
+        return ""
+
+
+def import_centrality(entries: Sequence[ScannedFile]) -> Dict[str, int]:
+    """Counts how many of the other files import each file.
+
+    Python imports are matched by module name, and relative imports in
+    JavaScript and TypeScript by path. Anything that can't be resolved to one
+    of the given files is ignored.
+
+    Returns:
+        Number of importing files, keyed by relative path
+    """
+    by_module: Dict[str, str] = {}
+    by_stem: Dict[str, str] = {}
+    for entry in entries:
+        stem, ext = os.path.splitext(entry.rel_path)
+        if ext == ".py":
+            for name in _python_module_names(entry.rel_path):
+                by_module.setdefault(name, entry.rel_path)
+        elif ext in _SCRIPT_EXTENSIONS:
+            by_stem[os.path.normpath(stem)] = entry.rel_path
+            if os.path.basename(stem) == "index":
+                by_stem[os.path.normpath(os.path.dirname(stem))] = entry.rel_path
+
+    counts: Counter = Counter()
+    for entry in entries:
+        ext = os.path.splitext(entry.name)[1]
+        if ext == ".py" and by_module:
+            imported = set()
+            for match in _PYTHON_IMPORT.finditer(_read_head(entry.path)):
+                modules = [match.group(1)] if match.group(1) else []
+                if match.group(2):
+                    modules = [m.strip() for m in match.group(2).split(",")]
+                for module in modules:
+                    for name in _resolve_python_import(module, entry.rel_path):
+                        # "import a.b.c" also pulls in a.b and a
+                        while name:
+                            target = by_module.get(name)
+                            if target and target != entry.rel_path:
+                                imported.add(target)
+                                break
+                            name = name.rpartition(".")[0]
+            counts.update(imported)
+        elif ext in _SCRIPT_EXTENSIONS and by_stem:
+            base = os.path.dirname(entry.rel_path)
+            imported = set()
+            for match in _SCRIPT_IMPORT.finditer(_read_head(entry.path)):
+                target_path = os.path.normpath(os.path.join(base, match.group(1)))
+                target = by_stem.get(os.path.splitext(target_path)[0]) or by_stem.get(
+                    target_path
+                )
+                if target and target != entry.rel_path:
+                    imported.add(target)
+            counts.update(imported)
+    return dict(counts)
+
+
+def _ranks(values: Iterable[float]) -> Dict[int, float]:
+    """Maps each position to its rank scaled to 0..1 (ties share a rank)."""
+    values = list(values)
+    distinct = sorted(set(values))
+    if len(distinct) < 2:
+        return {i: 0.0 for i in range(len(values))}
+    scale = {value: i / (len(distinct) - 1) for i, value in enumerate(distinct)}
+    return {i: scale[value] for i, value in enumerate(values)}
+
+
+def rank_files(
+    entries: Sequence[ScannedFile],
+    priority_patterns: Optional[Sequence[str]] = None,
+    use_imports: bool = False,
+) -> List[ScannedFile]:
+    """Orders files from most to least important.
+
+    Args:
+        entries: The files to rank
+        priority_patterns: Glob patterns (matched against the relative path or
+            the file name) for files that should come first
+        use_imports: Whether to favour files that many others import. This
+            reads the start of every Python, JavaScript and TypeScript file
+            before ranking, so it's off unless asked for
+
+    Returns:
+        The same files, best first. Ties keep their original order.
+    """
+    patterns = list(priority_patterns or [])
+    centrality = import_centrality(entries) if use_imports else {}
+    central = _ranks(centrality.get(entry.rel_path, 0) for entry in entries)
+    recent = _ranks(entry.mtime for entry in entries)
+    large = _ranks(entry.size for entry in entries)
+
+    def score(index: int) -> float:
+        entry = entries[index]
+        matched = any(
+            fnmatch.fnmatch(entry.rel_path, pattern)
+            or fnmatch.fnmatch(entry.name, pattern)
+            for pattern in patterns
+        )
+        return (
+            PATTERN_WEIGHT * matched
+            + CENTRALITY_WEIGHT * central[index]
+            + RECENCY_WEIGHT * recent[index]
+            + SIZE_WEIGHT * (1.0 - large[index])
+        )
+
+    order = sorted(range(len(entries)), key=lambda i: -score(i))
+    return [entries[i] for i in order]
@@ -0,0 +1,86 @@
+"""Keeps processed file output on disk so unchanged files aren't processed twice.
+
+Entries are keyed by a hash of the file's raw bytes together with every option
+that affects how the file is rendered, so a cached entry can never be served
+for the wrong content or the wrong settings.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+
+class ProcessedFileCache:
+    """A content-addressed store of processed file output."""
+
+    DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".promptprep", "cache")
+    # Bump whenever the way files are processed or formatted changes
+    CACHE_VERSION = 2
+
+    def __init__(self, cache_dir: Optional[str] = None, **options: Any):
+        """Sets up a cache for one combination of processing options.
+
+        Args:
+            cache_dir: Where entries live. Uses ~/.promptprep/cache if not specified
+            **options: Every setting that changes the processed output
+        """
+        self.cache_dir = cache_dir or self.DEFAULT_CACHE_DIR
+        fingerprint = json.dumps(
+            {"version": self.CACHE_VERSION, **options}, sort_keys=True, default=str
+        )
+        self._options_digest = hashlib.sha256(fingerprint.encode("utf-8")).digest()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, data: bytes, *parts: str) -> str:
+        """Builds the key for a file's raw bytes plus any per-file details."""
+        digest = hashlib.sha256(self._options_digest)
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        digest.update(data)
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        """Spreads entries over subdirectories so no single directory gets huge."""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._entry_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the cached entry for key, or None if there isn't a usable one."""
+        entry = self._load(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        """Stores an entry. Failures are ignored; the cache is only an optimization."""
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def add_tokens(self, key: str, content: str, token_model: str, tokens: int) -> None:
+        """Stores an entry's token count for one model, keeping those for the others."""
+        entry = self._load(key) or {}
+        counts = dict(entry.get("tokens") or {})
+        counts[token_model] = tokens
+        self.put(key, {"content": content, "tokens": counts})
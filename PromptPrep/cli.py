@@ -3,6 +3,9 @@ import os
 import sys
 from promptprep.aggregator import CodeAggregator
 from promptprep.config import ConfigManager
+from promptprep.writer import FlushingStream
+
+DEFAULT_OUTPUT_FILE = "full_code.txt"
 
 if sys.platform != "win32":
     # Import TUI function only if not on Windows
@@ -68,15 +71,15 @@ def parse_arguments() -> argparse.Namespace:
         "-o",
         "--output-file",
         type=str,
-        default="full_code.txt",
-        help="Name of the output file. Defaults to full_code.txt.",
+        default=DEFAULT_OUTPUT_FILE,
+        help="Name of the output file. Defaults to full_code.txt (standard output for --format ansi). Use '-' to write to standard output.",
     )
     parser.add_argument(
         "-i",
         "--include-files",
         type=str,
         default="",
-        help="Comma-separated list of files to include. If not provided, all files are included.",
+        help="Comma-separated list of files or glob patterns to include (e.g., 'src/*.py'). If not provided, all files are included.",
     )
     parser.add_argument(
         "-x",
@@ -90,7 +93,12 @@ def parse_arguments() -> argparse.Namespace:
         "--exclude-dirs",
         type=str,
         default="",
-        help="Comma-separated list of directories to exclude. Replaces the default set if provided.",
+        help="Comma-separated list of directory names or glob patterns to exclude. Replaces the default set if provided.",
+    )
+    parser.add_argument(
+        "--gitignore",
+        action="store_true",
+        help="Also skip files ignored by .gitignore files. Rules in .promptprepignore files always apply.",
     )
     parser.add_argument(
         "-m",
@@ -107,13 +115,13 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument(
         "--incremental",
         action="store_true",
-        help="Only process files that have changed since the last run.",
+        help="Update the output from the previous run, reprocessing only files that changed. A manifest is kept next to the output file.",
     )
     parser.add_argument(
         "--last-run-timestamp",
         type=float,
         default=None,
-        help="Timestamp of the last run (Unix epoch time). Required when using --incremental.",
+        help="Timestamp of the last run (Unix epoch time). With --incremental, output only the files changed since then.",
     )
     parser.add_argument(
         "--summary-mode",
@@ -148,12 +156,39 @@ def parse_arguments() -> argparse.Namespace:
         default="cl100k_base",
         help="The tokenizer model to use for counting tokens. Common options: cl100k_base (for GPT-4), p50k_base (for GPT-3).",
     )
+    parser.add_argument(
+        "--token-budget",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Fit the output into N tokens. The most important files are included in full, the rest as summaries or headers only. Implies --count-tokens.",
+    )
+    parser.add_argument(
+        "--priority",
+        type=str,
+        default="",
+        help="Comma-separated glob patterns for files to favour with --token-budget (e.g., 'src/core/*,*.py').",
+    )
+    parser.add_argument(
+        "--rank-imports",
+        action="store_true",
+        help="With --token-budget, also favour files that many others import. Reads the start of every Python, JavaScript and TypeScript file first.",
+    )
     parser.add_argument(
         "--format",
         type=str,
-        choices=["plain", "markdown", "html", "highlighted", "custom"],
+        choices=[
+            "plain",
+            "markdown",
+            "html",
+            "highlighted",
+            "ansi",
+            "jsonl",
+            "binary",
+            "custom",
+        ],
         default="plain",
-        help="Output format. Options: plain (default), markdown, html, highlighted and custom.",
+        help="Output format. Options: plain (default), markdown, html, highlighted, ansi (terminal colours, shown through $PAGER on a terminal), jsonl (one JSON object per file), binary (length-prefixed records with an index) and custom.",
     )
     parser.add_argument(
         "--line-numbers",
@@ -166,6 +201,65 @@ def parse_arguments() -> argparse.Namespace:
         default=None,
         help="Path to a custom template file (required for --format custom).",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of files to read and process in parallel. Defaults to 1.",
+    )
+    parser.add_argument(
+        "--executor",
+        type=str,
+        choices=["auto", "thread", "process"],
+        default="auto",
+        help="Worker pool used with --jobs: auto (default; processes for --format highlighted and --summary-mode, threads otherwise), thread or process.",
+    )
+    parser.add_argument(
+        "--read-ahead",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Read up to N files ahead in the background, several at once. Helps on network filesystems and slow disks.",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse processed output for files whose content and options haven't changed (stored in ~/.promptprep/cache).",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Directory for the processed-file cache. Implies --cache.",
+    )
+
+    # Profiling options, grouped in help
+    profile_group = parser.add_argument_group("Profiling Options")
+    profile_group.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print how long each stage of the run took, with counters, to standard error.",
+    )
+    profile_group.add_argument(
+        "--profile-output",
+        type=str,
+        metavar="FILE",
+        help="Save the profile to FILE instead of printing it. Implies --profile.",
+    )
+    profile_group.add_argument(
+        "--profile-format",
+        type=str,
+        choices=["json", "chrome"],
+        default="json",
+        help="Format for --profile-output: json (stage totals and counters, default) or chrome (a trace for chrome://tracing or Perfetto).",
+    )
+    profile_group.add_argument(
+        "--cprofile",
+        type=str,
+        metavar="FILE",
+        help="Also run under cProfile and save the stats to FILE (read them with python -m pstats).",
+    )
     parser.add_argument(
         "--save-config",
         type=str,
@@ -185,6 +279,47 @@ def parse_arguments() -> argparse.Namespace:
     return parser.parse_args()
 
 
+def write_to_terminal(aggregator: CodeAggregator) -> None:
+    """Streams the output to stdout, through $PAGER when stdout is a terminal.
+
+    Each file is flushed as soon as it's written, so the first screen shows
+    up while the rest of the files are still being processed. Quitting the
+    pager (or closing the pipe) before the end just stops the output.
+    """
+    pager = None
+    if sys.stdout.isatty():
+        import shlex
+        import subprocess
+
+        env = dict(os.environ)
+        # Same defaults as git: pass colours through, and don't page one screen
+        env.setdefault("LESS", "FRX")
+        try:
+            pager = subprocess.Popen(
+                shlex.split(os.environ.get("PAGER") or "less"),
+                stdin=subprocess.PIPE,
+                env=env,
+            )
+        except (OSError, ValueError):
+            pager = None
+
+    try:
+        stream = pager.stdin if pager is not None else sys.stdout.buffer
+        aggregator.write_to_stream(FlushingStream(stream))
+    except BrokenPipeError:
+        if pager is None:
+            # Keep Python from failing to flush stdout again on exit
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, sys.stdout.fileno())
+    finally:
+        if pager is not None:
+            try:
+                pager.stdin.close()
+            except BrokenPipeError:
+                pass
+            pager.wait()
+
+
 def main() -> None:
     """Main entry point for the code aggregation tool."""
     args = parse_arguments()
@@ -215,6 +350,13 @@ def main() -> None:
         )
         sys.exit(1)
 
+    if args.format == "binary" and args.clipboard:
+        print(
+            "Error: --format binary can't be copied to the clipboard",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
     # Let users select files interactively if requested
     if args.interactive:
         print("Starting interactive file selection...")
@@ -253,6 +395,22 @@ def main() -> None:
             print(f"Error saving configuration: {e}", file=sys.stderr)
             sys.exit(1)
 
+    # Terminal colours are for reading, not for a file, unless one was named
+    if args.format == "ansi" and args.output_file == DEFAULT_OUTPUT_FILE:
+        args.output_file = "-"
+
+    profiler = None
+    profile_output = args.profile_output
+    cprofile_output = args.cprofile
+    if args.profile or profile_output or cprofile_output:
+        from promptprep.profiling import Profiler
+
+        profiler = Profiler(
+            cprofile_output=cprofile_output,
+            # Only a trace needs every stage call; the other outputs are totals
+            keep_spans=bool(profile_output) and args.profile_format == "chrome",
+        )
+
     try:
         aggregator = CodeAggregator(
             directory=args.directory,
@@ -273,6 +431,18 @@ def main() -> None:
             template_file=args.template_file,
             incremental=args.incremental,
             last_run_timestamp=args.last_run_timestamp,
+            jobs=args.jobs,
+            executor=args.executor,
+            read_ahead=args.read_ahead,
+            use_cache=args.cache,
+            cache_dir=args.cache_dir,
+            use_gitignore=args.gitignore,
+            profiler=profiler,
+            token_budget=args.token_budget,
+            priority_patterns=[
+                p.strip() for p in (args.priority or "").split(",") if p.strip()
+            ],
+            rank_by_imports=args.rank_imports,
         )
 
         # Handle file comparison if requested
@@ -317,9 +487,30 @@ def main() -> None:
             else:
                 print("Failed to copy content to the clipboard.")
                 raise SystemExit(1)
+        elif args.output_file == "-" and args.format == "ansi":
+            write_to_terminal(aggregator)
+        elif args.output_file == "-":
+            aggregator.write_to_stream(sys.stdout.buffer)
+            sys.stdout.flush()
         else:
             aggregator.write_to_file()
-            print(f"Aggregated file '{args.output_file}' created successfully.")
+            print(f"Aggregated file '{aggregator.output_file}' created successfully.")
+            if args.token_budget is not None:
+                levels = aggregator.budget_levels
+                print(
+                    f"Token budget: {aggregator.total_tokens:,} of {aggregator.token_budget:,} tokens used "
+                    f"({levels.get('full', 0)} full, {levels.get('summary', 0)} summarized, "
+                    f"{levels.get('header', 0)} header only, {levels.get('omitted', 0)} left out)."
+                )
+
+        if profiler is not None:
+            if profile_output:
+                profiler.write(profile_output, args.profile_format)
+                print(f"Profile saved to '{profile_output}'.", file=sys.stderr)
+            elif args.profile:
+                print(profiler.format_report(), file=sys.stderr)
+            if cprofile_output:
+                print(f"cProfile stats saved to '{cprofile_output}'.", file=sys.stderr)
     except FileNotFoundError as e:
         print(f"Error: Directory not found: {e}", file=sys.stderr)
         sys.exit(1)
@@ -0,0 +1,318 @@
+"""Removes comments from source files, one language at a time.
+
+Each language is described by the regex fragments for its comments and for
+the literals that can contain comment markers without starting a comment
+(strings, character literals, raw strings). The fragments are compiled into
+a single alternation per language, so a file is stripped in one left to
+right pass of the regex engine: literals are matched and kept as they are,
+comments are matched and dropped.
+
+The lexing is deliberately shallow. It doesn't follow nested block comments,
+JavaScript regex literals, heredocs or string interpolation, which covers
+ordinary code at a fraction of the cost of a real tokenizer.
+"""
+
+import functools
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional, Pattern, Tuple
+
+
+class CommentSyntax(NamedTuple):
+    """How one language writes comments."""
+
+    comments: Tuple[str, ...]  # Regex fragments, tried in order
+    literals: Tuple[str, ...] = ()  # Regex fragments for text kept as it is
+    markers: Tuple[str, ...] = ()  # Plain text every comment contains
+
+
+# Literal fragments. Single line strings stop at a newline so one unbalanced
+# quote can't swallow the rest of the file.
+_DQ = r'"(?:\\.|[^"\\\n])*"'
+_SQ = r"'(?:\\.|[^'\\\n])*'"
+_CHAR = r"'(?:\\.|[^'\\\n])'"
+_TDQ = r'"""[\s\S]*?"""'
+_TSQ = r"'''[\s\S]*?'''"
+_BACKTICK = r"`(?:\\[\s\S]|[^`\\])*`"
+_RAW_BACKTICK = r"`[^`]*`"
+_SHELL_SQ = r"'[^']*'"
+_DOUBLED_DQ = r'"(?:[^"\n]|"")*"'
+_DOUBLED_SQ = r"'(?:[^']|'')*'"
+_YAML_SQ = r"'(?:[^'\n]|'')*'"
+
+# Comment fragments
+_SLASH_LINE = r"//[^\n]*"
+_SLASH_BLOCK = r"/\*[\s\S]*?\*/"
+_HASH_LINE = r"#[^\n]*"
+# In shells and YAML a # only starts a comment at the start of a word
+_WORD_HASH_LINE = r"(?:^|(?<=[ \t]))#[^\n]*"
+_DASH_LINE = r"--[^\n]*"
+_XML_BLOCK = r"<!--[\s\S]*?-->"
+
+_C_LIKE = CommentSyntax((_SLASH_LINE, _SLASH_BLOCK), (_DQ, _SQ), ("/",))
+_HASH = CommentSyntax((_HASH_LINE,), (_DQ, _SQ), ("#",))
+_PYTHON = CommentSyntax((_HASH_LINE,), (_TDQ, _TSQ, _DQ, _SQ), ("#",))
+_SHELL = CommentSyntax((_WORD_HASH_LINE,), (_DQ, _SHELL_SQ), ("#",))
+_CSS = CommentSyntax((_SLASH_BLOCK,), (_DQ, _SQ), ("/*",))
+_SCSS = CommentSyntax((_SLASH_LINE, _SLASH_BLOCK), (_DQ, _SQ), ("/",))
+_MARKUP = CommentSyntax((_XML_BLOCK,), (), ("<!--",))
+
+_SYNTAX: Dict[str, CommentSyntax] = {
+    ".py": _PYTHON,
+    ".java": _C_LIKE,
+    ".c": _C_LIKE,
+    ".cpp": _C_LIKE,
+    ".h": _C_LIKE,
+    ".hpp": _C_LIKE,
+    ".cs": CommentSyntax(
+        (_SLASH_LINE, _SLASH_BLOCK), (r'@"(?:[^"]|"")*"', _DQ, _SQ), ("/",)
+    ),
+    ".vb": CommentSyntax(
+        (r"'[^\n]*", r"(?i:(?:^|(?<=[ \t]))rem\b[^\n]*)"),
+        (_DOUBLED_DQ,),
+        ("'", "rem", "REM", "Rem"),
+    ),
+    ".r": _HASH,
+    ".rb": CommentSyntax(
+        (r"^=begin\b[\s\S]*?^=end\b[^\n]*", _HASH_LINE), (_DQ, _SQ), ("#", "=begin")
+    ),
+    ".go": CommentSyntax(
+        (_SLASH_LINE, _SLASH_BLOCK), (_DQ, _CHAR, _RAW_BACKTICK), ("/",)
+    ),
+    ".php": CommentSyntax(
+        (_SLASH_LINE, _SLASH_BLOCK, r"#(?!\[)[^\n]*"), (_DQ, _SQ), ("/", "#")
+    ),
+    ".swift": CommentSyntax((_SLASH_LINE, _SLASH_BLOCK), (_TDQ, _DQ), ("/",)),
+    ".kt": CommentSyntax((_SLASH_LINE, _SLASH_BLOCK), (_TDQ, _DQ, _CHAR), ("/",)),
+    # Rust's ' also starts lifetimes, so only one character literals count
+    ".rs": CommentSyntax((_SLASH_LINE, _SLASH_BLOCK), (_DQ, _CHAR), ("/",)),
+    ".scala": CommentSyntax((_SLASH_LINE, _SLASH_BLOCK), (_TDQ, _DQ, _CHAR), ("/",)),
+    ".pl": _HASH,
+    ".lua": CommentSyntax(
+        (r"--\[(?P<level>=*)\[[\s\S]*?\](?P=level)\]", _DASH_LINE),
+        (r"\[(?P<str_level>=*)\[[\s\S]*?\](?P=str_level)\]", _DQ, _SQ),
+        ("--",),
+    ),
+    ".js": CommentSyntax((_SLASH_LINE, _SLASH_BLOCK), (_DQ, _SQ, _BACKTICK), ("/",)),
+    ".jsx": CommentSyntax((_SLASH_LINE, _SLASH_BLOCK), (_DQ, _SQ, _BACKTICK), ("/",)),
+    ".ts": CommentSyntax((_SLASH_LINE, _SLASH_BLOCK), (_DQ, _SQ, _BACKTICK), ("/",)),
+    ".tsx": CommentSyntax((_SLASH_LINE, _SLASH_BLOCK), (_DQ, _SQ, _BACKTICK), ("/",)),
+    ".html": _MARKUP,
+    ".xml": _MARKUP,
+    ".css": _CSS,
+    ".scss": _SCSS,
+    ".less": _SCSS,
+    ".sass": _SCSS,
+    ".sh": _SHELL,
+    ".zsh": _SHELL,
+    ".fish": _SHELL,
+    ".ps1": CommentSyntax((r"<#[\s\S]*?#>", _HASH_LINE), (_DQ, _SHELL_SQ), ("#",)),
+    ".bat": CommentSyntax(
+        (r"(?i:^[ \t]*(?:@?rem\b|::)[^\n]*)",), (), ("::", "rem", "REM", "Rem")
+    ),
+    ".sql": CommentSyntax(
+        (_DASH_LINE, _SLASH_BLOCK), (_DOUBLED_SQ, r'"[^"]*"'), ("--", "/*")
+    ),
+    ".toml": CommentSyntax((_HASH_LINE,), (_TDQ, _TSQ, _DQ, _SHELL_SQ), ("#",)),
+    ".ini": CommentSyntax((r"^[ \t]*[;#][^\n]*",), (), (";", "#")),
+    ".yml": CommentSyntax((_WORD_HASH_LINE,), (_DQ, _YAML_SQ), ("#",)),
+    ".gradle": CommentSyntax(
+        (_SLASH_LINE, _SLASH_BLOCK), (_TDQ, _TSQ, _DQ, _SQ), ("/",)
+    ),
+    ".cmake": CommentSyntax(
+        (r"#\[(?P<level>=*)\[[\s\S]*?\](?P=level)\]", _HASH_LINE), (_DQ,), ("#",)
+    ),
+    ".ninja": CommentSyntax((r"^[ \t]*#[^\n]*",), (), ("#",)),
+    ".pq": CommentSyntax((_SLASH_LINE, _SLASH_BLOCK), (_DOUBLED_DQ,), ("/",)),
+}
+for _alias, _extension in (
+    (".pyi", ".py"),
+    (".mjs", ".js"),
+    (".cjs", ".js"),
+    (".cc", ".cpp"),
+    (".cxx", ".cpp"),
+    (".hh", ".hpp"),
+    (".hxx", ".hpp"),
+    (".cmd", ".bat"),
+    (".psql", ".sql"),
+    (".yaml", ".yml"),
+    (".pqm", ".pq"),
+):
+    _SYNTAX[_alias] = _SYNTAX[_extension]
+
+# Files recognised by name rather than extension
+_SYNTAX_BY_NAME: Dict[str, CommentSyntax] = {
+    "Makefile": _SHELL,
+    "Dockerfile": _SYNTAX[".ninja"],
+    "CMakeLists.txt": _SYNTAX[".cmake"],
+}
+
+
+def syntax_for(file_path: str) -> Optional[CommentSyntax]:
+    """Looks up the comment syntax for a file, or None if it has none we know."""
+    name = os.path.basename(file_path)
+    syntax = _SYNTAX_BY_NAME.get(name)
+    if syntax is None:
+        syntax = _SYNTAX.get(os.path.splitext(name)[1].lower())
+    return syntax
+
+
+def _first_char(fragment: str) -> Optional[str]:
+    """The character every match of a fragment starts with, if there is one."""
+    if fragment[0] == "\\":
+        return fragment[1]
+    if fragment[0] in "^(.[":
+        return None
+    return fragment[0]
+
+
+@functools.lru_cache(maxsize=None)
+def _compile(syntax: CommentSyntax) -> Pattern[str]:
+    fragments = syntax.literals + syntax.comments
+    body = f"(?P<comment>{'|'.join(syntax.comments)})"
+    if syntax.literals:
+        body = f"(?P<literal>{'|'.join(syntax.literals)})|{body}"
+    starts = {_first_char(fragment) for fragment in fragments}
+    if None in starts:
+        return re.compile(body, re.MULTILINE)
+    # Skip over the text between literals and comments in one go instead of
+    # trying every alternative at every position. The last two alternatives
+    # make every attempt succeed, so the skip never has to backtrack.
+    chars = "".join(re.escape(c) for c in sorted(starts))
+    return re.compile(f"[^{chars}]*(?:{body}|[{chars}]|\\Z)", re.MULTILINE)
+
+
+def strip_comments(text: str, file_path: str) -> str:
+    """Removes the comments from a file's text.
+
+    Lines that held nothing but a comment are dropped. Lines with code and
+    a comment keep the code, minus trailing whitespace. Every other line,
+    including blank ones, is left exactly as it was. Files in a language
+    without a known comment syntax come back unchanged.
+
+    Args:
+        text: The file's contents
+        file_path: The file's path, used to pick the language
+
+    Returns:
+        The text without comments
+    """
+    syntax = syntax_for(file_path)
+    if syntax is None or not any(marker in text for marker in syntax.markers):
+        return text
+
+    pieces: List[str] = []
+    touched: List[int] = []  # Output lines a comment was removed from
+    line = 0
+    pos = 0
+    for match in _compile(syntax).finditer(text):
+        start, end = match.span("comment")
+        if start < 0:
+            continue
+        before = text[pos:start]
+        line += before.count("\n")
+        pieces.append(before)
+        # Keep the line breaks inside a block comment so the lines around it
+        # stay where they were
+        breaks = text.count("\n", start, end)
+        pieces.append("\n" * breaks)
+        touched.extend(range(line, line + breaks + 1))
+        line += breaks
+        pos = end
+
+    if not touched:
+        return text
+    pieces.append(text[pos:])
+    lines = "".join(pieces).split("\n")
+    for index in sorted(set(touched), reverse=True):
+        stripped = lines[index].rstrip()
+        if stripped:
+            lines[index] = stripped
+        else:
+            del lines[index]
+    return "\n".join(lines)
+
+
+def _blank(text: str) -> str:
+    """Spaces in place of everything but line breaks."""
+    return re.sub(r"[^\n]", " ", text)
+
+
+def mask_comments(text: str, file_path: str, strings: bool = False) -> str:
+    """Blanks out comments, and optionally string contents, without moving anything.
+
+    The result has the same length and line breaks as text, so positions
+    found in it (say, of braces that really are code) apply to the original.
+    String literals keep their first and last character.
+
+    Args:
+        text: The file's contents
+        file_path: The file's path, used to pick the language
+        strings: Whether to blank the insides of string literals too
+
+    Returns:
+        The masked text, or text itself for languages without known syntax
+    """
+    syntax = syntax_for(file_path)
+    if syntax is None:
+        return text
+
+    pieces: List[str] = []
+    pos = 0
+    for match in _compile(syntax).finditer(text):
+        start, end = match.span("comment")
+        if start < 0 and strings and syntax.literals:
+            start, end = match.span("literal")
+            if end - start > 2:
+                start, end = start + 1, end - 1
+            else:
+                start = -1
+        if start < 0:
+            continue
+        pieces.append(text[pos:start])
+        pieces.append(_blank(text[start:end]))
+        pos = end
+    if not pieces:
+        return text
+    pieces.append(text[pos:])
+    return "".join(pieces)
+
+
+class LineCounts(NamedTuple):
+    """How a file's lines split into code, comments and blank lines."""
+
+    code: int = 0
+    comment: int = 0
+    blank: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.code + self.comment + self.blank
+
+
+def count_lines(text: str, file_path: str) -> LineCounts:
+    """Counts a file's code, comment and blank lines.
+
+    A line is a comment line when it has nothing but comments on it, which
+    includes the inner lines of block comments. Files in a language without
+    a known comment syntax have no comment lines.
+
+    Args:
+        text: The file's contents
+        file_path: The file's path, used to pick the language
+    """
+    if not text:
+        return LineCounts()
+    lines = text.split("\n")
+    if text.endswith("\n"):
+        lines.pop()
+    blank = sum(1 for line in lines if not line.strip())
+
+    comment = 0
+    syntax = syntax_for(file_path)
+    if syntax is not None and any(marker in text for marker in syntax.markers):
+        masked = mask_comments(text, file_path).split("\n")
+        comment = sum(
+            1 for line, rest in zip(lines, masked) if not rest.strip() and line.strip()
+        )
+    return LineCounts(len(lines) - blank - comment, comment, blank)
@@ -6,14 +6,13 @@ Makes it easy to save your preferred settings and load them later.
 import json
 import os
 import argparse
-from pathlib import Path
 from typing import Dict, Any, Optional
 
 
 class ConfigManager:
     """Lets you save and load your PromptPrep settings."""
 
-    DEFAULT_CONFIG_DIR = os.path.join(str(Path.home()), ".promptprep")
+    DEFAULT_CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".promptprep")
     DEFAULT_CONFIG_FILE = os.path.join(DEFAULT_CONFIG_DIR, "config.json")
 
     @classmethod
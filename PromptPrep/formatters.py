@@ -1,28 +1,33 @@
 """Makes your code look nice in different output formats."""
 
 from abc import ABC, abstractmethod
+from collections.abc import Mapping
+import fnmatch
+import functools
+import json
 import os
-from typing import Dict, Optional, List, Any
+import struct
+import time
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Pattern,
+    Tuple,
+)
 import re
 
 # Try to import pygments, but make it optional
 import importlib.util
 
-# Check if pygments is available without importing it directly
+# Check if pygments is available without importing it directly. It's only
+# imported once a HighlightedFormatter is actually used.
 PYGMENTS_AVAILABLE = importlib.util.find_spec("pygments") is not None
 
-if PYGMENTS_AVAILABLE:
-    from pygments import highlight
-    from pygments.lexers import get_lexer_for_filename, TextLexer
-    from pygments.formatters import HtmlFormatter as PygmentsHtmlFormatter
-    from pygments.formatters import Terminal256Formatter
-else:
-    # Define placeholders to avoid errors
-    highlight = None
-    TextLexer = None
-    PygmentsHtmlFormatter = None
-    Terminal256Formatter = None
-
 
 class BaseFormatter(ABC):
     """The foundation for all our formatters."""
@@ -66,6 +71,15 @@ class BaseFormatter(ABC):
         _, ext = os.path.splitext(file_path)
         return ext.lower()
 
+    def verbatim_affixes(self, file_path: str) -> Optional[Tuple[str, str]]:
+        """The text format_code_content wraps around content it leaves untouched.
+
+        Formatters that pass content through unchanged return (before, after),
+        which lets the aggregator copy a file's bytes to the output without
+        decoding them. None means the content gets transformed.
+        """
+        return None
+
 
 class PlainTextFormatter(BaseFormatter):
     """Keeps things simple with plain text output."""
@@ -87,6 +101,10 @@ class PlainTextFormatter(BaseFormatter):
         # Line numbering is handled by the aggregator based on the flag
         return content
 
+    def verbatim_affixes(self, file_path: str) -> Optional[Tuple[str, str]]:
+        """Plain text content is used as is."""
+        return "", ""
+
     def format_metadata(self, metadata: Dict[str, Any]) -> str:
         """Format metadata section in plain text."""
         result = "# ======================\n"
@@ -141,6 +159,12 @@ class MarkdownFormatter(BaseFormatter):
         # Line numbering is handled by the aggregator based on the flag
         return f"```{lang}\n{content}\n```"
 
+    def verbatim_affixes(self, file_path: str) -> Optional[Tuple[str, str]]:
+        """Markdown only puts a code fence around the content."""
+        # Taken from format_code_content itself so the two can't drift apart
+        before, after = self.format_code_content("\0", file_path).split("\0")
+        return before, after
+
     def format_metadata(self, metadata: Dict[str, Any]) -> str:
         """Format metadata section in Markdown."""
         result = "## Codebase Metadata\n\n"
@@ -299,6 +323,10 @@ class HtmlFormatter(BaseFormatter):
 
     def get_full_html(self, content: str, title: str = "Code Aggregation") -> str:
         """Wrap content in a complete HTML document."""
+        return self.get_html_header(title) + content + self.get_html_footer()
+
+    def get_html_header(self, title: str = "Code Aggregation") -> str:
+        """Everything that comes before the content, for streaming output."""
         return f"""<!DOCTYPE html>
 <html lang="en">
 <head>
@@ -309,10 +337,30 @@ class HtmlFormatter(BaseFormatter):
 </head>
 <body>
     <h1>{title}</h1>
-    {content}
-</body>
-</html>
-"""
+    """
+
+    def get_html_footer(self) -> str:
+        """Everything that comes after the content, for streaming output."""
+        return "\n</body>\n</html>\n"
+
+
+@functools.lru_cache(maxsize=None)
+def _name_specific_lexers() -> Pattern:
+    """Matches the file names whose lexer isn't decided by the extension alone.
+
+    Those are the names matched by any Pygments filename pattern other than
+    a plain "*.ext".
+    """
+    from pygments.lexers import get_all_lexers
+
+    by_extension = re.compile(r"\*\.[^./*]+")
+    patterns = [
+        fnmatch.translate(pattern)
+        for _, _, filenames, _ in get_all_lexers()
+        for pattern in filenames
+        if not by_extension.fullmatch(pattern)
+    ]
+    return re.compile("|".join(patterns) or "(?!)")
 
 
 class HighlightedFormatter(BaseFormatter):
@@ -330,6 +378,9 @@ class HighlightedFormatter(BaseFormatter):
 
         # Check if pygments is available
         if PYGMENTS_AVAILABLE:
+            from pygments.formatters import HtmlFormatter as PygmentsHtmlFormatter
+            from pygments.formatters import Terminal256Formatter
+
             self.pygments_formatter = (
                 PygmentsHtmlFormatter(cssclass="source", wrapcode=True)
                 if html_output
@@ -337,6 +388,16 @@ class HighlightedFormatter(BaseFormatter):
             )
         else:
             self.pygments_formatter = None
+        # The highlighting styles, for the page's <head> once rather than in
+        # front of every file. Pages that don't use get_html_header (custom
+        # templates) put them in front of the first file themselves.
+        self.stylesheet = ""
+        if html_output and self.pygments_formatter is not None:
+            css = self.pygments_formatter.get_style_defs(".source")
+            self.stylesheet = f"<style>{css}</style>\n"
+            self.base_formatter.css += self.stylesheet
+        # Lexers by extension, or by name when the name decides the lexer
+        self._lexers: Dict[str, Any] = {}
 
     def format_directory_tree(self, tree: str) -> str:
         """Format the directory tree with highlighting."""
@@ -348,21 +409,35 @@ class HighlightedFormatter(BaseFormatter):
 
     def format_code_content(self, content: str, file_path: str) -> str:
         """Format code content with syntax highlighting (without line numbers)."""
-        # If pygments is not available or we're in terminal mode, fall back to base formatter
-        if not PYGMENTS_AVAILABLE or not self.html_output:
+        # If pygments is not available, fall back to base formatter
+        if not PYGMENTS_AVAILABLE:
             return self.base_formatter.format_code_content(content, file_path)
 
-        try:
-            lexer = get_lexer_for_filename(file_path, stripall=True)
-        except Exception:
-            lexer = TextLexer()
+        from pygments import highlight
 
         # Line numbering is handled by the aggregator based on the flag
-        highlighted = highlight(content, lexer, self.pygments_formatter)
+        return highlight(content, self._lexer_for(file_path), self.pygments_formatter)
 
-        # Always add CSS for HTML output
-        css = self.pygments_formatter.get_style_defs(".source")
-        return f"<style>{css}</style>\n{highlighted}"
+    def _lexer_for(self, file_path: str):
+        """The lexer for a file, looked up once per extension.
+
+        Files whose lexer depends on more than the extension (Makefile,
+        CMakeLists.txt, *.html.j2, ...) are looked up by their name.
+        """
+        name = os.path.basename(file_path)
+        # Pygments matches names case-sensitively, so the extension is too
+        ext = os.path.splitext(name)[1]
+        key = ext if ext and not _name_specific_lexers().fullmatch(name) else name
+        lexer = self._lexers.get(key)
+        if lexer is None:
+            from pygments.lexers import get_lexer_for_filename, TextLexer
+
+            try:
+                lexer = get_lexer_for_filename(name, stripall=True)
+            except Exception:
+                lexer = TextLexer()
+            self._lexers[key] = lexer
+        return lexer
 
     def format_metadata(self, metadata: Dict[str, Any]) -> str:
         """Format metadata section."""
@@ -382,6 +457,180 @@ class HighlightedFormatter(BaseFormatter):
             return self.base_formatter.get_full_html(content, title)
         return content
 
+    def get_html_header(self, title: str = "Code Aggregation") -> str:
+        """Opening part of the HTML document, or nothing in terminal mode."""
+        if self.html_output and hasattr(self.base_formatter, "get_html_header"):
+            return self.base_formatter.get_html_header(title)
+        return ""
+
+    def get_html_footer(self) -> str:
+        """Closing part of the HTML document, or nothing in terminal mode."""
+        if self.html_output and hasattr(self.base_formatter, "get_html_footer"):
+            return self.base_formatter.get_html_footer()
+        return ""
+
+
+class RecordFormatter(BaseFormatter):
+    """Base for machine-readable formats that store one record per file.
+
+    Records are dicts with a "type" of "tree", "file", "skipped" or
+    "metadata". The aggregator builds them and writes encode_record's bytes
+    one record at a time, so consumers can load single files without
+    parsing the rest. The text methods return the same records as JSON
+    lines, for use outside the aggregator.
+    """
+
+    def begin(self) -> bytes:
+        """Bytes that start the document."""
+        return b""
+
+    @abstractmethod
+    def encode_record(self, record: Dict[str, Any], offset: int) -> bytes:
+        """Encodes one record.
+
+        Args:
+            record: The record to encode
+            offset: Where in the output its bytes will start
+        """
+
+    def end(self, offset: int) -> bytes:
+        """Bytes that finish the document, which starts them at offset."""
+        return b""
+
+    @staticmethod
+    def file_record(file_path: str, content: str, **fields: Any) -> Dict[str, Any]:
+        """A file's record, with its language taken from the extension."""
+        _, ext = os.path.splitext(file_path)
+        return {
+            "type": "file",
+            "path": file_path,
+            "language": ext[1:].lower(),
+            **fields,
+            "content": content,
+        }
+
+    def _json_line(self, record: Dict[str, Any]) -> str:
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+    def format_directory_tree(self, tree: str) -> str:
+        """The tree as a JSON line."""
+        return self._json_line({"type": "tree", "tree": tree})
+
+    def format_file_header(self, file_path: str) -> str:
+        """Nothing: the path is part of the file's record."""
+        return ""
+
+    def format_code_content(self, content: str, file_path: str) -> str:
+        """The file's record as a JSON line."""
+        return self._json_line(self.file_record(file_path, content))
+
+    def format_metadata(self, metadata: Dict[str, Any]) -> str:
+        """The metadata as a JSON line."""
+        return self._json_line({"type": "metadata", **metadata})
+
+    def format_error(self, error_msg: str) -> str:
+        """The error as a JSON line."""
+        return self._json_line({"type": "error", "error": error_msg})
+
+    def format_skipped_files(self, skipped_files: List[tuple]) -> str:
+        """The files over the size limit as a JSON line."""
+        if not skipped_files:
+            return ""
+        return self._json_line(self.skipped_record(skipped_files))
+
+    @staticmethod
+    def skipped_record(skipped_files: List[tuple]) -> Dict[str, Any]:
+        """The record listing the files over the size limit."""
+        return {
+            "type": "skipped",
+            "files": [
+                {"path": file_path, "size_mb": round(size_mb, 2)}
+                for file_path, size_mb in skipped_files
+            ],
+        }
+
+
+class JsonLinesFormatter(RecordFormatter):
+    """Writes one JSON object per line: the tree, each file, then the rest."""
+
+    def encode_record(self, record: Dict[str, Any], offset: int) -> bytes:
+        return self._json_line(record).encode("utf-8")
+
+
+class BinaryRecordFormatter(RecordFormatter):
+    """Writes length-prefixed records with an index for random access.
+
+    Layout, all integers little-endian:
+
+    - MAGIC
+    - One frame per record: u32 header length, u32 body length, the header
+      (the record as JSON, minus its content) and the body (the file's
+      content as UTF-8, empty for other records)
+    - An index frame whose header maps each file's path to its frame offset
+    - A trailer: u64 offset of the index frame, then MAGIC again
+
+    A reader can walk the frames, skipping bodies it doesn't need, or read
+    the trailer and index and seek straight to one file.
+    """
+
+    MAGIC = b"PPRB\x00\x01"
+    _FRAME = struct.Struct("<II")
+    _TRAILER = struct.Struct("<Q")
+
+    def __init__(self):
+        super().__init__()
+        self._offsets: Dict[str, int] = {}
+
+    def begin(self) -> bytes:
+        self._offsets = {}
+        return self.MAGIC
+
+    def encode_record(self, record: Dict[str, Any], offset: int) -> bytes:
+        record = dict(record)
+        body = record.pop("content", "").encode("utf-8")
+        if record.get("type") == "file":
+            self._offsets[record["path"]] = offset
+        header = json.dumps(record, ensure_ascii=False).encode("utf-8")
+        return self._FRAME.pack(len(header), len(body)) + header + body
+
+    def end(self, offset: int) -> bytes:
+        index = self.encode_record({"type": "index", "files": self._offsets}, offset)
+        return index + self._TRAILER.pack(offset) + self.MAGIC
+
+    @classmethod
+    def read_record(cls, stream: BinaryIO, offset: int) -> Dict[str, Any]:
+        """Reads the record whose frame starts at offset."""
+        stream.seek(offset)
+        header_size, body_size = cls._FRAME.unpack(stream.read(cls._FRAME.size))
+        record = json.loads(stream.read(header_size).decode("utf-8"))
+        body = stream.read(body_size)
+        if record.get("type") == "file":
+            record["content"] = body.decode("utf-8")
+        return record
+
+    @classmethod
+    def read_index(cls, stream: BinaryIO) -> Dict[str, int]:
+        """Maps each file's path to the offset of its record."""
+        trailer_size = cls._TRAILER.size + len(cls.MAGIC)
+        stream.seek(-trailer_size, os.SEEK_END)
+        trailer = stream.read(trailer_size)
+        if trailer[cls._TRAILER.size :] != cls.MAGIC:
+            raise ValueError("Not a promptprep binary file")
+        (index_offset,) = cls._TRAILER.unpack(trailer[: cls._TRAILER.size])
+        return cls.read_record(stream, index_offset)["files"]
+
+    @classmethod
+    def iter_records(cls, stream: BinaryIO) -> Iterator[Dict[str, Any]]:
+        """Yields every record in order, up to the index."""
+        stream.seek(0)
+        if stream.read(len(cls.MAGIC)) != cls.MAGIC:
+            raise ValueError("Not a promptprep binary file")
+        while True:
+            record = cls.read_record(stream, stream.tell())
+            if record["type"] == "index":
+                return
+            yield record
+
 
 class CustomTemplateFormatter(BaseFormatter):
     """Lets you design your own output format using a template file.
@@ -394,8 +643,39 @@ class CustomTemplateFormatter(BaseFormatter):
     - ${SKIPPED_FILES} - Lists any files that were too big
     - ${FILES} - All your files with headers and content
     - ${TITLE} - The main title
+
+    ${FOR_EACH_FILE} ... ${END} repeats its body for every file, which can
+    use ${PATH}, ${LANGUAGE}, ${TOKENS}, ${SIZE}, ${MTIME}, ${FILE_HEADER}
+    and ${FILE_CONTENT} for the file at hand, and ${IF:condition} ...
+    ${ELSE} ... ${END} (the ${ELSE} part is optional). A condition is a
+    variable, true unless empty or 0, or a variable compared to a value with
+    =, !=, <, > or ~ (a glob pattern), e.g. ${IF:LANGUAGE=py} or
+    ${IF:SIZE>10000}.
+
+    The template is compiled once into a tree of nodes, so rendering is a
+    single pass over it however many placeholders it has.
     """
 
+    # ${NAME} or ${NAME:argument}
+    PLACEHOLDER_PATTERN = re.compile(r"\$\{([A-Z_]+)(?::([^}]+))?\}")
+    # Placeholder names, and whether each takes a file path argument
+    PLACEHOLDERS = {
+        "TITLE": False,
+        "DIRECTORY_TREE": False,
+        "METADATA": False,
+        "SKIPPED_FILES": False,
+        "FILES": False,
+        "FILE_HEADER": True,
+        "FILE_CONTENT": True,
+    }
+    # Variables of the current file, inside ${FOR_EACH_FILE}
+    FILE_VARIABLES = ("PATH", "LANGUAGE", "TOKENS", "SIZE", "MTIME")
+    # ${IF:NAME}, or ${IF:NAME<op>value}
+    CONDITION_PATTERN = re.compile(r"^\s*([A-Z_]+)\s*(?:(!=|=|<|>|~)\s*(.*?))?\s*$")
+    # Yielded by iter_render in place of ${METADATA} when the metadata
+    # isn't known yet. It's an empty string, so joining the pieces still works.
+    METADATA_SLOT = type("_MetadataSlot", (str,), {})()
+
     def __init__(self, template_file: str, base_format: str = "plain"):
         """Initialize custom template formatter.
 
@@ -407,7 +687,10 @@ class CustomTemplateFormatter(BaseFormatter):
         super().__init__()
         self.template_file = template_file
         self.template = self._load_template(template_file)
+        self.nodes = self.compile(self.template)
         self.base_format = base_format
+        # Stylesheet still to be written by the render in progress
+        self._stylesheet = ""
 
         # Use a base formatter for basic formatting
         if base_format == "plain":
@@ -429,6 +712,99 @@ class CustomTemplateFormatter(BaseFormatter):
         except IOError as e:
             raise IOError(f"Could not read template file: {e}")
 
+    @classmethod
+    def compile(cls, template: str) -> List["TemplateNode"]:
+        """Splits a template into literal text, placeholder and block nodes.
+
+        Anything that looks like a placeholder but isn't one (an unknown
+        name, an argument where none is taken, or a file variable outside a
+        loop) stays literal text. Neighbouring pieces of text are merged
+        into one node.
+
+        Raises:
+            ValueError: If a block isn't closed, loops are nested or a
+                condition can't be understood
+        """
+        nodes: List[TemplateNode] = []
+        # Open blocks, innermost last: [name, value, body, orelse or None]
+        blocks: List[list] = []
+        text: List[str] = []
+        position = 0
+
+        def current() -> List[TemplateNode]:
+            if not blocks:
+                return nodes
+            return blocks[-1][2] if blocks[-1][3] is None else blocks[-1][3]
+
+        def flush_text() -> None:
+            if any(text):
+                current().append(TemplateNode(None, "".join(text)))
+            text.clear()
+
+        for match in cls.PLACEHOLDER_PATTERN.finditer(template):
+            name, argument = match.groups()
+            if not cls._is_placeholder(name, argument, blocks):
+                continue
+            text.append(template[position : match.start()])
+            position = match.end()
+            flush_text()
+            if name == "FOR_EACH_FILE":
+                if blocks:
+                    raise ValueError("${FOR_EACH_FILE} blocks can't be nested")
+                blocks.append([name, None, [], None])
+            elif name == "IF":
+                cls._check_condition(argument)
+                blocks.append([name, argument, [], None])
+            elif name == "ELSE":
+                blocks[-1][3] = []
+            elif name == "END":
+                block, value, body, orelse = blocks.pop()
+                current().append(
+                    TemplateNode(block, value, tuple(body), tuple(orelse or ()))
+                )
+            else:
+                current().append(TemplateNode(name, argument))
+        text.append(template[position:])
+        flush_text()
+        if blocks:
+            raise ValueError(f"${{{blocks[-1][0]}}} has no matching ${{END}}")
+        return nodes
+
+    @classmethod
+    def _is_placeholder(
+        cls, name: str, argument: Optional[str], blocks: List[list]
+    ) -> bool:
+        """Whether ${name:argument} means something where it appears."""
+        if name == "FOR_EACH_FILE":
+            return argument is None
+        if name == "END":
+            return argument is None and bool(blocks)
+        if name == "ELSE":
+            return (
+                argument is None
+                and bool(blocks)
+                and blocks[-1][0] == "IF"
+                and blocks[-1][3] is None
+            )
+        if blocks:
+            # Inside a loop: the current file's variables and conditions
+            if name == "IF" or name in cls.FILE_VARIABLES:
+                return (argument is not None) == (name == "IF")
+            if name in ("FILE_HEADER", "FILE_CONTENT") and argument is None:
+                return True
+        takes_argument = cls.PLACEHOLDERS.get(name)
+        return takes_argument is not None and takes_argument == (argument is not None)
+
+    @classmethod
+    def _check_condition(cls, condition: str) -> None:
+        match = cls.CONDITION_PATTERN.match(condition)
+        if match is None or match.group(1) not in cls.FILE_VARIABLES:
+            raise ValueError(
+                f"Can't understand the condition in ${{IF:{condition}}}; "
+                f"use one of {', '.join(cls.FILE_VARIABLES)}, optionally "
+                "followed by =, !=, <, > or ~ and a value"
+            )
+
     def format_directory_tree(self, tree: str) -> str:
         """Format the directory tree using the base formatter."""
         return self.base_formatter.format_directory_tree(tree)
@@ -473,57 +849,198 @@ class CustomTemplateFormatter(BaseFormatter):
         Returns:
             The rendered template content
         """
-        # Start with the template
-        result = self.template
-
-        # Replace title placeholder
-        result = result.replace("${TITLE}", title)
-
-        # Replace directory tree placeholder
-        if "${DIRECTORY_TREE}" in result:
-            formatted_tree = self.format_directory_tree(directory_tree)
-            result = result.replace("${DIRECTORY_TREE}", formatted_tree)
-
-        # Replace metadata placeholder
-        if "${METADATA}" in result:
-            formatted_metadata = self.format_metadata(metadata)
-            result = result.replace("${METADATA}", formatted_metadata)
-
-        # Replace skipped files placeholder
-        if "${SKIPPED_FILES}" in result:
-            formatted_skipped = self.format_skipped_files(skipped_files)
-            result = result.replace("${SKIPPED_FILES}", formatted_skipped)
-
-        # Replace file header and content placeholders
-        for placeholder_type in ["FILE_HEADER", "FILE_CONTENT"]:
-            pattern = re.compile(r"\${" + placeholder_type + r":([^}]+)}")
-            matches = pattern.findall(result)
-
-            for file_path in matches:
-                placeholder = f"${{{placeholder_type}:{file_path}}}"
-
-                if file_path in files_content:
-                    if placeholder_type == "FILE_HEADER":
-                        formatted = self.format_file_header(file_path)
-                    else:  # FILE_CONTENT
-                        formatted = self.format_code_content(
-                            files_content[file_path], file_path
-                        )
-
-                    result = result.replace(placeholder, formatted)
+        return "".join(
+            self.iter_render(
+                directory_tree, files_content, metadata, skipped_files, title
+            )
+        )
+
+    def iter_render(
+        self,
+        directory_tree: str,
+        files_content: Dict[str, str],
+        metadata: Optional[Dict[str, Any]],
+        skipped_files: List[tuple],
+        title: str = "Code Aggregation",
+    ) -> Iterator[str]:
+        """Renders the template piece by piece, for streaming to the output.
+
+        Takes the same arguments as render_template. Text that replaces a
+        placeholder is never searched for placeholders itself.
+
+        files_content can be a TemplateFiles that processes each file only
+        when the template gets to it. metadata can be None when it isn't
+        known until the files have been processed: each ${METADATA} then
+        comes out as METADATA_SLOT, for the caller to fill in at the end.
+        """
+        if not isinstance(files_content, TemplateFiles):
+            files_content = TemplateFiles(files_content)
+        # Highlighted code needs its stylesheet, which a template has no
+        # placeholder for: it goes in front of the first file's code
+        self._stylesheet = getattr(self.base_formatter, "stylesheet", "")
+        values = (directory_tree, files_content, metadata, skipped_files, title)
+        return self._render_nodes(self.nodes, values, None)
+
+    def _render_nodes(
+        self,
+        nodes: Tuple["TemplateNode", ...],
+        values: tuple,
+        file: Optional["TemplateFile"],
+    ) -> Iterator[str]:
+        directory_tree, files, metadata, skipped_files, title = values
+        for name, value, body, orelse in nodes:
+            if name is None:
+                yield value
+            elif name == "TITLE":
+                yield title
+            elif name == "DIRECTORY_TREE":
+                yield self.format_directory_tree(directory_tree)
+            elif name == "METADATA":
+                if metadata is None:
+                    yield self.METADATA_SLOT
                 else:
-                    error_msg = f"File not found: {file_path}"
-                    result = result.replace(placeholder, self.format_error(error_msg))
+                    yield self.format_metadata(metadata)
+            elif name == "SKIPPED_FILES":
+                yield self.format_skipped_files(skipped_files)
+            elif name == "FILES":
+                for record in files.records():
+                    yield self.format_file_header(record.path)
+                    yield self._format_code(record.content, record.path)
+            elif name == "FOR_EACH_FILE":
+                for record in files.records(with_content=self._reads_files(body)):
+                    yield from self._render_nodes(body, values, record)
+            elif name == "IF":
+                branch = body if self._matches(value, file) else orelse
+                yield from self._render_nodes(branch, values, file)
+            elif name in self.FILE_VARIABLES:
+                yield self._file_value(name, file)
+            elif value is None:
+                # ${FILE_HEADER} or ${FILE_CONTENT} of the file in the loop
+                if name == "FILE_HEADER":
+                    yield self.format_file_header(file.path)
+                else:
+                    yield self._format_code(file.content, file.path)
+            elif value not in files:
+                yield self.format_error(f"File not found: {value}")
+            elif name == "FILE_HEADER":
+                yield self.format_file_header(value)
+            else:  # FILE_CONTENT
+                yield self._format_code(files[value], value)
+
+    def _format_code(self, content: str, file_path: str) -> str:
+        """format_code_content, with the stylesheet in front of the first file."""
+        code = self.format_code_content(content, file_path)
+        if self._stylesheet:
+            code = self._stylesheet + code
+            self._stylesheet = ""
+        return code
+
+    def _file_value(self, name: str, file: "TemplateFile") -> str:
+        """A file variable as it's written out; empty when it isn't known."""
+        if name == "PATH":
+            return file.path
+        if name == "LANGUAGE":
+            return self.get_file_extension(file.path)[1:]
+        if name == "MTIME":
+            if file.mtime is None:
+                return ""
+            return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(file.mtime))
+        value = file.size if name == "SIZE" else file.tokens
+        return "" if value is None else str(value)
+
+    def _matches(self, condition: str, file: "TemplateFile") -> bool:
+        """Evaluates an ${IF} condition for a file.
+
+        < and > compare numbers when both sides are numbers and text
+        otherwise, which orders MTIME's dates correctly.
+        """
+        name, op, expected = self.CONDITION_PATTERN.match(condition).groups()
+        actual = self._file_value(name, file)
+        if op is None:
+            return actual not in ("", "0")
+        if op == "=":
+            return actual == expected
+        if op == "!=":
+            return actual != expected
+        if op == "~":
+            return fnmatch.fnmatchcase(actual, expected)
+        if actual == "":
+            return False
+        try:
+            actual, expected = float(actual), float(expected)
+        except ValueError:
+            pass
+        return actual < expected if op == "<" else actual > expected
+
+    @classmethod
+    def _reads_files(cls, nodes: Tuple["TemplateNode", ...]) -> bool:
+        """Whether a loop body needs the files' content, or tokens counted from it."""
+        for name, value, body, orelse in nodes:
+            if name == "TOKENS" or (name == "FILE_CONTENT" and value is None):
+                return True
+            if name == "IF" and (
+                cls.CONDITION_PATTERN.match(value).group(1) == "TOKENS"
+                or cls._reads_files(body)
+                or cls._reads_files(orelse)
+            ):
+                return True
+        return False
+
+
+class TemplateNode(NamedTuple):
+    """A piece of a compiled template.
+
+    Literal text has no name and the text as its value. A placeholder has
+    its name and, for the per-file ones, the file path as its value. Blocks
+    (FOR_EACH_FILE and IF, whose value is its condition) hold the nodes
+    inside them in body, and an IF's ${ELSE} part in orelse.
+    """
 
-        # Handle generic file placeholders
-        if "${FILES}" in result:
-            file_content = ""
-            for file_path, content in files_content.items():
-                file_content += self.format_file_header(file_path)
-                file_content += self.format_code_content(content, file_path)
-            result = result.replace("${FILES}", file_content)
+    name: Optional[str]
+    value: Optional[str]
+    body: Tuple["TemplateNode", ...] = ()
+    orelse: Tuple["TemplateNode", ...] = ()
 
-        return result
+
+class TemplateFile(NamedTuple):
+    """One file as a template sees it. Fields that aren't known are None."""
+
+    path: str
+    content: Optional[str] = None
+    size: Optional[int] = None
+    mtime: Optional[float] = None
+    tokens: Optional[int] = None
+
+
+class TemplateFiles(Mapping):
+    """The files a template is rendered with: processed content by path, in order.
+
+    A plain dict passed to render_template is wrapped in one of these.
+    Subclasses can produce the files lazily instead, so a template that
+    loops over thousands of files only holds one of them at a time.
+    """
+
+    def __init__(self, contents: Dict[str, str]):
+        self.contents = contents
+
+    def __getitem__(self, path: str) -> str:
+        return self.contents[path]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.contents)
+
+    def __len__(self) -> int:
+        return len(self.contents)
+
+    def records(self, with_content: bool = True) -> Iterator[TemplateFile]:
+        """Yields every file in order.
+
+        Args:
+            with_content: False when only paths, sizes and times are needed,
+                so the files needn't be read
+        """
+        for path, content in self.contents.items():
+            yield TemplateFile(path, content, len(content.encode("utf-8")))
 
 
 # Add CustomTemplateFormatter to the get_formatter logic check
@@ -535,7 +1052,8 @@ def get_formatter(
     """Picks the right formatter for your needs.
 
     Args:
-        output_format: How you want it to look (plain, markdown, html, highlighted, custom)
+        output_format: How you want it to look (plain, markdown, html, highlighted,
+            ansi, jsonl, binary, custom)
         template_file: Your template file (needed for custom format)
         base_format: Backup format for custom templates (defaults to plain)
 
@@ -552,14 +1070,13 @@ def get_formatter(
     elif output_format == "html":
         return HtmlFormatter()
     elif output_format == "highlighted":
-        # Decide HTML vs terminal based on some logic or default?
-        # For CLI, terminal (False) might be better unless output is piped/redirected.
-        # Let's default to terminal highlighting for now if not HTML file.
-        # This part might need refinement based on desired behavior.
-        # For simplicity, let's assume highlighted implies terminal for non-HTML output.
-        # A better approach might be a separate flag or inferring from output file extension.
-        # Sticking to the original logic for now:
-        return HighlightedFormatter()  # Defaults to HTML=True based on original code
+        return HighlightedFormatter()
+    elif output_format == "ansi":
+        return HighlightedFormatter(html_output=False)
+    elif output_format == "jsonl":
+        return JsonLinesFormatter()
+    elif output_format == "binary":
+        return BinaryRecordFormatter()
     elif output_format == "custom":
         if not template_file:
             raise ValueError("template_file is required for custom output format")
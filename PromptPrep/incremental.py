@@ -0,0 +1,115 @@
+"""Remembers what the previous run wrote so the next one only redoes what changed.
+
+A manifest is saved next to the output file. It records, for every file
+section in the output, the file's size, modification time, content hash,
+token count, line counts and the byte range the section occupies. On the next run,
+sections for unchanged files are copied byte-for-byte from the previous
+output instead of being read and processed again.
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from .scanner import ScannedFile
+
+
+def hash_file(file_path: str) -> str:
+    """Returns the SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RunManifest:
+    """The record of one run's output, used to patch it on the next run."""
+
+    VERSION = 2
+    SUFFIX = ".promptprep-manifest"
+
+    def __init__(
+        self,
+        output_file: str,
+        options: Dict[str, Any],
+        sections: Optional[List[Dict[str, Any]]] = None,
+    ):
+        """Creates a manifest for an output file.
+
+        Args:
+            output_file: The aggregated output this manifest describes
+            options: Every setting that changes how a file section is rendered
+            sections: One record per file section, in output order
+        """
+        self.output_file = output_file
+        self.options = options
+        self.sections = sections or []
+        self._by_path = {record["path"]: record for record in self.sections}
+
+    @classmethod
+    def path_for(cls, output_file: str) -> str:
+        """Where the manifest for an output file lives."""
+        return output_file + cls.SUFFIX
+
+    @classmethod
+    def load(cls, output_file: str, options: Dict[str, Any]) -> Optional["RunManifest"]:
+        """Loads the manifest for output_file if it can be trusted.
+
+        Returns None when there's no manifest, it was written with different
+        options, or the output file has been changed since it was written.
+        """
+        try:
+            with open(cls.path_for(output_file), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            output_stat = os.stat(output_file)
+        except (OSError, ValueError):
+            return None
+
+        if data.get("version") != cls.VERSION or data.get("options") != options:
+            return None
+        if (
+            data.get("output_size") != output_stat.st_size
+            or data.get("output_mtime_ns") != output_stat.st_mtime_ns
+        ):
+            return None
+        return cls(output_file, options, data["sections"])
+
+    def save(self) -> None:
+        """Writes the manifest next to its output file."""
+        output_stat = os.stat(self.output_file)
+        data = {
+            "version": self.VERSION,
+            "options": self.options,
+            "output_size": output_stat.st_size,
+            "output_mtime_ns": output_stat.st_mtime_ns,
+            "sections": self.sections,
+        }
+        path = self.path_for(self.output_file)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def find_unchanged(self, entry: ScannedFile) -> Optional[Dict[str, Any]]:
+        """Returns the previous section record for a file if its content is unchanged.
+
+        Size and modification time are checked first. If only the timestamp
+        moved, the content hash decides; the returned record then carries the
+        new timestamp and hash so the next run takes the fast path again.
+        """
+        record = self._by_path.get(entry.rel_path)
+        if record is None or record["size"] != entry.size:
+            return None
+        if record["mtime"] == entry.mtime:
+            return record
+        if record.get("hash") is None:
+            return None
+        try:
+            digest = hash_file(entry.path)
+        except OSError:
+            return None
+        if digest != record["hash"]:
+            return None
+        return dict(record, mtime=entry.mtime)
@@ -0,0 +1,281 @@
+"""Decides which paths take part in a run, with all the rules compiled up front.
+
+Exact names and extensions are looked up in sets. Glob patterns are folded
+into one regular expression per rule list, and each ignore file
+(.promptprepignore, and .gitignore when enabled) becomes one expression too.
+Checking a path is then a couple of set lookups and regex matches, however
+many rules there are.
+"""
+
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Pattern, Set, Tuple
+
+IGNORE_FILE = ".promptprepignore"
+GITIGNORE_FILE = ".gitignore"
+
+_GLOB_CHARS = re.compile(r"[*?\[]")
+
+
+def _split_rules(rules: Iterable[str]) -> Tuple[Set[str], Optional[Pattern]]:
+    """Separates exact names from glob patterns and compiles the globs together.
+
+    Globs follow the same rules as ignore files: * and ? stay within one
+    path component, and only ** matches across directories.
+    """
+    exact = set()
+    globs = []
+    for rule in rules:
+        if _GLOB_CHARS.search(rule):
+            globs.append(_gitignore_body(rule))
+        else:
+            exact.add(rule)
+    pattern = (
+        re.compile("|".join(f"(?:{g})" for g in globs), re.DOTALL) if globs else None
+    )
+    return exact, pattern
+
+
+def _gitignore_body(pattern: str) -> str:
+    """Translates the glob part of a gitignore pattern into a regular expression."""
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**", i) and (i == 0 or pattern[i - 1] == "/"):
+                if i + 2 == n:
+                    out.append(".*")
+                    i += 2
+                    continue
+                if pattern[i + 2] == "/":
+                    out.append("(?:.*/)?")
+                    i += 3
+                    continue
+            while i + 1 < n and pattern[i + 1] == "*":
+                i += 1
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1 : end].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = end
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+class IgnoreRules:
+    """The rules from one ignore file, compiled into two regular expressions.
+
+    Like git, the last matching rule wins, so a later "!pattern" can
+    re-include what an earlier pattern ignored. Rules are tried newest first
+    in a single alternation and the name of the group that matched says which
+    rule it was.
+    """
+
+    def __init__(self, lines: Iterable[str]):
+        """Compiles gitignore-style lines.
+
+        Args:
+            lines: The contents of the ignore file, one pattern per line
+        """
+        file_rules: List[str] = []
+        dir_rules: List[str] = []
+        self._negated: Set[str] = set()
+
+        for index, line in enumerate(lines):
+            line = line.rstrip("\n").rstrip("\r")
+            if not line.endswith("\\ "):
+                line = line.rstrip(" ")
+            if not line or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            if negated:
+                line = line[1:]
+            elif line.startswith("\\"):
+                line = line[1:]  # "\#name" and "\!name" match literally
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+
+            anchored = "/" in line
+            body = _gitignore_body(line.lstrip("/"))
+            prefix = "" if anchored else "(?:.*/)?"
+            name = f"r{index}"
+            if negated:
+                self._negated.add(name)
+            # A rule that matches a directory also covers everything inside it
+            dir_rules.append(f"(?P<{name}>{prefix}{body}(?:/.*)?)")
+            if dir_only:
+                file_rules.append(f"(?P<{name}>{prefix}{body}/.*)")
+            else:
+                file_rules.append(f"(?P<{name}>{prefix}{body}(?:/.*)?)")
+
+        self._file_pattern = self._compile(file_rules)
+        self._dir_pattern = self._compile(dir_rules)
+
+    @staticmethod
+    def _compile(rules: List[str]) -> Optional[Pattern]:
+        if not rules:
+            return None
+        return re.compile("|".join(reversed(rules)), re.DOTALL)
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """Returns True if ignored, False if re-included, None if no rule matches.
+
+        Args:
+            rel_path: Path relative to the ignore file's directory, with "/" separators
+            is_dir: Whether the path is a directory
+        """
+        pattern = self._dir_pattern if is_dir else self._file_pattern
+        if pattern is None:
+            return None
+        m = pattern.fullmatch(rel_path)
+        if m is None:
+            return None
+        return m.lastgroup not in self._negated
+
+
+class PathMatcher:
+    """All the include, exclude and ignore rules for a run, compiled once."""
+
+    def __init__(
+        self,
+        exclude_dirs: Iterable[str] = (),
+        exclude_files: Iterable[str] = (),
+        include_files: Iterable[str] = (),
+        extensions: Optional[Iterable[str]] = None,
+        use_gitignore: bool = False,
+    ):
+        """Compiles the rules.
+
+        Args:
+            exclude_dirs: Directory names or glob patterns to skip anywhere in the tree
+            exclude_files: File names or glob patterns to skip
+            include_files: Relative paths or glob patterns; if given, only these are used
+            extensions: File extensions to treat as code (None means any file)
+            use_gitignore: Also honour .gitignore files, not just .promptprepignore
+        """
+        self._exclude_dirs, self._exclude_dir_globs = _split_rules(exclude_dirs)
+        self._exclude_files, self._exclude_file_globs = _split_rules(exclude_files)
+        include_files = list(include_files)
+        self._has_includes = bool(include_files)
+        self._include_files, self._include_globs = _split_rules(include_files)
+        self.extensions = (
+            {ext.lower() for ext in extensions} if extensions is not None else None
+        )
+        self.ignore_file_names = (
+            (IGNORE_FILE, GITIGNORE_FILE) if use_gitignore else (IGNORE_FILE,)
+        )
+        # Compiled ignore files, keyed by the relative directory they live in
+        self._ignore_rules: Dict[str, IgnoreRules] = {}
+
+    def clear_ignore_files(self) -> None:
+        """Forgets the ignore files compiled during an earlier scan."""
+        self._ignore_rules.clear()
+
+    def load_ignore_files(
+        self, directory: str, rel_dir: str, names: Iterable[str]
+    ) -> None:
+        """Compiles any ignore files among names, found in directory.
+
+        Args:
+            directory: The directory's full path
+            rel_dir: The directory's path relative to the scan root ("" for the root)
+            names: The names of the files in the directory
+        """
+        found = [name for name in self.ignore_file_names if name in names]
+        if not found:
+            return
+        lines: List[str] = []
+        # .gitignore first, so .promptprepignore can override it
+        for name in sorted(found, key=lambda n: n == IGNORE_FILE):
+            try:
+                with open(
+                    os.path.join(directory, name),
+                    "r",
+                    encoding="utf-8",
+                    errors="ignore",
+                ) as f:
+                    lines.extend(f.readlines())
+            except OSError:
+                continue
+        self._ignore_rules[rel_dir.replace(os.sep, "/")] = IgnoreRules(lines)
+
+    def is_programming_file(self, name: str) -> bool:
+        """Whether a file's extension is one we aggregate."""
+        if self.extensions is None:
+            return True
+        return os.path.splitext(name)[1].lower() in self.extensions
+
+    def is_excluded_dir(self, name: str) -> bool:
+        """Whether a directory name matches one of the excluded names or patterns."""
+        if name in self._exclude_dirs:
+            return True
+        return bool(self._exclude_dir_globs and self._exclude_dir_globs.fullmatch(name))
+
+    def is_excluded_file(self, name: str) -> bool:
+        """Whether a file name matches one of the excluded names or patterns."""
+        if name in self._exclude_files:
+            return True
+        return bool(
+            self._exclude_file_globs and self._exclude_file_globs.fullmatch(name)
+        )
+
+    def is_included(self, rel_path: str) -> bool:
+        """Whether a file passes the include list (everything does if it's empty)."""
+        if not self._has_includes or rel_path in self._include_files:
+            return True
+        return bool(
+            self._include_globs
+            and self._include_globs.fullmatch(rel_path.replace(os.sep, "/"))
+        )
+
+    def is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """Whether an ignore file rules out a path.
+
+        The closest ignore file with a matching rule decides, as in git.
+        """
+        if not self._ignore_rules:
+            return False
+        parts = rel_path.replace(os.sep, "/").split("/")
+        for depth in range(len(parts) - 1, -1, -1):
+            rules = self._ignore_rules.get("/".join(parts[:depth]))
+            if rules is None:
+                continue
+            decision = rules.match("/".join(parts[depth:]), is_dir)
+            if decision is not None:
+                return decision
+        return False
+
+    def excludes_path(self, rel_path: str) -> bool:
+        """Whether a relative path sits in an excluded directory or is an excluded file."""
+        parts = os.path.normpath(rel_path).split(os.sep)
+        if any(self.is_excluded_dir(part) for part in parts[:-1]):
+            return True
+        return self.is_excluded_file(parts[-1])
+
+    def selects(self, rel_path: str, name: str) -> bool:
+        """Whether a file found by the scan should be aggregated.
+
+        Directories were already pruned during the scan, so only the file's
+        own name, extension and path need checking here.
+        """
+        return (
+            self.is_programming_file(name)
+            and not self.is_excluded_file(name)
+            and self.is_included(rel_path)
+        )
@@ -0,0 +1,86 @@
+"""Statistics about the files that went into an output.
+
+The aggregator adds each file to a CodebaseStats as its section is written,
+using the bytes it already read, so the metadata block describes exactly
+the files in the output and costs no extra reads.
+"""
+
+import os
+from typing import Dict, Iterable, Optional
+
+from .comments import LineCounts
+from .scanner import ScannedFile
+
+
+def _plural(count: int, noun: str) -> str:
+    return f"{count:,} {noun}{'' if count == 1 else 's'}"
+
+
+class CodebaseStats:
+    """Running totals of files, bytes and lines, overall and per language."""
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.lines = LineCounts()
+        # Per language (by extension): [files, LineCounts]
+        self.languages: Dict[str, list] = {}
+
+    @classmethod
+    def upper_bound(cls, entries: Iterable[ScannedFile]) -> "CodebaseStats":
+        """Stats at least as large as the files could have, from their sizes alone.
+
+        A file has no more lines of any kind than it has bytes, so these are
+        used to set space aside for the metadata before the files are read.
+        """
+        stats = cls()
+        for entry in entries:
+            stats.add(
+                entry.name, entry.size, LineCounts(entry.size, entry.size, entry.size)
+            )
+        return stats
+
+    def add(self, file_path: str, size: int, lines: Optional[LineCounts]) -> None:
+        """Counts one file.
+
+        Args:
+            file_path: The file's path, used to pick its language
+            size: The file's size in bytes
+            lines: Its line counts, or None if it couldn't be read
+        """
+        if lines is None:
+            return
+        self.files += 1
+        self.bytes += size
+        self.lines = LineCounts(*(a + b for a, b in zip(self.lines, lines)))
+        name = os.path.basename(file_path)
+        language = os.path.splitext(name)[1].lower() or name
+        totals = self.languages.setdefault(language, [0, LineCounts()])
+        totals[0] += 1
+        totals[1] = LineCounts(*(a + b for a, b in zip(totals[1], lines)))
+
+    def format_languages(self) -> str:
+        """The per-language breakdown on one line, biggest language first."""
+        ranked = sorted(
+            self.languages.items(), key=lambda item: (-item[1][1].total, item[0])
+        )
+        return "; ".join(
+            f"{language}: {_plural(files, 'file')}, {_plural(lines.total, 'line')}"
+            for language, (files, lines) in ranked
+        )
+
+    def to_dict(self) -> dict:
+        """The totals as the metadata block's entries."""
+        total = self.lines.total
+        metadata = {
+            "code_files": self.files,
+            "total_bytes": self.bytes,
+            "total_lines": total,
+            "code_lines": self.lines.code,
+            "comment_lines": self.lines.comment,
+            "blank_lines": self.lines.blank,
+            "comment_ratio": (self.lines.comment / total) if total else 0,
+        }
+        if self.languages:
+            metadata["languages"] = self.format_languages()
+        return metadata
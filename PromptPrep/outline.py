@@ -0,0 +1,511 @@
+"""Outlines of source files for summary mode.
+
+An outline keeps a file's declarations (imports, types, classes and
+function signatures) and drops the bodies. Each language registers an
+extractor for its extensions with register_extractor. Python is parsed with
+ast; the brace languages (JavaScript/TypeScript, Go, Rust, Java, C/C++) are
+outlined by one line scanner driven by a few regexes per language, which
+needs no parser and keeps up with files of any size.
+"""
+
+import bisect
+import hashlib
+import itertools
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Pattern,
+    Tuple,
+)
+
+from .comments import mask_comments
+
+if TYPE_CHECKING:
+    import ast  # Imported where it's used, so the CLI starts quickly
+
+# Takes a file's text and path and returns its outline. Raises SyntaxError
+# when the text can't be outlined.
+OutlineExtractor = Callable[[str, str], str]
+
+_EXTRACTORS: Dict[str, OutlineExtractor] = {}
+
+
+def register_extractor(
+    *extensions: str,
+) -> Callable[[OutlineExtractor], OutlineExtractor]:
+    """Registers the decorated function as the extractor for these extensions."""
+
+    def register(extractor: OutlineExtractor) -> OutlineExtractor:
+        for extension in extensions:
+            _EXTRACTORS[extension.lower()] = extractor
+        return extractor
+
+    return register
+
+
+def get_extractor(file_path: str) -> Optional[OutlineExtractor]:
+    """The extractor registered for a file's extension, if any."""
+    return _EXTRACTORS.get(os.path.splitext(file_path)[1].lower())
+
+
+class UnsupportedLanguageError(ValueError):
+    """Raised when no extractor is registered for a file's extension."""
+
+
+def extract_outline(text: str, file_path: str) -> str:
+    """Outlines a file with the extractor registered for its extension.
+
+    Raises:
+        UnsupportedLanguageError: If there's no extractor for the extension
+        SyntaxError: If the extractor can't make sense of the text
+    """
+    extractor = get_extractor(file_path)
+    if extractor is None:
+        raise UnsupportedLanguageError(
+            f"No outline extractor for {os.path.basename(file_path)}"
+        )
+    return extractor(text, file_path)
+
+
+class OutlineCache:
+    """Outlines already extracted, keyed by a hash of the file's contents.
+
+    Vendored copies, generated files and repeated summaries of the same file
+    are outlined once. The least recently used outlines are dropped once
+    there are more than max_entries.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[OutlineExtractor, bytes], str]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self) -> dict:
+        return {"max_entries": self.max_entries}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["max_entries"])
+
+    def extract(self, text: str, file_path: str) -> str:
+        """Like extract_outline, but reuses the outline of identical text."""
+        extractor = get_extractor(file_path)
+        if extractor is None:
+            return extract_outline(text, file_path)
+        key = (
+            extractor,
+            hashlib.blake2b(
+                text.encode("utf-8", "surrogatepass"), digest_size=16
+            ).digest(),
+        )
+        with self._lock:
+            outline = self._entries.get(key)
+            if outline is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return outline
+        self.misses += 1
+
+        outline = extractor(text, file_path)
+        with self._lock:
+            self._entries[key] = outline
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return outline
+
+
+# Longest constant value shown in full; longer ones are abbreviated
+_MAX_VALUE_LENGTH = 80
+_CONSTANT_NAME = re.compile(r"_*[A-Z][A-Z0-9_]*$")
+_ABBREVIATIONS = {"Dict": "{...}", "Set": "{...}", "List": "[...]", "Tuple": "(...)"}
+
+
+def _value(node: "ast.expr") -> str:
+    import ast
+
+    text = ast.unparse(node)
+    if len(text) <= _MAX_VALUE_LENGTH and "\n" not in text:
+        return text
+    return _ABBREVIATIONS.get(type(node).__name__, "...")
+
+
+def _assignment(node: "ast.stmt", fields: bool) -> Optional[str]:
+    """The line to show for a constant, or for a field if fields is set."""
+    import ast
+
+    if isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+        if not (fields or _CONSTANT_NAME.match(node.target.id)):
+            return None
+        line = f"{node.target.id}: {ast.unparse(node.annotation)}"
+        return line + (f" = {_value(node.value)}" if node.value else "")
+    if isinstance(node, ast.Assign) and all(
+        isinstance(target, ast.Name) and _CONSTANT_NAME.match(target.id)
+        for target in node.targets
+    ):
+        targets = " = ".join(target.id for target in node.targets)
+        return f"{targets} = {_value(node.value)}"
+    return None
+
+
+def _docstring(node: "ast.AST", indent: str) -> List[str]:
+    import ast
+
+    docstring = ast.get_docstring(node)
+    if not docstring:
+        return []
+    docstring_lines = docstring.strip().split("\n")
+    if len(docstring_lines) == 1:
+        return [f'{indent}"""{docstring_lines[0]}"""']
+    return (
+        [f'{indent}"""']
+        + [f"{indent}{line}".rstrip() for line in docstring_lines]
+        + [f'{indent}"""']
+    )
+
+
+def outline_python_tree(tree: "ast.Module") -> str:
+    """Signatures, class bases, constants and docstrings from a parsed module.
+
+    Module and class constants (UPPER_CASE names) and annotated class fields
+    are listed with their values, abbreviated when long. Function bodies are
+    left out.
+    """
+    import ast
+
+    summary_lines: List[str] = []
+
+    def process_node_body(body_items, indent=""):
+        for item in body_items:
+            assignment = _assignment(item, fields=bool(indent))
+            if assignment:
+                summary_lines.append(indent + assignment)
+                continue
+            if not isinstance(
+                item, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+            ):
+                continue
+
+            if indent == "" and summary_lines and summary_lines[-1]:
+                summary_lines.append("")
+            for decorator in item.decorator_list:
+                summary_lines.append(f"{indent}@{ast.unparse(decorator)}")
+
+            if isinstance(item, ast.ClassDef):
+                bases = [ast.unparse(base) for base in item.bases]
+                bases += [ast.unparse(keyword) for keyword in item.keywords]
+                parents = f"({', '.join(bases)})" if bases else ""
+                summary_lines.append(f"{indent}class {item.name}{parents}:")
+                summary_lines.extend(_docstring(item, indent + "    "))
+                process_node_body(item.body, indent + "    ")
+            else:
+                prefix = (
+                    "async def" if isinstance(item, ast.AsyncFunctionDef) else "def"
+                )
+                returns = f" -> {ast.unparse(item.returns)}" if item.returns else ""
+                summary_lines.append(
+                    f"{indent}{prefix} {item.name}({ast.unparse(item.args)}){returns}:"
+                )
+                summary_lines.extend(_docstring(item, indent + "    "))
+
+            if indent == "":  # Only add empty line after top-level items
+                summary_lines.append("")
+
+    process_node_body(tree.body)
+    return "\n".join(summary_lines)
+
+
+@register_extractor(".py", ".pyi")
+def python_outline(text: str, file_path: str) -> str:
+    """Parses Python source and outlines it with outline_python_tree."""
+    import ast
+
+    return outline_python_tree(ast.parse(text, filename=file_path))
+
+
+class BraceLanguage(NamedTuple):
+    """What the outline scanner needs to know about a language with braces."""
+
+    # Top-level lines that start a declaration worth listing. Inside a
+    # container every member is listed.
+    declaration: Pattern[str]
+    # Declarations whose braces hold members to list rather than a body
+    container: Pattern[str]
+    # Declarations whose braces are part of the statement, like
+    # `import { a } from "x"`, so they don't open a block
+    inline: Optional[Pattern[str]] = None
+    # Lines to list on their own and otherwise ignore, like C's #include
+    directive: Optional[Pattern[str]] = None
+
+
+INDENT = "    "
+# A line ending with one of these continues on the next one
+_CONTINUED = re.compile(r"(?:=|=>|->|&&|\|\|)\s*$")
+# Longest multi-line signature that is joined into one line
+_MAX_HEAD_LINES = 40
+_PUNCTUATION = re.compile(r"[(){};\[\]]")
+_BRACES = re.compile(r"[{}]")
+
+
+def _find_terminator(masked: str, inline: bool) -> Tuple[int, int]:
+    """Finds the first { or ; outside parentheses and brackets.
+
+    Returns:
+        The index of the terminator (or -1) and the bracket depth at the end
+    """
+    depth = 0
+    for match in _PUNCTUATION.finditer(masked):
+        char = match.group()
+        if char in "([" or (inline and char == "{"):
+            depth += 1
+        elif char in ")]" or (inline and char == "}"):
+            depth -= 1
+        elif depth <= 0 and char != "}":
+            return match.start(), depth
+    return -1, depth
+
+
+def _closes_on_line(masked: str) -> bool:
+    """Whether a block opened just before masked is closed again in it."""
+    depth = 1
+    for match in _BRACES.finditer(masked):
+        depth += 1 if match.group() == "{" else -1
+        if depth == 0:
+            return True
+    return False
+
+
+def _normalize(text: str) -> str:
+    """Joins a declaration's lines into one, as it would be written on one line."""
+    joined = " ".join(text.split())
+    if "\n" in text:
+        joined = re.sub(r"([(\[]) ", r"\1", joined)
+        joined = re.sub(r",? ([)\]])", r"\1", joined)
+    return joined
+
+
+def outline_braces(text: str, file_path: str, language: BraceLanguage) -> str:
+    """Outlines a file in a language that delimits blocks with braces.
+
+    Walks the file a line at a time with comments and string contents
+    masked out, keeping count of the open braces. Function bodies are
+    skipped entirely; containers (classes, structs, interfaces, ...) have
+    their members listed, one level of indentation per container.
+    """
+    lines = mask_comments(text, file_path).split("\n")
+    masked = mask_comments(text, file_path, strings=True)
+    masked_lines = masked.split("\n")
+    offsets = list(
+        itertools.accumulate((len(line) + 1 for line in masked_lines), initial=0)
+    )
+
+    out: List[str] = []
+    stack: List[bool] = []  # One per open brace: whether it's a container
+    head: List[int] = []  # Lines of a declaration that isn't finished yet
+    # Set when the last declaration listed has its { on the next line
+    brace_opens: Optional[bool] = None
+    in_directive = False  # On a continuation line of a preprocessor directive
+
+    def track(masked_line: str) -> None:
+        """Follows the braces on a line that isn't listed."""
+        for match in _BRACES.finditer(masked_line):
+            if match.group() == "{":
+                stack.append(False)
+            elif stack:
+                close(stack.pop(), masked_line[match.end() :])
+
+    def close(was_container: bool, tail: str) -> None:
+        if was_container:
+            tail = _normalize(tail)
+            if "{" in tail or "}" in tail:
+                tail = ""
+            separator = "" if not tail or tail[0] in ";," else " "
+            out.append(INDENT * len(stack) + "}" + separator + tail)
+        if not stack and out and out[-1]:
+            out.append("")
+
+    def skip_body(index: int) -> int:
+        """Jumps past the open bodies to the line that closes the outermost one.
+
+        Returns:
+            The line to carry on from, or len(masked_lines) at the end
+        """
+        first_body = stack.index(False)
+        unclosed = len(stack) - first_body
+        for match in _BRACES.finditer(masked, offsets[index]):
+            unclosed += 1 if match.group() == "{" else -1
+            if unclosed == 0:
+                del stack[first_body + 1 :]
+                line = bisect.bisect_right(offsets, match.start()) - 1
+                track(masked_lines[line][match.start() - offsets[line] :])
+                return line + 1
+        return len(masked_lines)
+
+    def next_line_opens_brace(index: int) -> bool:
+        for following in range(index + 1, len(masked_lines)):
+            if masked_lines[following].strip():
+                return masked_lines[following].lstrip().startswith("{")
+        return False
+
+    index = -1
+    while index + 1 < len(masked_lines):
+        index += 1
+        if not all(stack):  # Inside a body
+            index = skip_body(index) - 1
+            continue
+        masked_line = masked_lines[index]
+        stripped = masked_line.strip()
+        if in_directive:
+            in_directive = stripped.endswith("\\")
+            continue
+        if language.directive and stripped.startswith("#"):
+            in_directive = stripped.endswith("\\")
+            if language.directive.match(stripped):
+                directive = _normalize(lines[index]).rstrip("\\").rstrip()
+                out.append(INDENT * len(stack) + directive)
+            continue
+        if not head:
+            if not stripped:
+                continue
+            if stripped.startswith("{") and brace_opens is not None:
+                out[-1] += " {" if brace_opens else " { ... }"
+                stack.append(brace_opens)
+                brace_opens = None
+                track(masked_line.replace("{", " ", 1))
+                continue
+            brace_opens = None
+            if stripped.startswith("}") or (
+                not stack and not language.declaration.match(stripped)
+            ):
+                track(masked_line)
+                continue
+
+        head.append(index)
+        head_masked = "\n".join(masked_lines[i] for i in head)
+        head_code = "\n".join(lines[i] for i in head)
+        inline = bool(language.inline and language.inline.match(head_masked.strip()))
+        position, depth = _find_terminator(head_masked, inline)
+        indent = INDENT * len(stack)
+
+        if position < 0:
+            unfinished = depth > 0 or _CONTINUED.search(head_masked)
+            if unfinished and len(head) < _MAX_HEAD_LINES:
+                continue
+            out.append(indent + _normalize(head_code))
+            if next_line_opens_brace(index):
+                brace_opens = bool(language.container.match(head_masked.strip()))
+            head = []
+            continue
+
+        head = []
+        signature = _normalize(head_code[:position])
+        rest = head_masked[position + 1 :]
+        if head_masked[position] == ";":
+            out.append(f"{indent}{signature};")
+        elif not language.container.match(head_masked[:position].strip()):
+            out.append(f"{indent}{signature} {{ ... }}")
+            stack.append(False)
+        elif _closes_on_line(rest):
+            out.append(indent + _normalize(head_code))
+            continue
+        else:
+            out.append(f"{indent}{signature} {{")
+            stack.append(True)
+        # Whatever follows on the line only matters for its braces
+        track(rest)
+
+    if head:
+        out.append(INDENT * len(stack) + _normalize("\n".join(lines[i] for i in head)))
+    return "\n".join(out).strip("\n") + "\n" if out else ""
+
+
+def _brace_extractor(language: BraceLanguage) -> OutlineExtractor:
+    def extract(text: str, file_path: str) -> str:
+        return outline_braces(text, file_path, language)
+
+    return extract
+
+
+_JS_MODIFIERS = r"(?:(?:export|default|declare|abstract|async)\s+)*"
+
+JAVASCRIPT = BraceLanguage(
+    declaration=re.compile(
+        _JS_MODIFIERS
+        + r"(?:function\b|class\b|interface\b|type\b|enum\b|namespace\b|module\b"
+        r"|const\b|let\b|var\b|import\b|export\b|@\w)"
+        r"|module\.exports\b|exports\.\w"
+    ),
+    container=re.compile(
+        _JS_MODIFIERS + r"(?:(?:const\s+)?enum|class|interface|namespace|module)\b"
+        r"|" + _JS_MODIFIERS + r"type\s+\w+[^=]*=\s*$"
+    ),
+    inline=re.compile(r"import\b|export\s*(?:type\s*)?[{*]"),
+)
+
+GO = BraceLanguage(
+    declaration=re.compile(r"(?:package|import|func|type|var|const)\b"),
+    container=re.compile(r"type\s+\w+.*\b(?:struct|interface)\s*$"),
+)
+
+_RUST_VISIBILITY = r"(?:pub(?:\([^)]*\))?\s+)?"
+
+RUST = BraceLanguage(
+    declaration=re.compile(
+        _RUST_VISIBILITY
+        + r"(?:(?:const|async|unsafe|default|extern(?:\s+\"[^\"]*\")?)\s+)*"
+        r"(?:fn|struct|enum|trait|impl|type|mod|use|const|static|union|macro_rules!)\b"
+        r"|#!?\["
+    ),
+    container=re.compile(
+        _RUST_VISIBILITY + r"(?:unsafe\s+)?(?:struct|enum|trait|impl|mod|union)\b"
+    ),
+    inline=re.compile(_RUST_VISIBILITY + r"use\b"),
+)
+
+_JAVA_MODIFIERS = (
+    r"(?:(?:public|protected|private|abstract|final|static|sealed|non-sealed"
+    r"|strictfp)\s+)*"
+)
+
+JAVA = BraceLanguage(
+    declaration=re.compile(
+        r"(?:package|import)\b|@\w"
+        r"|" + _JAVA_MODIFIERS + r"(?:class|interface|enum|record|@interface)\b"
+    ),
+    container=re.compile(
+        r"(?:@\w+(?:\([^)]*\))?\s+)*"
+        + _JAVA_MODIFIERS
+        + r"(?:class|interface|enum|record|@interface)\b"
+    ),
+)
+
+C_FAMILY = BraceLanguage(
+    # Everything at the top level of a C or C++ file is a declaration
+    declaration=re.compile(r"[A-Za-z_~:\[]"),
+    container=re.compile(
+        r"(?:template\s*<.*>\s*)?(?:typedef\s+)?"
+        r"(?:class|struct|union|enum(?:\s+class)?|namespace)\b(?![^{]*\()"
+        r'|extern\s+"'
+    ),
+    directive=re.compile(r"#\s*(?:include|define|import|pragma)\b"),
+)
+
+register_extractor(".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx")(
+    _brace_extractor(JAVASCRIPT)
+)
+register_extractor(".go")(_brace_extractor(GO))
+register_extractor(".rs")(_brace_extractor(RUST))
+register_extractor(".java")(_brace_extractor(JAVA))
+register_extractor(".c", ".h", ".cc", ".cpp", ".cxx", ".hh", ".hpp", ".hxx")(
+    _brace_extractor(C_FAMILY)
+)
@@ -0,0 +1,229 @@
+"""Stage timers and counters for finding out where a run spends its time.
+
+CodeAggregator reports each stage of its work (scanning, reading, stripping
+comments, summarizing, formatting, tokenizing, writing, ...) and a few
+counters to a profiler. The default NullProfiler ignores all of it, so runs
+without --profile pay next to nothing.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+
+class Span(NamedTuple):
+    """One timed stage."""
+
+    name: str
+    start: float  # Seconds since the profiler was created
+    duration: float
+    thread: int
+
+
+class _NullStage:
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info) -> bool:
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class NullProfiler:
+    """Accepts the same calls as Profiler and records nothing."""
+
+    enabled = False
+
+    def stage(self, name: str):
+        """Times the enclosed block as one call of the named stage."""
+        return _NULL_STAGE
+
+    def count(self, name: str, n: int = 1) -> None:
+        """Adds n to the named counter."""
+
+    def session(self):
+        """Wraps a whole run."""
+        return _NULL_STAGE
+
+
+class Profiler(NullProfiler):
+    """Records how long each stage takes and counts what the run did.
+
+    Stages can be timed from several threads at once, so with --jobs the
+    stage totals can add up to more than the wall time. Each stage's time is
+    added to a running total as it finishes; the individual spans, one per
+    stage call, are only kept for a Chrome trace.
+    """
+
+    enabled = True
+
+    def __init__(self, cprofile_output: Optional[str] = None, keep_spans: bool = False):
+        """Starts the clock.
+
+        Args:
+            cprofile_output: If set, each session also runs under cProfile and
+                the stats are saved to this path (readable with pstats)
+            keep_spans: Keep every stage call for to_chrome_trace, rather than
+                only the totals. Large trees make millions of them.
+        """
+        self.cprofile_output = cprofile_output
+        self.keep_spans = keep_spans
+        self.spans: List[Span] = []
+        self.counters: Counter = Counter()
+        # Per stage: [seconds, calls], in the order stages first ran
+        self._totals: Dict[str, list] = {}
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._wall: Optional[float] = None
+        # When the first stage started and the last one ended
+        self._first: Optional[float] = None
+        self._last: Optional[float] = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                total = self._totals.get(name)
+                if total is None:
+                    total = self._totals[name] = [0.0, 0]
+                total[0] += end - start
+                total[1] += 1
+                if self._first is None or start < self._first:
+                    self._first = start
+                if self._last is None or end > self._last:
+                    self._last = end
+                if self.keep_spans:
+                    self.spans.append(
+                        Span(
+                            name,
+                            start - self._origin,
+                            end - start,
+                            threading.get_ident(),
+                        )
+                    )
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    @contextmanager
+    def session(self) -> Iterator[None]:
+        """Times a whole run, under cProfile when cprofile_output is set."""
+        profile = None
+        if self.cprofile_output:
+            import cProfile
+
+            profile = cProfile.Profile()
+            profile.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._wall = (self._wall or 0.0) + time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(self.cprofile_output)
+
+    @property
+    def wall_seconds(self) -> float:
+        """Time spent in sessions, or since the first stage started if there were none."""
+        if self._wall is not None:
+            return self._wall
+        if self._first is None:
+            return 0.0
+        return self._last - self._first
+
+    def stage_totals(self) -> Dict[str, Dict[str, float]]:
+        """Total seconds and number of calls per stage, in the order stages first ran."""
+        with self._lock:
+            return {
+                name: {"seconds": seconds, "calls": calls}
+                for name, (seconds, calls) in self._totals.items()
+            }
+
+    def to_dict(self) -> dict:
+        """The profile as plain data, for JSON output."""
+        return {
+            "wall_seconds": self.wall_seconds,
+            "stages": self.stage_totals(),
+            "counters": dict(self.counters),
+        }
+
+    def to_chrome_trace(self) -> dict:
+        """The spans in Chrome's trace event format.
+
+        Open the saved file in chrome://tracing or https://ui.perfetto.dev to
+        see every stage on a timeline, one row per thread.
+
+        Raises:
+            ValueError: If the profiler wasn't created with keep_spans
+        """
+        if not self.keep_spans:
+            raise ValueError("A Chrome trace needs a Profiler with keep_spans=True")
+        pid = os.getpid()
+        events = [
+            {
+                "name": span.name,
+                "cat": "promptprep",
+                "ph": "X",
+                "ts": span.start * 1e6,
+                "dur": span.duration * 1e6,
+                "pid": pid,
+                "tid": span.thread,
+            }
+            for span in self.spans
+        ]
+        events.append(
+            {
+                "name": "counters",
+                "ph": "C",
+                "ts": self.wall_seconds * 1e6,
+                "pid": pid,
+                "args": dict(self.counters),
+            }
+        )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def format_report(self) -> str:
+        """A plain text breakdown of the stages and counters."""
+        wall = self.wall_seconds
+        lines = [
+            f"Profile ({wall:.3f}s wall time)",
+            f"  {'stage':<12}{'calls':>8}{'seconds':>11}{'% wall':>9}",
+        ]
+        for name, total in self.stage_totals().items():
+            share = 100 * total["seconds"] / wall if wall else 0.0
+            lines.append(
+                f"  {name:<12}{total['calls']:>8}{total['seconds']:>11.4f}{share:>8.1f}%"
+            )
+        if self.counters:
+            lines.append("  counters:")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"    {name:<20}{value:>14,}")
+        return "\n".join(lines)
+
+    def write(self, path: str, output_format: str = "json") -> None:
+        """Saves the profile as JSON or as a Chrome trace.
+
+        Args:
+            path: Where to save it
+            output_format: "json" for totals and counters, "chrome" for a trace
+        """
+        if output_format == "chrome":
+            data = self.to_chrome_trace()
+        elif output_format == "json":
+            data = self.to_dict()
+        else:
+            raise ValueError(f"Unknown profile format: {output_format}")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
@@ -0,0 +1,113 @@
+"""Reads files ahead of the code that processes them.
+
+On network filesystems and slow disks most of the time spent reading a file
+is the round trip, not the transfer. read_ahead keeps several reads in
+flight on an asyncio event loop in a background thread, so while one file
+is being formatted the next ones are already on their way. The blocking
+reads themselves run on a small thread pool under the loop.
+"""
+
+import asyncio
+import mmap
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, Tuple, TypeVar, Union
+
+T = TypeVar("T")
+
+
+def read_ahead(
+    paths: Iterable[str],
+    read: Callable[[str], T],
+    depth: int = 16,
+    concurrency: Optional[int] = None,
+) -> Iterator[Tuple[str, Union[T, Exception]]]:
+    """Yields (path, read(path)) for each path, in order, reading ahead in the background.
+
+    A read that raises yields its exception instead, so one unreadable file
+    doesn't stop the rest. Closing the iterator early waits for the reads
+    already in flight and starts no new ones.
+
+    Args:
+        paths: The files to read, in the order they're wanted. May be a lazy
+            iterator; it's advanced from the background thread, only as far
+            as depth allows
+        read: Reads one file; called from the reader threads
+        depth: How many files may be read but not yet consumed, which
+            bounds the memory held by finished reads
+        concurrency: How many reads run at once (default: depth)
+    """
+    depth = max(1, depth)
+    concurrency = max(1, min(concurrency or depth, depth))
+    # (path, future) for each read started, in order; None once there are no more
+    started: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+    window = asyncio.Semaphore(depth)
+    closing = False
+    loop = asyncio.new_event_loop()
+    pool = ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="promptprep-read"
+    )
+
+    async def read_one(result: Future, path: str) -> None:
+        try:
+            data = await loop.run_in_executor(pool, read, path)
+        except Exception as e:
+            data = e
+        result.set_result(data)
+
+    async def schedule() -> None:
+        tasks = []
+        remaining = iter(paths)
+        try:
+            while True:
+                # Only advance paths once there's room for another read
+                await window.acquire()
+                path = None if closing else next(remaining, None)
+                if path is None:
+                    break
+                result: Future = Future()
+                started.put((path, result))
+                tasks.append(loop.create_task(read_one(result, path)))
+        finally:
+            started.put(None)
+            await asyncio.gather(*tasks)
+
+    thread = threading.Thread(
+        target=loop.run_forever, name="promptprep-read-ahead", daemon=True
+    )
+    thread.start()
+    scheduled = asyncio.run_coroutine_threadsafe(schedule(), loop)
+    try:
+        for path, result in iter(started.get, None):
+            data = result.result()
+            loop.call_soon_threadsafe(window.release)
+            yield path, data
+    finally:
+        closing = True
+        loop.call_soon_threadsafe(window.release)
+        try:
+            scheduled.result()
+        finally:
+            _discard_unread(started)
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+            pool.shutdown()
+
+
+def _discard_unread(started: "queue.Queue[Optional[Tuple[str, Future]]]") -> None:
+    """Lets go of reads that finished but were never handed out, closing any mmaps.
+
+    Otherwise a consumer that stops early leaves their data (and open maps)
+    alive until the garbage collector gets to them.
+    """
+    while True:
+        try:
+            item = started.get_nowait()
+        except queue.Empty:
+            return
+        if item is not None and item[1].done():
+            data = item[1].result()
+            if isinstance(data, mmap.mmap):
+                data.close()
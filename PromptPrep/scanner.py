@@ -0,0 +1,151 @@
+"""Walks a project directory once and keeps what it saw in memory.
+
+The tree renderer, the file filter, the size check and the metadata pass all
+read from the same snapshot instead of walking the filesystem on their own.
+"""
+
+import os
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set
+
+from .matcher import PathMatcher
+
+
+class ScannedFile(NamedTuple):
+    """A single file found during the scan."""
+
+    name: str
+    path: str
+    rel_path: str
+    size: int
+    mtime: float
+
+
+class ScannedDirectory(NamedTuple):
+    """A directory found during the scan, with the files directly inside it."""
+
+    name: str
+    path: str
+    rel_path: str
+    depth: int
+    excluded: bool
+    files: List[ScannedFile]
+
+
+class DirectorySnapshot:
+    """An in-memory picture of a directory tree, taken in a single walk."""
+
+    def __init__(self, root: str, directories: List[ScannedDirectory]):
+        """Wraps the results of a scan.
+
+        Args:
+            root: The directory the scan started from
+            directories: Every directory seen, in top-down walk order
+        """
+        self.root = root
+        self.directories = directories
+        self._files_by_path: Optional[Dict[str, ScannedFile]] = None
+
+    @classmethod
+    def scan(
+        cls,
+        root: str,
+        exclude_dirs: Optional[Set[str]] = None,
+        matcher: Optional[PathMatcher] = None,
+    ) -> "DirectorySnapshot":
+        """Walks the tree under root once, stat-ing each file a single time.
+
+        Uses os.scandir, so file types come from the directory listing and
+        each file's size and mtime from a single stat. Excluded directories
+        are recorded but never listed. Anything an ignore
+        file rules out is left out of the snapshot, and ignored directories are
+        pruned before they're walked.
+
+        Args:
+            root: Where to start walking
+            exclude_dirs: Directory names to skip (used when no matcher is given)
+            matcher: The compiled rules for the run
+
+        Returns:
+            The snapshot of everything that was found
+        """
+        if matcher is None:
+            matcher = PathMatcher(exclude_dirs=exclude_dirs or ())
+        matcher.clear_ignore_files()
+        directories: List[ScannedDirectory] = []
+
+        root_name = os.path.basename(root.rstrip(os.sep)) or root
+        # Directories still to visit, popped in the same top-down order os.walk uses
+        pending = [(root_name, root, "", 0)]
+        while pending:
+            name, dir_path, rel_path, depth = pending.pop()
+
+            # Decided from the name alone, so excluded directories are never listed
+            if matcher.is_excluded_dir(name):
+                directories.append(
+                    ScannedDirectory(name, dir_path, rel_path, depth, True, [])
+                )
+                continue
+
+            try:
+                with os.scandir(dir_path) as it:
+                    entries = list(it)
+            except OSError:
+                continue  # Unreadable directories are skipped, as os.walk does
+
+            subdirs = []
+            file_entries = []
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    file_entries.append(entry)
+                elif not entry.is_symlink():  # Symlinked directories aren't followed
+                    subdirs.append(entry)
+
+            matcher.load_ignore_files(
+                dir_path, rel_path, {entry.name for entry in file_entries}
+            )
+
+            scanned_files = []
+            for entry in file_entries:
+                file_rel_path = os.path.join(rel_path, entry.name)
+                if matcher.is_ignored(file_rel_path):
+                    continue
+                try:
+                    # Cached by DirEntry on some platforms; at most one stat per file
+                    st = entry.stat()
+                    size, mtime = st.st_size, st.st_mtime
+                except OSError:
+                    # Broken symlinks and the like; reading will report the error
+                    size, mtime = 0, 0.0
+                scanned_files.append(
+                    ScannedFile(entry.name, entry.path, file_rel_path, size, mtime)
+                )
+
+            directories.append(
+                ScannedDirectory(name, dir_path, rel_path, depth, False, scanned_files)
+            )
+
+            for entry in reversed(subdirs):
+                sub_rel_path = os.path.join(rel_path, entry.name)
+                if not matcher.is_ignored(sub_rel_path, is_dir=True):
+                    pending.append((entry.name, entry.path, sub_rel_path, depth + 1))
+
+        return cls(root, directories)
+
+    def iter_files(self) -> Iterator[ScannedFile]:
+        """Yields every file outside excluded directories, in walk order."""
+        for directory in self.directories:
+            yield from directory.files
+
+    def get(self, path: str) -> Optional[ScannedFile]:
+        """Looks up a scanned file by its full path."""
+        if self._files_by_path is None:
+            self._files_by_path = {f.path: f for f in self.iter_files()}
+        return self._files_by_path.get(path)
+
+    def __len__(self) -> int:
+        """Number of files in the snapshot."""
+        return sum(len(directory.files) for directory in self.directories)
@@ -31,6 +31,8 @@ class FileSelector:
         )  # Dictionary tracking selected items (True=include, False=exclude)
         self.exclude_dirs: Set[str] = set()  # Set of excluded directory paths
         self.files: List[str] = []
+        # Whether each listed path is a directory, from the last directory scan
+        self._listed_dirs: Dict[str, bool] = {}
         self.show_hidden = False
         self.status_message = ""
         self.save_selections = (
@@ -40,24 +42,23 @@ class FileSelector:
     def _get_directory_contents(self) -> List[str]:
         """Gets a sorted list of files and folders, optionally showing hidden items."""
         try:
-            items = os.listdir(self.current_path)
-            # Filter hidden files if show_hidden is False
-            if not self.show_hidden:
-                items = [item for item in items if not item.startswith(".")]
+            # The entry types come with the listing, so no stat per item is needed
+            with os.scandir(self.current_path) as it:
+                listed = {entry.path: self._entry_is_dir(entry) for entry in it}
+            self._listed_dirs = listed
+            dirs = []
+            files = []
+            for path, is_dir in listed.items():
+                item = os.path.basename(path)
+                # Filter hidden files if show_hidden is False
+                if not self.show_hidden and item.startswith("."):
+                    continue
+                (dirs if is_dir else files).append(item)
             # Add '..' for parent directory navigation (except at the root of the filesystem)
             if os.path.abspath(self.current_path) != os.path.abspath(os.path.sep):
-                items.insert(0, "..")
+                dirs.append("..")
+                listed[os.path.join(self.current_path, "..")] = True
             # Sort directories first, then files
-            dirs = [
-                item
-                for item in items
-                if os.path.isdir(os.path.join(self.current_path, item))
-            ]
-            files = [
-                item
-                for item in items
-                if not os.path.isdir(os.path.join(self.current_path, item))
-            ]
             return sorted(dirs) + sorted(files)
         except (PermissionError, FileNotFoundError):
             self.status_message = f"Cannot access directory: {self.current_path}"
@@ -65,6 +66,20 @@ class FileSelector:
             self.current_path = os.path.dirname(self.current_path)
             return self._get_directory_contents()
 
+    @staticmethod
+    def _entry_is_dir(entry: os.DirEntry) -> bool:
+        try:
+            return entry.is_dir()
+        except OSError:
+            return False
+
+    def _is_dir(self, path: str) -> bool:
+        """Whether path is a directory, using the last listing when it covers path."""
+        is_dir = self._listed_dirs.get(path)
+        if is_dir is None:
+            return os.path.isdir(path)
+        return is_dir
+
     def _draw_screen(self, stdscr) -> None:
         """Shows the current directory contents and selection status on screen."""
         stdscr.clear()
@@ -101,7 +116,7 @@ class FileSelector:
         ):
             y_pos = i + 3  # Start at line 3
             item_path = os.path.join(self.current_path, item)
-            is_dir = os.path.isdir(item_path)
+            is_dir = self._is_dir(item_path)
             is_selected = item_path in self.selected_items
             is_excluded = is_dir and item_path in self.exclude_dirs
 
@@ -161,7 +176,7 @@ class FileSelector:
 
     def _toggle_selection(self, path: str) -> None:
         """Cycles through include/exclude/unselected states for a file or directory."""
-        is_dir = os.path.isdir(path)
+        is_dir = self._is_dir(path)
 
         # For directories, toggle between include, exclude dir, and none
         if is_dir:
@@ -202,7 +217,7 @@ class FileSelector:
                 continue
 
             item_path = os.path.join(self.current_path, item)
-            if not os.path.isdir(item_path):  # Only consider files
+            if not self._is_dir(item_path):  # Only consider files
                 if item_path in self.selected_items:
                     any_selected = True
                     if not self.selected_items[item_path]:
@@ -216,7 +231,7 @@ class FileSelector:
                 continue
 
             item_path = os.path.join(self.current_path, item)
-            if not os.path.isdir(item_path):  # Only consider files
+            if not self._is_dir(item_path):  # Only consider files
                 if all_selected:
                     # If all are selected, deselect all
                     if item_path in self.selected_items:
@@ -247,7 +262,7 @@ class FileSelector:
             item_path = os.path.join(self.current_path, item)
 
             # Handle directory navigation
-            if os.path.isdir(item_path):
+            if self._is_dir(item_path):
                 if item == "..":
                     # Go up to parent directory
                     self.current_path = os.path.dirname(
@@ -0,0 +1,117 @@
+"""Streams the aggregated document to its destination a section at a time."""
+
+import io
+import os
+from typing import BinaryIO
+
+
+class OutputWriter:
+    """Writes text sections to a binary stream as UTF-8.
+
+    Nothing is buffered here beyond what the underlying stream does, so memory
+    use is bounded by the largest single section handed to write().
+    """
+
+    COPY_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, stream: BinaryIO):
+        """Wraps a binary stream such as an open file, a BytesIO or sys.stdout.buffer.
+
+        Args:
+            stream: Where the output goes
+        """
+        self.stream = stream
+        self.bytes_written = 0
+
+    def write(self, text: str) -> None:
+        """Encodes and writes a chunk of text."""
+        if text:
+            self.write_bytes(text.encode("utf-8"))
+
+    def write_bytes(self, data: bytes) -> None:
+        """Writes raw bytes that are already UTF-8 encoded."""
+        self.stream.write(data)
+        self.bytes_written += len(data)
+
+    def copy_from(self, source: BinaryIO) -> None:
+        """Copies everything left in a binary file object to the output."""
+        while True:
+            chunk = source.read(self.COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            self.write_bytes(chunk)
+
+    def copy_range(self, source: BinaryIO, offset: int, length: int) -> None:
+        """Copies length bytes starting at offset in source to the output.
+
+        When both sides are real files, the kernel does the copy with
+        copy_file_range (which can share blocks on filesystems that support
+        reflinks). Otherwise the bytes go through memory in chunks.
+        """
+        if length <= 0:
+            return
+        if self._copy_file_range(source, offset, length):
+            self.bytes_written += length
+            return
+        source.seek(offset)
+        remaining = length
+        while remaining:
+            chunk = source.read(min(self.COPY_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise IOError(f"Unexpected end of file copying {length} bytes")
+            self.write_bytes(chunk)
+            remaining -= len(chunk)
+
+    def _copy_file_range(self, source: BinaryIO, offset: int, length: int) -> bool:
+        """Tries a kernel-side copy. Returns False if it isn't available here."""
+        if not hasattr(os, "copy_file_range"):
+            return False
+        try:
+            source_fd = source.fileno()
+            self.stream.flush()
+            target_fd = self.stream.fileno()
+            target_offset = self.stream.tell()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return False
+
+        copied = 0
+        try:
+            while copied < length:
+                n = os.copy_file_range(
+                    source_fd,
+                    target_fd,
+                    length - copied,
+                    offset + copied,
+                    target_offset + copied,
+                )
+                if n == 0:
+                    break
+                copied += n
+        except OSError:
+            if copied == 0:
+                return False
+            raise
+        if copied != length:
+            raise IOError(f"Unexpected end of file copying {length} bytes")
+        # Explicit offsets leave the file position alone, so move it past the copy
+        self.stream.seek(target_offset + length)
+        return True
+
+
+class FlushingStream:
+    """Wraps a binary stream and flushes it after every write.
+
+    Used for terminals and pagers, so each section shows up as soon as it's
+    written instead of when the stream's buffer happens to fill.
+    """
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+
+    def write(self, data: bytes) -> int:
+        written = self.stream.write(data)
+        self.stream.flush()
+        return written
+
+    def flush(self) -> None:
+        self.stream.flush()
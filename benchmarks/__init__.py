@@ -0,0 +1,4 @@
+"""Throughput benchmarks for the aggregation pipeline.
+
+Run with ``python -m benchmarks.run --help``. Not shipped with the package.
+"""
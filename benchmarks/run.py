@@ -0,0 +1,369 @@
+"""Times the aggregation pipeline on a synthetic tree and records the results.
+
+Examples:
+
+    python -m benchmarks.run --files 500 --output results/main.json
+    python -m benchmarks.run --files 500 --compare results/main.json
+
+Each case is run once to warm up and then --repeat times. Results are saved
+as JSON together with the tree's shape and the environment, and --compare
+exits non-zero when any case's median got slower than --threshold.
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from promptprep.aggregator import CodeAggregator, DirectoryTreeGenerator
+
+from .synthetic import DEFAULT_LANGUAGES, TreeSpec, make_tree, touch_fraction
+
+CUSTOM_TEMPLATE = "${TITLE}\n\n${DIRECTORY_TREE}\n\n${FILES}\n\n${METADATA}\n"
+
+
+class Workspace(NamedTuple):
+    """The inputs shared by every case in a run."""
+
+    root: str
+    scratch: str
+    spec: TreeSpec
+    files: int
+    total_bytes: int
+
+
+class Case(NamedTuple):
+    """A single benchmark.
+
+    setup receives the workspace and returns the function to time. skip
+    returns a reason when the case can't run here, or None.
+    """
+
+    name: str
+    setup: Callable[[Workspace], Callable[[], object]]
+    skip: Optional[Callable[[], Optional[str]]] = None
+
+
+def _aggregate(**options) -> Callable[[Workspace], Callable[[], object]]:
+    def setup(ws: Workspace) -> Callable[[], object]:
+        kwargs = dict(options)
+        if kwargs.get("output_format") == "custom":
+            kwargs["template_file"] = os.path.join(ws.scratch, "template.txt")
+            with open(kwargs["template_file"], "w", encoding="utf-8") as f:
+                f.write(CUSTOM_TEMPLATE)
+        return lambda: CodeAggregator(directory=ws.root, **kwargs).aggregate_code()
+
+    return setup
+
+
+def _tree(ws: Workspace) -> Callable[[], object]:
+    generator = DirectoryTreeGenerator(
+        exclude_dirs=CodeAggregator.DEFAULT_EXCLUDE_DIRS,
+        programming_extensions=CodeAggregator.DEFAULT_PROGRAMMING_EXTENSIONS,
+    )
+    return lambda: generator.generate(ws.root)
+
+
+def _write_file(ws: Workspace) -> Callable[[], object]:
+    output = os.path.join(ws.scratch, "full_code.txt")
+    return lambda: CodeAggregator(directory=ws.root, output_file=output).write_to_file()
+
+
+def _compare_files(ws: Workspace) -> Callable[[], object]:
+    """Diffs the output of the tree before and after editing a tenth of it."""
+    before = os.path.join(ws.scratch, "before.txt")
+    after = os.path.join(ws.scratch, "after.txt")
+    edited = os.path.join(ws.scratch, "edited")
+    rel_paths = make_tree(edited, ws.spec)
+    CodeAggregator(directory=edited, output_file=before).write_to_file()
+    touch_fraction(edited, rel_paths, 0.1)
+    CodeAggregator(directory=edited, output_file=after).write_to_file()
+
+    aggregator = CodeAggregator(directory=ws.root)
+    return lambda: aggregator.compare_files(before, after)
+
+
+def _needs_pygments() -> Optional[str]:
+    if importlib.util.find_spec("pygments") is None:
+        return "pygments is not installed"
+    return None
+
+
+def _needs_tokenizer() -> Optional[str]:
+    try:
+        import tiktoken
+
+        tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        return f"tokenizer unavailable ({type(e).__name__})"
+    return None
+
+
+CASES: List[Case] = [
+    Case("tree", _tree),
+    Case("aggregate[plain]", _aggregate(output_format="plain")),
+    Case("aggregate[markdown]", _aggregate(output_format="markdown")),
+    Case("aggregate[html]", _aggregate(output_format="html")),
+    Case(
+        "aggregate[highlighted]",
+        _aggregate(output_format="highlighted"),
+        _needs_pygments,
+    ),
+    Case("aggregate[custom]", _aggregate(output_format="custom")),
+    Case("aggregate[summary]", _aggregate(summary_mode=True)),
+    Case("aggregate[metadata]", _aggregate(collect_metadata=True)),
+    Case(
+        "aggregate[count-tokens]",
+        _aggregate(count_tokens=True),
+        _needs_tokenizer,
+    ),
+    Case("write[plain]", _write_file),
+    Case("compare_files", _compare_files),
+]
+
+
+def time_case(func: Callable[[], object], repeat: int, warmup: int = 1) -> List[float]:
+    """Runs func warmup times untimed, then repeat times, returning each duration."""
+    for _ in range(warmup):
+        func()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def summarize(durations: Sequence[float], ws: Workspace) -> Dict[str, object]:
+    """Turns raw durations into the statistics saved for each case."""
+    median = statistics.median(durations)
+    return {
+        "runs": list(durations),
+        "min": min(durations),
+        "median": median,
+        "mean": statistics.fmean(durations),
+        "stdev": statistics.stdev(durations) if len(durations) > 1 else 0.0,
+        "files_per_second": ws.files / median if median else None,
+        "mb_per_second": (ws.total_bytes / 1e6) / median if median else None,
+    }
+
+
+def _environment() -> Dict[str, object]:
+    import promptprep
+
+    return {
+        "promptprep": promptprep.__version__,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_benchmarks(
+    spec: TreeSpec = TreeSpec(),
+    repeat: int = 5,
+    warmup: int = 1,
+    only: Optional[Sequence[str]] = None,
+    tree_dir: Optional[str] = None,
+) -> Dict[str, object]:
+    """Builds the tree (or uses tree_dir) and times every selected case.
+
+    Args:
+        spec: Shape of the synthetic tree
+        repeat: Timed runs per case
+        warmup: Untimed runs per case before timing
+        only: Substrings of case names to run (all cases if empty)
+        tree_dir: An existing directory to benchmark instead of a synthetic tree
+
+    Returns:
+        A JSON-serialisable record with "meta", "results" and "skipped"
+    """
+    results: Dict[str, object] = {}
+    skipped: Dict[str, str] = {}
+
+    with tempfile.TemporaryDirectory(prefix="promptprep-bench-") as scratch:
+        root = tree_dir or os.path.join(scratch, "tree")
+        if tree_dir is None:
+            make_tree(root, spec)
+        files, total_bytes = 0, 0
+        for dir_path, _, names in os.walk(root):
+            for name in names:
+                files += 1
+                total_bytes += os.path.getsize(os.path.join(dir_path, name))
+        ws = Workspace(root, scratch, spec, files, total_bytes)
+
+        for case in CASES:
+            if only and not any(pattern in case.name for pattern in only):
+                continue
+            reason = case.skip() if case.skip else None
+            if reason:
+                skipped[case.name] = reason
+                continue
+            # Progress bars still render (their cost is real) but out of sight
+            with (
+                warnings.catch_warnings(),
+                open(os.devnull, "w") as devnull,
+                contextlib.redirect_stderr(devnull),
+            ):
+                warnings.simplefilter("ignore")
+                func = case.setup(ws)
+                durations = time_case(func, repeat, warmup)
+            results[case.name] = summarize(durations, ws)
+
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "tree": {
+                "path": tree_dir,
+                "files": files,
+                "bytes": total_bytes,
+                **({} if tree_dir else spec._asdict()),
+            },
+            "repeat": repeat,
+            "environment": _environment(),
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+class Comparison(NamedTuple):
+    name: str
+    baseline: float
+    current: float
+    ratio: float
+    regressed: bool
+
+
+def compare(
+    baseline: Dict[str, object], current: Dict[str, object], threshold: float = 0.1
+) -> List[Comparison]:
+    """Compares the medians of the cases both runs have in common.
+
+    A case has regressed when its median is more than threshold (a fraction)
+    slower than the baseline's.
+    """
+    comparisons = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base:
+            continue
+        ratio = result["median"] / base["median"] if base["median"] else 1.0
+        comparisons.append(
+            Comparison(
+                name, base["median"], result["median"], ratio, ratio > 1 + threshold
+            )
+        )
+    return comparisons
+
+
+def format_report(record: Dict[str, object]) -> str:
+    """Renders a run's results as a plain text table."""
+    lines = [f"{'case':<26}{'median':>11}{'min':>11}{'files/s':>11}{'MB/s':>9}"]
+    for name, result in record["results"].items():
+        lines.append(
+            f"{name:<26}{result['median'] * 1000:>9.1f}ms{result['min'] * 1000:>9.1f}ms"
+            f"{result['files_per_second'] or 0:>11.0f}{result['mb_per_second'] or 0:>9.1f}"
+        )
+    for name, reason in record["skipped"].items():
+        lines.append(f"{name:<26}skipped: {reason}")
+    return "\n".join(lines)
+
+
+def format_comparison(comparisons: Sequence[Comparison]) -> str:
+    """Renders a comparison against a baseline as a plain text table."""
+    lines = [f"{'case':<26}{'baseline':>11}{'current':>11}{'change':>9}"]
+    for c in comparisons:
+        flag = "  REGRESSION" if c.regressed else ""
+        lines.append(
+            f"{c.name:<26}{c.baseline * 1000:>9.1f}ms{c.current * 1000:>9.1f}ms"
+            f"{(c.ratio - 1) * 100:>+8.1f}%{flag}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark promptprep's aggregation pipeline on a synthetic tree."
+    )
+    parser.add_argument("--files", type=int, default=200, help="Number of files")
+    parser.add_argument("--depth", type=int, default=3, help="Deepest directory level")
+    parser.add_argument(
+        "--file-size", type=int, default=4096, help="Average file size in bytes"
+    )
+    parser.add_argument(
+        "--languages",
+        type=str,
+        default=",".join(DEFAULT_LANGUAGES),
+        help="Comma-separated extensions to mix (default: %(default)s)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the tree")
+    parser.add_argument(
+        "--tree", type=str, help="Benchmark an existing directory instead"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case")
+    parser.add_argument(
+        "--warmup", type=int, default=1, help="Untimed runs per case first"
+    )
+    parser.add_argument(
+        "--only", type=str, default="", help="Comma-separated case name filters"
+    )
+    parser.add_argument("--output", type=str, help="Save the results as JSON here")
+    parser.add_argument(
+        "--compare", type=str, metavar="BASELINE", help="Results JSON to compare with"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Slowdown that counts as a regression, as a fraction (default: 0.1)",
+    )
+    args = parser.parse_args(argv)
+
+    spec = TreeSpec(
+        files=args.files,
+        depth=args.depth,
+        file_size=args.file_size,
+        languages=tuple(e.strip() for e in args.languages.split(",") if e.strip()),
+        seed=args.seed,
+    )
+    record = run_benchmarks(
+        spec,
+        repeat=args.repeat,
+        warmup=args.warmup,
+        only=[o.strip() for o in args.only.split(",") if o.strip()],
+        tree_dir=args.tree,
+    )
+    print(format_report(record))
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        comparisons = compare(baseline, record, args.threshold)
+        print()
+        if baseline["meta"]["tree"] != record["meta"]["tree"]:
+            print("Note: the baseline was measured on a different tree.")
+        print(format_comparison(comparisons))
+        if any(c.regressed for c in comparisons):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""Generates synthetic source trees to benchmark against.
+
+Trees are deterministic for a given seed, so results from different runs
+and different machines measure the same input.
+"""
+
+import os
+import random
+from typing import Dict, List, NamedTuple, Sequence
+
+# One representative block of code per language; files repeat it until they
+# reach the requested size. {n} keeps each repetition distinct.
+LANGUAGE_TEMPLATES: Dict[str, str] = {
+    ".py": (
+        "# Helper number {n}\n"
+        "def helper_{n}(value, scale=2):\n"
+        '    """Scales value and adds the block number."""\n'
+        "    result = value * scale  # inline comment\n"
+        "    return result + {n}\n\n\n"
+        "class Widget{n}:\n"
+        "    def render(self):\n"
+        "        return helper_{n}(len(str(self)))\n\n\n"
+    ),
+    ".js": (
+        "// Helper number {n}\n"
+        "export function helper{n}(value, scale = 2) {{\n"
+        "  /* scales value */\n"
+        "  const result = value * scale;\n"
+        "  return result + {n};\n"
+        "}}\n\n"
+    ),
+    ".ts": (
+        "// Helper number {n}\n"
+        "export interface Shape{n} {{ width: number; height: number }}\n"
+        "export function area{n}(shape: Shape{n}): number {{\n"
+        "  return shape.width * shape.height + {n};\n"
+        "}}\n\n"
+    ),
+    ".go": (
+        "// Helper{n} scales a value.\n"
+        "func Helper{n}(value int, scale int) int {{\n"
+        "\tresult := value * scale\n"
+        "\treturn result + {n}\n"
+        "}}\n\n"
+    ),
+    ".rs": (
+        "/// Scales a value.\n"
+        "pub fn helper_{n}(value: i64, scale: i64) -> i64 {{\n"
+        "    let result = value * scale; // inline comment\n"
+        "    result + {n}\n"
+        "}}\n\n"
+    ),
+    ".java": (
+        "    /** Scales a value. */\n"
+        "    public static int helper{n}(int value, int scale) {{\n"
+        "        int result = value * scale;\n"
+        "        return result + {n};\n"
+        "    }}\n\n"
+    ),
+    ".c": (
+        "/* Scales a value. */\n"
+        "int helper_{n}(int value, int scale) {{\n"
+        "    int result = value * scale; // inline comment\n"
+        "    return result + {n};\n"
+        "}}\n\n"
+    ),
+    ".md": (
+        "## Section {n}\n\n"
+        "Some prose describing part {n} of the project, long enough to wrap "
+        "across a line or two in most editors.\n\n"
+    ),
+}
+
+DEFAULT_LANGUAGES = (".py", ".js", ".ts", ".go", ".rs", ".java", ".c", ".md")
+
+
+class TreeSpec(NamedTuple):
+    """The shape of a synthetic tree."""
+
+    files: int = 200
+    depth: int = 3
+    file_size: int = 4096
+    languages: Sequence[str] = DEFAULT_LANGUAGES
+    seed: int = 0
+
+
+def _file_body(extension: str, size: int, rng: random.Random) -> str:
+    template = LANGUAGE_TEMPLATES[extension]
+    parts: List[str] = []
+    length = 0
+    n = rng.randrange(1_000_000)
+    while length < size:
+        block = template.format(n=n)
+        parts.append(block)
+        length += len(block)
+        n += 1
+    return "".join(parts)[:size]
+
+
+def make_tree(root: str, spec: TreeSpec = TreeSpec()) -> List[str]:
+    """Writes a synthetic tree under root.
+
+    Files are spread over nested directories up to spec.depth levels deep,
+    cycling through the requested languages. File sizes vary by up to 50%
+    around spec.file_size.
+
+    Args:
+        root: Directory to create the tree in (created if missing)
+        spec: How many files, how deep, how large and in which languages
+
+    Returns:
+        The relative paths of the files written, in creation order
+    """
+    unknown = [ext for ext in spec.languages if ext not in LANGUAGE_TEMPLATES]
+    if unknown:
+        raise ValueError(f"No template for extension(s): {', '.join(unknown)}")
+
+    rng = random.Random(spec.seed)
+    written = []
+    for index in range(spec.files):
+        depth = index % (spec.depth + 1)
+        parts = [f"pkg{(index // (d + 1)) % 4}" for d in range(depth)]
+        extension = spec.languages[index % len(spec.languages)]
+        rel_path = os.path.join(*parts, f"module_{index}{extension}")
+
+        path = os.path.join(root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = max(1, int(spec.file_size * rng.uniform(0.5, 1.5)))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(_file_body(extension, size, rng))
+        written.append(rel_path)
+    return written
+
+
+def touch_fraction(root: str, rel_paths: Sequence[str], fraction: float) -> None:
+    """Appends a line to a fraction of the files, to simulate an edit."""
+    step = max(1, round(1 / fraction)) if fraction > 0 else 0
+    if not step:
+        return
+    for rel_path in rel_paths[::step]:
+        with open(os.path.join(root, rel_path), "a", encoding="utf-8") as f:
+            f.write("\n// edited\n")
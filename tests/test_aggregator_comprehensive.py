@@ -1,3 +1,4 @@
+import io
 import os
 import tempfile
 import pytest
@@ -277,6 +278,58 @@ class TestCodeAggregator:
             assert token_count == 4  # Simple word count
             mock_warn.assert_called_once()
 
+    @mock.patch("tiktoken.get_encoding")
+    def test_count_tokens_batch(self, mock_get_encoding):
+        """Test batched token counting encodes each distinct text once."""
+        mock_tokenizer = mock.MagicMock()
+        mock_tokenizer.encode_ordinary_batch.side_effect = lambda texts, **kwargs: [
+            text.split() for text in texts
+        ]
+        mock_get_encoding.return_value = mock_tokenizer
+
+        aggregator = CodeAggregator(count_tokens=True)
+        assert aggregator.count_tokens_batch(["a b", "c", "a b"]) == [2, 1, 2]
+        assert aggregator.count_tokens_batch(["c", "d e f"]) == [1, 3]
+
+        encoded = [
+            text
+            for call in mock_tokenizer.encode_ordinary_batch.call_args_list
+            for text in call.args[0]
+        ]
+        assert encoded == ["a b", "c", "d e f"]
+        mock_tokenizer.encode.assert_not_called()
+
+    @mock.patch("tiktoken.get_encoding")
+    def test_count_tokens_batch_fallback(self, mock_get_encoding):
+        """Test batched counting falls back to count_text_tokens."""
+        mock_tokenizer = mock.MagicMock()
+        mock_tokenizer.encode_ordinary_batch.side_effect = Exception("Test error")
+        mock_tokenizer.encode.side_effect = lambda text: text.split()
+        mock_get_encoding.return_value = mock_tokenizer
+
+        aggregator = CodeAggregator(count_tokens=True)
+        assert aggregator.count_tokens_batch(["one two", "three"]) == [2, 1]
+
+    @mock.patch("tiktoken.get_encoding")
+    def test_total_tokens_adds_up_sections(self, mock_get_encoding):
+        """Test the reported total is the sum of every section's tokens."""
+        mock_tokenizer = mock.MagicMock()
+        mock_tokenizer.encode.side_effect = lambda text: text.split()
+        mock_tokenizer.encode_ordinary_batch.side_effect = lambda texts, **kwargs: [
+            text.split() for text in texts
+        ]
+        mock_get_encoding.return_value = mock_tokenizer
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name in ("a.py", "b.py"):
+                with open(os.path.join(tmpdir, name), "w") as f:
+                    f.write(f"x = 1  # {name}\n")
+
+            aggregator = CodeAggregator(directory=tmpdir, count_tokens=True)
+            result = aggregator.aggregate_code()
+
+            assert aggregator.total_tokens == len(result.split())
+
     def test_aggregate_code_directory_not_found(self):
         """Test aggregate_code with non-existent directory."""
         aggregator = CodeAggregator(directory="/non/existent/dir")
@@ -479,6 +532,37 @@ class TestClass:
             assert "<!DOCTYPE html>" in html_result
             assert "<pre" in html_result
 
+    def test_write_to_stream_matches_aggregate_code(self):
+        """Test that streaming output is identical to the in-memory result."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, "test.py"), "w") as f:
+                f.write('# comment\nprint("Hello World")\n')
+            with open(os.path.join(tmpdir, "app.js"), "w") as f:
+                f.write("console.log('hi');\n")
+
+            aggregator = CodeAggregator(
+                directory=tmpdir, collect_metadata=True, output_format="html"
+            )
+            stream = io.BytesIO()
+            aggregator.write_to_stream(stream)
+
+            assert stream.getvalue().decode("utf-8") == aggregator.aggregate_code()
+
+    def test_write_to_file_streams_without_content(self):
+        """Test that write_to_file streams the document when no content is given."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, "test.py"), "w") as f:
+                f.write('print("Hello World")')
+            output_path = os.path.join(tmpdir, "out", "result.txt")
+
+            aggregator = CodeAggregator(directory=tmpdir, output_file=output_path)
+            aggregator.write_to_file()
+
+            with open(output_path, "r", encoding="utf-8") as f:
+                assert f.read() == aggregator.aggregate_code()
+            # No scratch files are left behind
+            assert os.listdir(os.path.dirname(output_path)) == ["result.txt"]
+
     @mock.patch("os.path.exists")
     @mock.patch("builtins.open", new_callable=mock.mock_open)
     def test_write_to_file(self, mock_open, mock_exists):
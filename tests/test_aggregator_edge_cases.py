@@ -1,3 +1,4 @@
+import mmap
 import os
 import tempfile
 from unittest import mock
@@ -238,3 +239,83 @@ def valid_function():
 
             # The content should still be processed despite the error
             assert 'print("hello")' in result
+
+
+class TestVerbatimContent:
+    """Tests for copying file bytes to the output without decoding them."""
+
+    FILES = {
+        "ascii.py": b"def f():\n    return 1  # note\n",
+        "crlf.py": b"x = 1\r\ny = 2\r\n",
+        "unicode.py": "name = 'caf\u00e9'\n".encode("utf-8"),
+        "invalid.py": b"x = '\xff\xfe'\n",
+        "empty.py": b"",
+    }
+
+    def _make_project(self, tmpdir):
+        for name, data in self.FILES.items():
+            with open(os.path.join(tmpdir, name), "wb") as f:
+                f.write(data)
+
+    def _decoded_output(self, **options):
+        with mock.patch.object(CodeAggregator, "_copies_content", return_value=False):
+            return CodeAggregator(**options).aggregate_code()
+
+    def test_output_matches_decoding_path(self):
+        """Test that raw copies give exactly what decoding would, in both formats."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self._make_project(tmpdir)
+            for output_format in ("plain", "markdown"):
+                options = dict(directory=tmpdir, output_format=output_format)
+                expected = self._decoded_output(**options)
+                assert CodeAggregator(**options).aggregate_code() == expected
+
+    def test_ascii_files_are_not_decoded(self):
+        """Test that only files whose bytes would change get decoded."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self._make_project(tmpdir)
+            with mock.patch(
+                "promptprep.aggregator._decode_source",
+                side_effect=lambda raw: raw.decode("utf-8", errors="ignore"),
+            ) as mock_decode:
+                CodeAggregator(directory=tmpdir).aggregate_code()
+
+            # crlf.py, unicode.py and invalid.py
+            assert mock_decode.call_count == 3
+
+    def test_large_files_are_memory_mapped(self):
+        """Test that large files are mapped and written straight to the output."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self._make_project(tmpdir)
+            output_file = os.path.join(tmpdir, "out.txt")
+            expected = self._decoded_output(directory=tmpdir)
+
+            aggregator = CodeAggregator(directory=tmpdir, output_file=output_file)
+            aggregator.MMAP_THRESHOLD = 1
+            read_source = CodeAggregator._read_source
+            mapped = []
+
+            def spy(self, *args, **kwargs):
+                data = read_source(self, *args, **kwargs)
+                mapped.append(isinstance(data, mmap.mmap))
+                return data
+
+            with mock.patch.object(
+                CodeAggregator, "_read_source", autospec=True, side_effect=spy
+            ):
+                aggregator.write_to_file()
+
+            assert mapped.count(True) == len(self.FILES) - 1  # Not the empty one
+            with open(output_file, encoding="utf-8") as f:
+                assert f.read() == expected
+
+    def test_transforming_options_still_decode(self):
+        """Test that line numbers and HTML escaping still go through the text path."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, "a.py"), "w") as f:
+                f.write("if a < b:\n    pass\n")
+
+            numbered = CodeAggregator(directory=tmpdir, line_numbers=True)
+            assert "1 | if a < b:" in numbered.aggregate_code()
+            html = CodeAggregator(directory=tmpdir, output_format="html")
+            assert "if a &lt; b:" in html.aggregate_code()
@@ -469,3 +469,142 @@ class TestCustomFormatter:
             # Verify we still get some output, even with the template missing
             assert isinstance(result, str)
             assert len(result) > 0
+
+
+class TestRunManifest:
+    """Tests for incremental runs that patch the previous output."""
+
+    @staticmethod
+    def _write(path, text):
+        with open(path, "w") as f:
+            f.write(text)
+
+    @staticmethod
+    def _read(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def _full_rebuild(self, tmpdir, output_file, **kwargs):
+        rebuild = os.path.join(os.path.dirname(output_file), "rebuild.txt")
+        aggregator = CodeAggregator(directory=tmpdir, output_file=rebuild, **kwargs)
+        aggregator.write_to_file()
+        return self._read(aggregator.output_file)
+
+    @pytest.mark.parametrize(
+        "options",
+        [
+            {},
+            {"output_format": "markdown", "line_numbers": True},
+            {"output_format": "html", "collect_metadata": True},
+            {"collect_metadata": True, "count_tokens": True},
+        ],
+    )
+    def test_patched_output_matches_full_rebuild(self, options):
+        """Edits, additions and removals leave the same output as a fresh run."""
+        encoding = mock.Mock()
+        encoding.encode.side_effect = lambda text: text.split()
+        with (
+            tempfile.TemporaryDirectory() as tmpdir,
+            tempfile.TemporaryDirectory() as outdir,
+            mock.patch("tiktoken.get_encoding", return_value=encoding),
+        ):
+            for name in ("a.py", "b.py", "c.py"):
+                self._write(os.path.join(tmpdir, name), f"# {name}\nx = 1\n")
+            output_file = os.path.join(outdir, "out.txt")
+
+            first = CodeAggregator(
+                directory=tmpdir, output_file=output_file, incremental=True, **options
+            )
+            first.write_to_file()
+            output_file = first.output_file
+            assert os.path.exists(output_file + ".promptprep-manifest")
+
+            self._write(os.path.join(tmpdir, "b.py"), "y = 2  # edited\n")
+            self._write(os.path.join(tmpdir, "d.py"), "z = 3\n")
+            os.remove(os.path.join(tmpdir, "c.py"))
+
+            second = CodeAggregator(
+                directory=tmpdir, output_file=output_file, incremental=True, **options
+            )
+            with mock.patch.object(
+                second, "_render_batch", wraps=second._render_batch
+            ) as render:
+                second.write_to_file()
+
+            rendered = sorted(
+                os.path.basename(path)
+                for c in render.call_args_list
+                for path in c.args[0]
+            )
+            assert rendered == ["b.py", "d.py"]
+            assert self._read(output_file) == self._full_rebuild(
+                tmpdir, output_file, **options
+            )
+
+    def test_touched_file_is_reused_by_hash(self):
+        """A new timestamp with the same content doesn't re-render the file."""
+        with (
+            tempfile.TemporaryDirectory() as tmpdir,
+            tempfile.TemporaryDirectory() as outdir,
+        ):
+            source = os.path.join(tmpdir, "a.py")
+            self._write(source, "x = 1\n")
+            output_file = os.path.join(outdir, "out.txt")
+            CodeAggregator(
+                directory=tmpdir, output_file=output_file, incremental=True
+            ).write_to_file()
+
+            later = time.time() + 100
+            os.utime(source, (later, later))
+
+            second = CodeAggregator(
+                directory=tmpdir, output_file=output_file, incremental=True
+            )
+            with mock.patch.object(second, "_render_batch") as render:
+                second.write_to_file()
+            render.assert_not_called()
+            assert "x = 1" in self._read(output_file)
+
+    def test_manifest_ignored_when_output_was_changed(self):
+        """A hand-edited output can't be patched, so everything is rebuilt."""
+        with (
+            tempfile.TemporaryDirectory() as tmpdir,
+            tempfile.TemporaryDirectory() as outdir,
+        ):
+            self._write(os.path.join(tmpdir, "a.py"), "x = 1\n")
+            output_file = os.path.join(outdir, "out.txt")
+            CodeAggregator(
+                directory=tmpdir, output_file=output_file, incremental=True
+            ).write_to_file()
+            with open(output_file, "a") as f:
+                f.write("hand edit\n")
+
+            second = CodeAggregator(
+                directory=tmpdir, output_file=output_file, incremental=True
+            )
+            with mock.patch.object(
+                second, "_render_batch", wraps=second._render_batch
+            ) as render:
+                second.write_to_file()
+            assert render.call_count == 1
+            assert "hand edit" not in self._read(output_file)
+
+    def test_manifest_ignored_when_options_change(self):
+        """Sections rendered with other settings are never reused."""
+        with (
+            tempfile.TemporaryDirectory() as tmpdir,
+            tempfile.TemporaryDirectory() as outdir,
+        ):
+            self._write(os.path.join(tmpdir, "a.py"), "x = 1\n")
+            output_file = os.path.join(outdir, "out.txt")
+            CodeAggregator(
+                directory=tmpdir, output_file=output_file, incremental=True
+            ).write_to_file()
+
+            CodeAggregator(
+                directory=tmpdir,
+                output_file=output_file,
+                incremental=True,
+                line_numbers=True,
+            ).write_to_file()
+            assert "1 | x = 1" in self._read(output_file)
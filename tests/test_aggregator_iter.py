@@ -0,0 +1,111 @@
+import os
+import tempfile
+from unittest import mock
+
+from promptprep.aggregator import CodeAggregator, FileRecord
+
+
+def _make_tree(tmpdir):
+    files = {
+        "a.py": "# comment\nx = 1\n",
+        "pkg/b.js": "// note\nlet y = 2;\n",
+        "pkg/c.py": "def f():\n    return 3\n",
+    }
+    for rel_path, text in files.items():
+        path = os.path.join(tmpdir, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(text)
+    return files
+
+
+class TestIterSections:
+    """Tests for streaming rendered file sections."""
+
+    def test_sections_match_aggregate_code(self):
+        """Test that the sections are the file parts of the full output, in order."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = _make_tree(tmpdir)
+            aggregator = CodeAggregator(directory=tmpdir, output_format="markdown")
+
+            records = list(aggregator.iter_sections())
+
+            assert [r.path for r in records] == [
+                os.path.normpath(p) for p in ("a.py", "pkg/b.js", "pkg/c.py")
+            ]
+            for record in records:
+                assert isinstance(record, FileRecord)
+                assert record.size == len(files[record.path.replace(os.sep, "/")])
+                assert record.tokens is None
+            assert "".join(r.content for r in records) in aggregator.aggregate_code()
+
+    def test_sections_are_rendered_lazily(self):
+        """Test that taking one section only reads one file."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _make_tree(tmpdir)
+            aggregator = CodeAggregator(directory=tmpdir)
+
+            with mock.patch.object(
+                aggregator, "_read_source", wraps=aggregator._read_source
+            ) as read:
+                first = next(aggregator.iter_sections())
+
+            assert first.path == "a.py"
+            assert read.call_count == 1
+
+
+class TestIterFiles:
+    """Tests for streaming processed file content."""
+
+    def test_processed_content_and_tokens(self):
+        """Test that content is processed but unformatted, with token counts."""
+        encoding = mock.Mock()
+        encoding.encode.side_effect = lambda text: text.split()
+        encoding.encode_ordinary_batch.side_effect = lambda texts, **_: [
+            text.split() for text in texts
+        ]
+        with (
+            tempfile.TemporaryDirectory() as tmpdir,
+            mock.patch("tiktoken.get_encoding", return_value=encoding),
+        ):
+            _make_tree(tmpdir)
+            aggregator = CodeAggregator(
+                directory=tmpdir,
+                include_comments=False,
+                count_tokens=True,
+                collect_metadata=True,
+            )
+
+            records = {r.path: r for r in aggregator.iter_files()}
+
+            assert records["a.py"].content == "x = 1\n"
+            assert records["a.py"].tokens == 3
+            assert records["a.py"].lines.comment == 1
+            assert records[os.path.join("pkg", "b.js")].content == "let y = 2;\n"
+
+    def test_tokens_are_counted_in_batches(self):
+        """Test that the files' tokens are counted a batch at a time, not one by one."""
+        encoding = mock.Mock()
+        encoding.encode_ordinary_batch.side_effect = lambda texts, **_: [
+            text.split() for text in texts
+        ]
+        with (
+            tempfile.TemporaryDirectory() as tmpdir,
+            mock.patch("tiktoken.get_encoding", return_value=encoding),
+        ):
+            for i in range(40):
+                with open(os.path.join(tmpdir, f"m{i:02}.py"), "w") as f:
+                    f.write(f"x = {i}\n")
+            aggregator = CodeAggregator(directory=tmpdir, count_tokens=True)
+
+            records = list(aggregator.iter_files())
+
+            assert [r.tokens for r in records] == [3] * 40
+            batches = [
+                len(c.args[0]) for c in encoding.encode_ordinary_batch.mock_calls
+            ]
+            assert batches == [
+                CodeAggregator.TOKEN_BATCH_SIZE,
+                40 - CodeAggregator.TOKEN_BATCH_SIZE,
+            ]
+            assert not encoding.encode.called
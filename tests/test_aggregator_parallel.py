@@ -0,0 +1,99 @@
+import os
+import tempfile
+
+import pytest
+
+from promptprep.aggregator import CodeAggregator
+
+
+def _make_tree(tmpdir, count=25):
+    """Creates a handful of Python files spread over a few directories."""
+    for i in range(count):
+        sub = os.path.join(tmpdir, f"pkg{i % 3}")
+        os.makedirs(sub, exist_ok=True)
+        with open(os.path.join(sub, f"mod{i}.py"), "w") as f:
+            f.write(
+                f'def func_{i}(x):\n    """Doc {i}."""\n    return x + {i}  # add\n'
+            )
+
+
+class TestParallelAggregation:
+    """Tests for running per-file work on a worker pool."""
+
+    @pytest.mark.parametrize("executor", ["thread", "process"])
+    def test_parallel_output_matches_serial(self, executor):
+        """Test that output is identical and in the same order with --jobs."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _make_tree(tmpdir)
+            options = dict(
+                directory=tmpdir,
+                summary_mode=True,
+                line_numbers=True,
+                output_format="markdown",
+            )
+
+            serial = CodeAggregator(**options).aggregate_code()
+            parallel = CodeAggregator(
+                jobs=4, executor=executor, **options
+            ).aggregate_code()
+
+            assert parallel == serial
+
+    def test_parallel_custom_template(self):
+        """Test that custom templates get every file when run in parallel."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _make_tree(tmpdir, count=8)
+            template = os.path.join(tmpdir, "template.txt")
+            with open(template, "w") as f:
+                f.write("${FILES}")
+
+            serial = CodeAggregator(
+                directory=tmpdir, output_format="custom", template_file=template
+            ).aggregate_code()
+            parallel = CodeAggregator(
+                directory=tmpdir,
+                output_format="custom",
+                template_file=template,
+                jobs=3,
+            ).aggregate_code()
+
+            assert parallel == serial
+            assert "func_7" in parallel
+
+    def test_invalid_executor(self):
+        """Test that an unknown executor type is rejected."""
+        with pytest.raises(ValueError, match="Unknown executor"):
+            CodeAggregator(jobs=2, executor="gpu")
+
+    @pytest.mark.parametrize(
+        "jobs, executor", [(1, "thread"), (4, "thread"), (2, "process")]
+    )
+    def test_read_ahead_output_matches_serial(self, jobs, executor):
+        """Test that reading ahead leaves the output and read errors unchanged."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _make_tree(tmpdir)
+            os.symlink(
+                os.path.join(tmpdir, "missing.py"), os.path.join(tmpdir, "broken.py")
+            )
+            options = dict(directory=tmpdir, line_numbers=True, collect_metadata=True)
+
+            serial = CodeAggregator(**options).aggregate_code()
+            read_ahead = CodeAggregator(
+                jobs=jobs, executor=executor, read_ahead=8, **options
+            ).aggregate_code()
+
+            assert read_ahead == serial
+
+    def test_auto_executor_uses_processes_for_highlighting(self):
+        """Test that highlighting goes to processes and keeps the serial output."""
+        pytest.importorskip("pygments")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _make_tree(tmpdir, count=6)
+            serial = CodeAggregator(directory=tmpdir, output_format="highlighted")
+            parallel = CodeAggregator(
+                directory=tmpdir, output_format="highlighted", jobs=2
+            )
+
+            assert parallel._uses_processes()
+            assert not CodeAggregator(jobs=2)._uses_processes()
+            assert parallel.aggregate_code() == serial.aggregate_code()
@@ -0,0 +1,86 @@
+import json
+import os
+import tempfile
+
+from benchmarks.run import CASES, compare, main, run_benchmarks
+from benchmarks.synthetic import TreeSpec, make_tree
+
+SMALL_TREE = TreeSpec(files=9, depth=2, file_size=300, languages=(".py", ".js", ".md"))
+
+
+class TestSyntheticTree:
+    """Tests for the generated benchmark input."""
+
+    def test_tree_has_requested_shape(self):
+        """Test that the tree has the requested files, depth and languages."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            rel_paths = make_tree(tmpdir, SMALL_TREE)
+
+            assert len(rel_paths) == 9
+            assert max(p.count(os.sep) for p in rel_paths) == 2
+            assert {os.path.splitext(p)[1] for p in rel_paths} == {".py", ".js", ".md"}
+            for rel_path in rel_paths:
+                size = os.path.getsize(os.path.join(tmpdir, rel_path))
+                assert 150 <= size <= 450
+
+    def test_tree_is_deterministic(self):
+        """Test that the same seed always writes the same files."""
+        with tempfile.TemporaryDirectory() as a, tempfile.TemporaryDirectory() as b:
+            paths = make_tree(a, SMALL_TREE)
+            assert make_tree(b, SMALL_TREE) == paths
+            for rel_path in paths:
+                with (
+                    open(os.path.join(a, rel_path)) as fa,
+                    open(os.path.join(b, rel_path)) as fb,
+                ):
+                    assert fa.read() == fb.read()
+
+
+class TestHarness:
+    """Smoke tests for the benchmark runner, on a tiny tree."""
+
+    def test_every_case_runs(self):
+        """Test that each case runs and records its timings."""
+        record = run_benchmarks(
+            SMALL_TREE,
+            repeat=1,
+            warmup=0,
+            only=[c.name for c in CASES if c.name != "aggregate[count-tokens]"],
+        )
+
+        assert record["meta"]["tree"]["files"] == 9
+        for name, result in record["results"].items():
+            assert result["median"] > 0, name
+            assert len(result["runs"]) == 1
+        expected = {c.name for c in CASES} - {"aggregate[count-tokens]"}
+        assert set(record["results"]) | set(record["skipped"]) == expected
+
+    def test_compare_flags_slowdowns(self):
+        """Test that only medians slower than the threshold count as regressions."""
+        baseline = {"results": {"a": {"median": 1.0}, "b": {"median": 1.0}}}
+        current = {
+            "results": {"a": {"median": 1.05}, "b": {"median": 1.5}, "c": {"median": 1}}
+        }
+
+        by_name = {c.name: c for c in compare(baseline, current, threshold=0.1)}
+
+        assert set(by_name) == {"a", "b"}
+        assert not by_name["a"].regressed
+        assert by_name["b"].regressed
+
+    def test_main_saves_and_compares(self, capsys):
+        """Test that results are saved as JSON and compared against a baseline."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, "results.json")
+            argv = ["--files", "4", "--file-size", "200", "--repeat", "1"]
+            argv += ["--only", "tree"]
+
+            assert main(argv + ["--output", output]) == 0
+            with open(output) as f:
+                saved = json.load(f)
+            assert list(saved["results"]) == ["tree"]
+
+            # A huge threshold so timing noise can't fail the test
+            code = main(argv + ["--compare", output, "--threshold", "1000"])
+            assert code == 0
+            assert "baseline" in capsys.readouterr().out
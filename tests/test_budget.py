@@ -0,0 +1,212 @@
+import os
+import tempfile
+from unittest import mock
+
+import pytest
+
+from promptprep.aggregator import CodeAggregator
+from promptprep.budget import import_centrality, rank_files
+from promptprep.scanner import DirectorySnapshot
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+@pytest.fixture
+def word_tokenizer():
+    """A tokenizer that counts whitespace-separated words."""
+    encoding = mock.Mock()
+    encoding.encode.side_effect = lambda text: text.split()
+    encoding.encode_ordinary_batch.side_effect = lambda texts, **kwargs: [
+        text.split() for text in texts
+    ]
+    with mock.patch("tiktoken.get_encoding", return_value=encoding):
+        yield encoding
+
+
+class TestRanking:
+    """Tests for deciding which files matter most."""
+
+    def test_import_centrality_counts_importers(self):
+        """Test that Python and relative script imports are resolved to files."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _write(os.path.join(tmpdir, "pkg", "__init__.py"), "")
+            _write(os.path.join(tmpdir, "pkg", "core.py"), "X = 1\n")
+            _write(os.path.join(tmpdir, "pkg", "a.py"), "from .core import X\n")
+            _write(os.path.join(tmpdir, "b.py"), "import pkg.core\nimport os\n")
+            _write(os.path.join(tmpdir, "web", "util.js"), "export const x = 1;\n")
+            _write(
+                os.path.join(tmpdir, "web", "app.js"), "import { x } from './util';\n"
+            )
+
+            entries = list(DirectorySnapshot.scan(tmpdir).iter_files())
+            centrality = import_centrality(entries)
+
+            assert centrality[os.path.join("pkg", "core.py")] == 2
+            assert centrality[os.path.join("web", "util.js")] == 1
+            assert os.path.join("pkg", "a.py") not in centrality
+
+    def test_priority_patterns_come_first(self):
+        """Test that files matching a priority pattern outrank everything else."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _write(os.path.join(tmpdir, "core.py"), "X = 1\n")
+            _write(os.path.join(tmpdir, "a.py"), "import core\n")
+            _write(os.path.join(tmpdir, "docs", "notes.md"), "text\n")
+
+            entries = list(DirectorySnapshot.scan(tmpdir).iter_files())
+
+            ranked = rank_files(entries, use_imports=True)
+            assert ranked[0].rel_path == "core.py"
+
+            ranked = rank_files(entries, ["docs/*"], use_imports=True)
+            assert ranked[0].rel_path == os.path.join("docs", "notes.md")
+
+
+class TestTokenBudget:
+    """Tests for fitting the output into a token budget."""
+
+    def _make_tree(self, tmpdir):
+        _write(os.path.join(tmpdir, "core.py"), "X = 1\n")
+        _write(
+            os.path.join(tmpdir, "big.py"),
+            "import core\n\n\ndef helper():\n"
+            '    """Does the work."""\n' + "    y = 1\n" * 200,
+        )
+        _write(os.path.join(tmpdir, "notes.md"), "word " * 300)
+
+    @staticmethod
+    def _spy(name):
+        """Patches a CodeAggregator method with a mock that still calls it."""
+        return mock.patch.object(
+            CodeAggregator,
+            name,
+            autospec=True,
+            side_effect=getattr(CodeAggregator, name),
+        )
+
+    def test_large_budget_includes_everything(self, word_tokenizer):
+        """Test that nothing is reduced when everything fits."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self._make_tree(tmpdir)
+            full = CodeAggregator(directory=tmpdir).aggregate_code()
+
+            aggregator = CodeAggregator(directory=tmpdir, token_budget=100_000)
+            assert aggregator.aggregate_code() == full
+            assert aggregator.budget_levels == {"full": 3, "omitted": 0}
+
+    def test_files_are_reduced_to_fit(self, word_tokenizer):
+        """Test that files that don't fit fall back to a summary, then a header."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self._make_tree(tmpdir)
+
+            aggregator = CodeAggregator(directory=tmpdir, token_budget=200)
+            result = aggregator.aggregate_code()
+
+            assert aggregator.total_tokens <= 200
+            assert aggregator.total_tokens == len(result.split())
+            assert aggregator.budget_levels["full"] == 1
+            assert aggregator.budget_levels["summary"] == 1
+            assert aggregator.budget_levels["header"] == 1
+            # core.py in full, big.py as a summary, notes.md as a header only
+            assert "X = 1" in result
+            assert "def helper():" in result
+            assert "y = 1" not in result
+            assert "notes.md" in result and "word word" not in result
+            # Sections stay in their usual order
+            full = CodeAggregator(directory=tmpdir).aggregate_code()
+            order = sorted(
+                ("core.py", "big.py"), key=lambda n: full.index(f"File: {n}")
+            )
+            assert result.index(f"File: {order[0]}") < result.index(f"File: {order[1]}")
+
+    def test_total_counts_the_metadata_as_written(self):
+        """Test that the reported total is the real count, not the metadata's reservation."""
+        # One token per character, so wider numbers cost more
+        encoding = mock.Mock()
+        encoding.encode.side_effect = list
+        encoding.encode_ordinary_batch.side_effect = lambda texts, **kwargs: [
+            list(text) for text in texts
+        ]
+        with (
+            tempfile.TemporaryDirectory() as tmpdir,
+            mock.patch("tiktoken.get_encoding", return_value=encoding),
+        ):
+            self._make_tree(tmpdir)
+
+            aggregator = CodeAggregator(
+                directory=tmpdir, token_budget=3000, collect_metadata=True
+            )
+            result = aggregator.aggregate_code()
+
+            assert aggregator.total_tokens <= 3000
+            # Everything but the blank lines after the metadata is counted
+            assert aggregator.total_tokens == len(result) - 2
+            assert f"{aggregator.total_tokens:,}" in result
+
+    def test_budget_too_small_for_any_file(self, word_tokenizer):
+        """Test that files are left out when not even their header fits."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self._make_tree(tmpdir)
+
+            aggregator = CodeAggregator(directory=tmpdir, token_budget=5)
+            with pytest.warns(UserWarning, match="token budget"):
+                aggregator.aggregate_code()
+
+            assert aggregator.budget_levels == {"omitted": 3}
+
+    def test_only_included_files_are_rendered(self, word_tokenizer):
+        """Test that files left out of the budget aren't rendered or tokenized in full."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for i in range(100):
+                _write(os.path.join(tmpdir, f"notes{i:03}.md"), "word " * 100)
+
+            aggregator = CodeAggregator(directory=tmpdir, token_budget=1000)
+            with (
+                self._spy("_render_batch") as render_batch,
+                self._spy("count_tokens_batch") as count_tokens_batch,
+            ):
+                aggregator.aggregate_code()
+
+            assert aggregator.total_tokens <= 1000
+            levels = aggregator.budget_levels
+            assert levels["full"] > 0 and levels["header"] > 0
+            rendered = sum(len(call.args[1]) for call in render_batch.call_args_list)
+            tokenized = sum(
+                len(call.args[1]) for call in count_tokens_batch.call_args_list
+            )
+            # Only files that make it into the output are rendered, and each
+            # file left out costs just its header
+            assert rendered <= levels["full"] + levels["header"] + 2
+            assert tokenized < 2 * 100
+            assert levels["omitted"] > 50
+
+    def test_size_guess_does_not_drop_a_file_that_fits(self, word_tokenizer):
+        """Test that a file whose size overstates its tokens is still included in full."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # 20 long words: a large guess from the size, but few real tokens
+            _write(os.path.join(tmpdir, "long.md"), ("x" * 50 + " ") * 20)
+
+            aggregator = CodeAggregator(directory=tmpdir, token_budget=60)
+            result = aggregator.aggregate_code()
+
+            size = os.path.getsize(os.path.join(tmpdir, "long.md"))
+            assert size // CodeAggregator.BUDGET_BYTES_PER_TOKEN > 60
+            assert aggregator.budget_levels == {"full": 1, "omitted": 0}
+            assert "x" * 50 in result
+
+    def test_imports_are_only_scanned_when_asked(self, word_tokenizer):
+        """Test that ranking doesn't read files ahead of rendering unless asked."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self._make_tree(tmpdir)
+
+            with mock.patch("promptprep.budget._read_head", return_value="") as head:
+                CodeAggregator(directory=tmpdir, token_budget=200).aggregate_code()
+                assert not head.called
+
+                CodeAggregator(
+                    directory=tmpdir, token_budget=200, rank_by_imports=True
+                ).aggregate_code()
+                assert head.call_count == 2
@@ -0,0 +1,87 @@
+import os
+import tempfile
+from unittest import mock
+
+from promptprep.aggregator import CodeAggregator
+from promptprep.cache import ProcessedFileCache
+
+
+class TestProcessedFileCache:
+    """Tests for the on-disk processed file cache."""
+
+    def test_put_and_get_roundtrip(self):
+        """Test that stored entries can be read back."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ProcessedFileCache(cache_dir, summary_mode=False)
+            key = cache.make_key(b"print('hi')", "test.py")
+
+            assert cache.get(key) is None
+            cache.put(key, {"content": "print('hi')", "tokens": {}})
+
+            assert cache.get(key) == {"content": "print('hi')", "tokens": {}}
+            assert cache.hits == 1
+            assert cache.misses == 1
+
+    def test_token_counts_for_other_models_are_kept(self):
+        """Test that adding one model's token count keeps the others'."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ProcessedFileCache(cache_dir)
+            key = cache.make_key(b"x = 1", "test.py")
+
+            cache.add_tokens(key, "x = 1", "cl100k_base", 4)
+            cache.add_tokens(key, "x = 1", "p50k_base", 5)
+
+            assert cache.get(key) == {
+                "content": "x = 1",
+                "tokens": {"cl100k_base": 4, "p50k_base": 5},
+            }
+
+    def test_keys_depend_on_content_and_options(self):
+        """Test that different content or options never share a key."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            plain = ProcessedFileCache(cache_dir, summary_mode=False)
+            summary = ProcessedFileCache(cache_dir, summary_mode=True)
+
+            assert plain.make_key(b"a") != plain.make_key(b"b")
+            assert plain.make_key(b"a") != summary.make_key(b"a")
+            assert plain.make_key(b"a", "x.py") != plain.make_key(b"a", "x.js")
+
+    def test_aggregation_served_from_cache(self):
+        """Test that a second run reuses processed output instead of reprocessing."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            source_dir = os.path.join(tmpdir, "src")
+            cache_dir = os.path.join(tmpdir, "cache")
+            os.makedirs(source_dir)
+            with open(os.path.join(source_dir, "test.py"), "w") as f:
+                f.write('def hello():\n    """Say hi."""\n    return 1\n')
+
+            options = dict(directory=source_dir, summary_mode=True, cache_dir=cache_dir)
+            first = CodeAggregator(**options).aggregate_code()
+
+            with mock.patch.object(
+                CodeAggregator, "_extract_summary", side_effect=AssertionError
+            ):
+                second_aggregator = CodeAggregator(**options)
+                second = second_aggregator.aggregate_code()
+
+            assert second == first
+            assert second_aggregator.cache.hits == 1
+
+    def test_changed_file_is_reprocessed(self):
+        """Test that editing a file invalidates its cached output."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            source_dir = os.path.join(tmpdir, "src")
+            os.makedirs(source_dir)
+            file_path = os.path.join(source_dir, "test.py")
+            with open(file_path, "w") as f:
+                f.write("print('old')\n")
+
+            options = dict(directory=source_dir, cache_dir=os.path.join(tmpdir, "c"))
+            CodeAggregator(**options).aggregate_code()
+
+            with open(file_path, "w") as f:
+                f.write("print('new')\n")
+            result = CodeAggregator(**options).aggregate_code()
+
+            assert "print('new')" in result
+            assert "print('old')" not in result
@@ -74,11 +74,23 @@ def test_main_file_output():
         args_mock.line_numbers = False
         args_mock.load_config = None
         args_mock.template_file = None
+        args_mock.token_budget = None
+        args_mock.priority = ""
+        args_mock.rank_imports = False
+        args_mock.gitignore = False
+        args_mock.profile = False
+        args_mock.profile_output = None
+        args_mock.cprofile = None
         args_mock.save_config = None
         # Add missing attributes
         args_mock.incremental = False
         args_mock.last_run_timestamp = None
         args_mock.prev_file = None  # Add this to prevent the Mock object issue
+        args_mock.jobs = 1
+        args_mock.executor = "thread"
+        args_mock.read_ahead = 0
+        args_mock.cache = False
+        args_mock.cache_dir = None
 
         # Mock parse_arguments to return our args
         with mock.patch("promptprep.cli.parse_arguments", return_value=args_mock):
@@ -117,11 +129,23 @@ def test_main_with_invalid_directory():
     args_mock.line_numbers = False
     args_mock.load_config = None  # Add missing attribute
     args_mock.template_file = None  # Add missing attribute
+    args_mock.token_budget = None
+    args_mock.priority = ""
+    args_mock.rank_imports = False
+    args_mock.gitignore = False
+    args_mock.profile = False
+    args_mock.profile_output = None
+    args_mock.cprofile = None
     args_mock.save_config = None  # Add missing attribute
     # Add missing attributes
     args_mock.incremental = False
     args_mock.last_run_timestamp = None
     args_mock.prev_file = None
+    args_mock.jobs = 1
+    args_mock.executor = "thread"
+    args_mock.read_ahead = 0
+    args_mock.cache = False
+    args_mock.cache_dir = None
 
     with (
         mock.patch("promptprep.cli.parse_arguments", return_value=args_mock),
@@ -260,6 +284,19 @@ def test_main_load_config():
             incremental=False,
             last_run_timestamp=None,
             prev_file=None,
+            jobs=1,
+            executor="auto",
+            read_ahead=0,
+            cache=False,
+            cache_dir=None,
+            gitignore=False,
+            token_budget=None,
+            priority="",
+            rank_imports=False,
+            profile=False,
+            profile_output=None,
+            profile_format="json",
+            cprofile=None,
         )
 
         # Mock parse_arguments to return initial args
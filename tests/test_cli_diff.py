@@ -71,6 +71,13 @@ def test_main_with_diff():
         args_mock.load_config = None
         args_mock.save_config = None
         args_mock.template_file = None
+        args_mock.token_budget = None
+        args_mock.priority = ""
+        args_mock.rank_imports = False
+        args_mock.gitignore = False
+        args_mock.profile = False
+        args_mock.profile_output = None
+        args_mock.cprofile = None
         args_mock.incremental = False
         args_mock.last_run_timestamp = None
 
@@ -135,6 +142,13 @@ def test_main_with_diff_output_file():
         args_mock.load_config = None
         args_mock.save_config = None
         args_mock.template_file = None
+        args_mock.token_budget = None
+        args_mock.priority = ""
+        args_mock.rank_imports = False
+        args_mock.gitignore = False
+        args_mock.profile = False
+        args_mock.profile_output = None
+        args_mock.cprofile = None
         args_mock.incremental = False
         args_mock.last_run_timestamp = None
 
@@ -222,6 +236,13 @@ def test_main_with_diff_generate_current_file():
         args_mock.load_config = None
         args_mock.save_config = None
         args_mock.template_file = None
+        args_mock.token_budget = None
+        args_mock.priority = ""
+        args_mock.rank_imports = False
+        args_mock.gitignore = False
+        args_mock.profile = False
+        args_mock.profile_output = None
+        args_mock.cprofile = None
         args_mock.incremental = False
         args_mock.last_run_timestamp = None
 
@@ -1,3 +1,4 @@
+import io
 import os
 import sys
 import tempfile
@@ -233,3 +234,102 @@ class TestCliEnhanced:
                 # Should print error message
                 assert "File error" in mock_stderr.getvalue()
                 assert "Test IO error" in mock_stderr.getvalue()
+
+    def test_main_with_stdout_output(self):
+        """Test that '-o -' streams the aggregation to standard output."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, "test.py"), "w") as f:
+                f.write('print("Hello")')
+
+            fake_stdout = mock.Mock()
+            fake_stdout.buffer = io.BytesIO()
+            with (
+                mock.patch("sys.argv", ["promptprep", "-d", tmpdir, "-o", "-"]),
+                mock.patch("sys.stdout", fake_stdout),
+            ):
+                main()
+
+            output = fake_stdout.buffer.getvalue().decode("utf-8")
+            assert 'print("Hello")' in output
+            assert not os.path.exists(os.path.join(tmpdir, "-"))
+
+    def test_success_message_names_the_file_written(self):
+        """Test that the message names the file with the extension the format added."""
+        with (
+            tempfile.TemporaryDirectory() as tmpdir,
+            tempfile.TemporaryDirectory() as outdir,
+        ):
+            with open(os.path.join(tmpdir, "test.py"), "w") as f:
+                f.write('print("Hello")')
+            output_file = os.path.join(outdir, "out")
+
+            with (
+                mock.patch(
+                    "sys.argv",
+                    [
+                        "promptprep",
+                        "-d",
+                        tmpdir,
+                        "-o",
+                        output_file,
+                        "--format",
+                        "jsonl",
+                    ],
+                ),
+                mock.patch("sys.stdout", new=StringIO()) as fake_stdout,
+            ):
+                main()
+
+            assert f"'{output_file}.jsonl' created successfully" in (
+                fake_stdout.getvalue()
+            )
+            assert os.path.exists(f"{output_file}.jsonl")
+
+    def test_ansi_format_streams_to_stdout(self):
+        """Test that --format ansi writes colours to stdout rather than a file."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, "test.py"), "w") as f:
+                f.write('print("Hello")')
+
+            fake_stdout = mock.Mock()
+            fake_stdout.buffer = io.BytesIO()
+            fake_stdout.isatty.return_value = False
+            with (
+                mock.patch(
+                    "sys.argv", ["promptprep", "-d", tmpdir, "--format", "ansi"]
+                ),
+                mock.patch("sys.stdout", fake_stdout),
+                mock.patch("os.getcwd", return_value=tmpdir),
+            ):
+                main()
+
+            output = fake_stdout.buffer.getvalue().decode("utf-8")
+            assert "\x1b[" in output
+            assert "Hello" in output
+            assert not os.path.exists(os.path.join(tmpdir, "full_code.txt"))
+
+    def test_ansi_format_uses_pager_on_terminal(self):
+        """Test that a terminal gets the output through $PAGER, and a closed pager isn't an error."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, "test.py"), "w") as f:
+                f.write('print("Hello")')
+
+            pager = mock.Mock()
+            pager.stdin.write.side_effect = BrokenPipeError
+            fake_stdout = mock.Mock()
+            fake_stdout.isatty.return_value = True
+            with (
+                mock.patch(
+                    "sys.argv", ["promptprep", "-d", tmpdir, "--format", "ansi"]
+                ),
+                mock.patch("sys.stdout", fake_stdout),
+                mock.patch.dict(os.environ, {"PAGER": "most -s"}),
+                mock.patch("subprocess.Popen", return_value=pager) as popen,
+            ):
+                main()
+
+            assert popen.call_args[0][0] == ["most", "-s"]
+            assert popen.call_args[1]["env"]["LESS"] == "FRX"
+            pager.stdin.write.assert_called_once()
+            pager.stdin.close.assert_called_once()
+            pager.wait.assert_called_once()
@@ -56,6 +56,13 @@ def test_main_with_incremental():
         args_mock.load_config = None
         args_mock.save_config = None
         args_mock.template_file = None
+        args_mock.token_budget = None
+        args_mock.priority = ""
+        args_mock.rank_imports = False
+        args_mock.gitignore = False
+        args_mock.profile = False
+        args_mock.profile_output = None
+        args_mock.cprofile = None
         args_mock.prev_file = None
         args_mock.diff_output = None
         args_mock.diff_context = 3
@@ -104,6 +111,13 @@ def test_main_with_incremental_no_timestamp():
         args_mock.load_config = None
         args_mock.save_config = None
         args_mock.template_file = None
+        args_mock.token_budget = None
+        args_mock.priority = ""
+        args_mock.rank_imports = False
+        args_mock.gitignore = False
+        args_mock.profile = False
+        args_mock.profile_output = None
+        args_mock.cprofile = None
         args_mock.prev_file = None
         args_mock.diff_output = None
         args_mock.diff_context = 3
@@ -152,6 +166,13 @@ def test_incremental_with_clipboard():
         args_mock.load_config = None
         args_mock.save_config = None
         args_mock.template_file = None
+        args_mock.token_budget = None
+        args_mock.priority = ""
+        args_mock.rank_imports = False
+        args_mock.gitignore = False
+        args_mock.profile = False
+        args_mock.profile_output = None
+        args_mock.cprofile = None
         args_mock.prev_file = None
         args_mock.diff_output = None
         args_mock.diff_context = 3
@@ -0,0 +1,122 @@
+import os
+import tempfile
+
+from promptprep.aggregator import CodeAggregator
+from promptprep.comments import LineCounts, count_lines, strip_comments, syntax_for
+
+
+class TestStripComments:
+    """Tests for the per-language comment stripper."""
+
+    def test_python_keeps_hashes_in_strings(self):
+        """Test that # inside strings and docstrings isn't treated as a comment."""
+        source = (
+            "# header\n"
+            "def f():\n"
+            '    """Returns a # sign."""\n'
+            "    return \"#\" + '#'  # trailing\n"
+            "\n"
+            "x = 1\n"
+        )
+        assert strip_comments(source, "a.py") == (
+            "def f():\n"
+            '    """Returns a # sign."""\n'
+            "    return \"#\" + '#'\n"
+            "\n"
+            "x = 1\n"
+        )
+
+    def test_c_like_line_and_block_comments(self):
+        """Test // and /* */ comments, including ones spanning lines."""
+        source = (
+            "/* licence\n"
+            " * text */\n"
+            "int a = 1; // one\n"
+            'char *url = "http://example.com";\n'
+            "int b = 4 / 2; /* half */\n"
+        )
+        assert strip_comments(source, "main.c") == (
+            "int a = 1;\n" 'char *url = "http://example.com";\n' "int b = 4 / 2;\n"
+        )
+
+    def test_block_comment_keeps_surrounding_lines(self):
+        """Test that code on either side of a multi-line comment stays on its own line."""
+        source = "let a = 1; /* starts\nends */ let b = 2;\n"
+        assert strip_comments(source, "app.js") == "let a = 1;\n let b = 2;\n"
+
+    def test_rust_lifetimes_are_not_strings(self):
+        """Test that a lifetime doesn't hide the comment after it."""
+        source = "fn f<'a>(x: &'a str) {} // done\nlet c = '/';\n"
+        assert strip_comments(source, "lib.rs") == (
+            "fn f<'a>(x: &'a str) {}\nlet c = '/';\n"
+        )
+
+    def test_other_languages(self):
+        """Test a few of the languages with their own comment syntax."""
+        assert strip_comments("SELECT '--' -- why\nFROM t;\n", "q.sql") == (
+            "SELECT '--'\nFROM t;\n"
+        )
+        assert strip_comments("echo ${#x} # count\n", "run.sh") == "echo ${#x}\n"
+        assert strip_comments("<!-- note -->\n<p>hi</p>\n", "page.html") == (
+            "<p>hi</p>\n"
+        )
+        assert strip_comments("x = 1 --[[ a\nb ]]\n", "init.lua") == "x = 1\n"
+        assert strip_comments("all: # default\n\tmake\n", "Makefile") == (
+            "all:\n\tmake\n"
+        )
+
+    def test_unknown_languages_are_left_alone(self):
+        """Test that files without a known comment syntax come back unchanged."""
+        assert syntax_for("README.md") is None
+        assert strip_comments("# Title\n", "README.md") == "# Title\n"
+        assert strip_comments('{"a": "#"}', "data.json") == '{"a": "#"}'
+
+
+class TestCountLines:
+    """Tests for counting code, comment and blank lines."""
+
+    def test_block_comments_and_strings(self):
+        """Test that block comment lines count as comments and strings as code."""
+        source = (
+            "/* licence\n"
+            "   text */\n"
+            "\n"
+            'const url = "http://example.com"; // home\n'
+            "// done\n"
+        )
+        counts = count_lines(source, "app.js")
+        assert counts == LineCounts(code=1, comment=3, blank=1)
+        assert counts.total == 5
+
+    def test_unknown_languages_have_no_comments(self):
+        """Test that files without a known comment syntax are all code and blanks."""
+        assert count_lines("# Title\n\ntext", "README.md") == LineCounts(2, 0, 1)
+        assert count_lines("", "a.py") == LineCounts()
+
+
+class TestAggregatorCommentStripping:
+    """Tests that both output paths strip comments the same way."""
+
+    def test_standard_and_template_paths_agree(self):
+        """Test that the standard and custom template outputs drop the same comments."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, "app.js"), "w") as f:
+                f.write('// banner\nconst s = "# not a comment"; /* note */\n')
+            template = os.path.join(tmpdir, "template.txt")
+            with open(template, "w") as f:
+                f.write("${FILES}")
+
+            standard = CodeAggregator(
+                directory=tmpdir, include_comments=False
+            ).aggregate_code()
+            custom = CodeAggregator(
+                directory=tmpdir,
+                include_comments=False,
+                output_format="custom",
+                template_file=template,
+            ).aggregate_code()
+
+            for output in (standard, custom):
+                assert 'const s = "# not a comment";' in output
+                assert "banner" not in output
+                assert "note" not in output
@@ -1,11 +1,23 @@
+import io
+import json
+import os
+import re
+import tempfile
+from unittest import mock
+
 import pytest
 
+from promptprep.aggregator import CodeAggregator
+from promptprep.profiling import Profiler
 from promptprep.formatters import (
+    BinaryRecordFormatter,
+    JsonLinesFormatter,
     PlainTextFormatter,
     MarkdownFormatter,
     HtmlFormatter,
     HighlightedFormatter,
     CustomTemplateFormatter,
+    TemplateNode,
     get_formatter,
 )
 
@@ -30,6 +42,9 @@ def test_get_formatter():
     assert isinstance(get_formatter("markdown"), MarkdownFormatter)
     assert isinstance(get_formatter("html"), HtmlFormatter)
     assert isinstance(get_formatter("highlighted"), HighlightedFormatter)
+    assert get_formatter("ansi").html_output is False
+    assert isinstance(get_formatter("jsonl"), JsonLinesFormatter)
+    assert isinstance(get_formatter("binary"), BinaryRecordFormatter)
 
     # Test invalid formatter
     with pytest.raises(ValueError) as excinfo:
@@ -309,8 +324,9 @@ class TestHighlightedFormatter:
         html_result = self.html_formatter.format_code_content(content, filename)
 
         if pygments_available:
-            # When Pygments is available, expect syntax highlighting
-            assert "<style>" in html_result
+            # When Pygments is available, expect syntax highlighting; the
+            # styles are in the page header instead of every file
+            assert "<style>" not in html_result
             assert "class=" in html_result  # Pygments adds class attributes
         else:
             # When Pygments is not available, expect fallback to base formatter
@@ -322,8 +338,11 @@ class TestHighlightedFormatter:
 
         # Check if the actual content is present (ignoring styling)
         clean_content = content.replace(" ", "").replace("\n", "")
-        clean_result = terminal_result.replace(" ", "").replace("\n", "")
+        clean_result = re.sub(r"\x1b\[[0-9;]*m", "", terminal_result)
+        clean_result = clean_result.replace(" ", "").replace("\n", "")
         assert clean_content in clean_result
+        if pygments_available and filename != "unknown.xyz":
+            assert "\x1b[" in terminal_result
 
     def test_format_metadata(self):
         """Test formatting metadata."""
@@ -374,6 +393,9 @@ class TestHighlightedFormatter:
         # HTML formatter should return full HTML
         html_result = self.html_formatter.get_full_html(content, title)
         assert "<!DOCTYPE html>" in html_result
+        if self.html_formatter.pygments_formatter is not None:
+            assert html_result.count(".source") > 1
+            assert html_result.index(".source") < html_result.index("</head>")
         assert title in html_result
         assert content in html_result
 
@@ -422,3 +444,283 @@ ${METADATA}
     assert "# Codebase Metadata" in result
     assert "# Files: 2" in result
     assert "# Lines: 10" in result
+
+
+def test_custom_template_compiles_once(tmp_path):
+    """Test that the template is split into text and placeholder nodes."""
+    template_file = tmp_path / "template.txt"
+    template_file.write_text("# ${TITLE} ${UNKNOWN} ${TITLE:x}\n${FILE_CONTENT:a.py}$")
+
+    formatter = CustomTemplateFormatter(str(template_file))
+    assert formatter.nodes == [
+        TemplateNode(None, "# "),
+        TemplateNode("TITLE", None),
+        TemplateNode(None, " ${UNKNOWN} ${TITLE:x}\n"),
+        TemplateNode("FILE_CONTENT", "a.py"),
+        TemplateNode(None, "$"),
+    ]
+
+
+def test_custom_template_single_pass(tmp_path):
+    """Test that replacement text isn't expanded again and pieces can be streamed."""
+    template_file = tmp_path / "template.txt"
+    template_file.write_text(
+        "${TITLE}|${FILE_HEADER:a.py}${FILE_CONTENT:a.py}|${FILE_CONTENT:b.py}"
+    )
+    formatter = CustomTemplateFormatter(str(template_file))
+    files_content = {"a.py": "s = '${TITLE}'\n"}
+
+    chunks = list(formatter.iter_render("", files_content, {}, [], "${FILES}"))
+    assert chunks[0] == "${FILES}"
+    assert "s = '${TITLE}'\n" in chunks
+    assert "".join(chunks) == formatter.render_template(
+        "", files_content, {}, [], "${FILES}"
+    )
+    assert chunks[-1] == formatter.format_error("File not found: b.py")
+
+
+class TestTemplateBlocks:
+    """Tests for ${FOR_EACH_FILE} and ${IF} blocks in custom templates."""
+
+    def _formatter(self, tmp_path, template):
+        template_file = tmp_path / "template.txt"
+        template_file.write_text(template)
+        return CustomTemplateFormatter(str(template_file))
+
+    def test_compile_blocks(self, tmp_path):
+        """Test that blocks hold their nodes and variables only count inside loops."""
+        formatter = self._formatter(
+            tmp_path,
+            "${PATH}${END}${FOR_EACH_FILE}${IF:SIZE>3}${PATH}${ELSE}-${END}${END}",
+        )
+        assert formatter.nodes == [
+            TemplateNode(None, "${PATH}${END}"),
+            TemplateNode(
+                "FOR_EACH_FILE",
+                None,
+                (
+                    TemplateNode(
+                        "IF",
+                        "SIZE>3",
+                        (TemplateNode("PATH", None),),
+                        (TemplateNode(None, "-"),),
+                    ),
+                ),
+            ),
+        ]
+
+    @pytest.mark.parametrize(
+        "template",
+        [
+            "${FOR_EACH_FILE}${PATH}",
+            "${FOR_EACH_FILE}${FOR_EACH_FILE}${END}${END}",
+            "${FOR_EACH_FILE}${IF:COLOUR=red}${END}${END}",
+        ],
+    )
+    def test_compile_errors(self, tmp_path, template):
+        """Test that unclosed blocks, nested loops and unknown conditions are errors."""
+        with pytest.raises(ValueError):
+            self._formatter(tmp_path, template)
+
+    def test_loop_with_conditions(self, tmp_path):
+        """Test the per-file variables and each kind of condition."""
+        formatter = self._formatter(
+            tmp_path,
+            "${FOR_EACH_FILE}"
+            "${PATH} ${LANGUAGE} ${SIZE}"
+            "${IF:LANGUAGE=py} python${END}"
+            "${IF:PATH~docs/*} doc${ELSE} code${END}"
+            "${IF:SIZE>5} big${END}"
+            "${IF:TOKENS} counted${END}"
+            "\n${END}",
+        )
+        files = {"app.py": "x = 1\n", "docs/a.md": "# A\n"}
+        assert formatter.render_template("", files, {}, []) == (
+            "app.py py 6 python code big\n" "docs/a.md md 4 doc\n"
+        )
+
+
+class TestLazyTemplates:
+    """Tests for custom templates rendered by the aggregator."""
+
+    def _make_tree(self, tmpdir):
+        with open(os.path.join(tmpdir, "app.py"), "w") as f:
+            f.write("# note\nx = 1\n")
+        with open(os.path.join(tmpdir, "util.py"), "w") as f:
+            f.write("y = 2\n")
+
+    def _render(self, tmpdir, template, **kwargs):
+        template_file = os.path.join(tmpdir, "template.tpl")
+        with open(template_file, "w") as f:
+            f.write(template)
+        aggregator = CodeAggregator(
+            directory=tmpdir,
+            output_format="custom",
+            template_file=template_file,
+            **kwargs,
+        )
+        return aggregator, aggregator.aggregate_code()
+
+    def test_listing_reads_no_files(self):
+        """Test that a loop that doesn't use the content doesn't process the files."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self._make_tree(tmpdir)
+            with mock.patch.object(CodeAggregator, "_process_for_template") as process:
+                _, output = self._render(
+                    tmpdir, "${FOR_EACH_FILE}${PATH}:${SIZE}\n${END}"
+                )
+            process.assert_not_called()
+            assert sorted(output.splitlines()) == ["app.py:13", "util.py:6"]
+
+    @pytest.mark.parametrize(
+        "template, reads",
+        [
+            ("${FOR_EACH_FILE}${PATH}\n${END}", 0),
+            ("${FILE_CONTENT:util.py}", 1),
+        ],
+    )
+    def test_reads_only_what_template_uses(self, template, reads):
+        """Test that without ${METADATA} no files are read just to count them."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self._make_tree(tmpdir)
+            profiler = Profiler()
+            self._render(tmpdir, template, collect_metadata=True, profiler=profiler)
+            assert profiler.counters["files_read"] == reads
+
+    def test_loop_content_and_metadata_first(self):
+        """Test that metadata in front of a loop describes the files after it."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self._make_tree(tmpdir)
+            aggregator, output = self._render(
+                tmpdir,
+                "${METADATA}\n"
+                "${FOR_EACH_FILE}${FILE_HEADER}${FILE_CONTENT}${END}"
+                "${METADATA}",
+                collect_metadata=True,
+                include_comments=False,
+            )
+            metadata = aggregator.formatter.format_metadata(aggregator.stats.to_dict())
+            assert aggregator.stats.files == 2
+            assert output.startswith(metadata + "\n")
+            assert output.endswith(metadata)
+            assert "x = 1" in output and "# note" not in output
+
+    def test_metadata_without_loop(self):
+        """Test that files are still counted when the template doesn't process them all."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self._make_tree(tmpdir)
+            aggregator, output = self._render(
+                tmpdir,
+                "${FILE_CONTENT:util.py}${METADATA}",
+                collect_metadata=True,
+            )
+            assert output.startswith("y = 2\n")
+            assert aggregator.stats.files == 2
+            assert aggregator.stats.lines.comment == 1
+
+
+class TestRecordFormatters:
+    """Tests for the jsonl and binary formats."""
+
+    def _make_tree(self, tmpdir):
+        with open(os.path.join(tmpdir, "app.py"), "w") as f:
+            f.write("# note\nx = 1\n")
+        os.makedirs(os.path.join(tmpdir, "web"))
+        with open(os.path.join(tmpdir, "web", "main.js"), "w") as f:
+            f.write('let s = "é";\n')
+
+    def test_jsonl_output(self):
+        """Test that every file is one JSON object with its path, language and content."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self._make_tree(tmpdir)
+            output = CodeAggregator(
+                directory=tmpdir,
+                output_format="jsonl",
+                include_comments=False,
+                collect_metadata=True,
+            ).aggregate_code()
+
+            records = [json.loads(line) for line in output.splitlines()]
+            assert [r["type"] for r in records] == ["tree", "file", "file", "metadata"]
+            app, main = records[1], records[2]
+            assert (app["path"], app["language"], app["content"]) == (
+                "app.py",
+                "py",
+                "x = 1\n",
+            )
+            assert main["language"] == "js"
+            assert main["content"] == 'let s = "é";\n'
+            assert records[3]["code_files"] == 2
+
+    def test_binary_index_seeks_to_one_file(self):
+        """Test that a file can be read through the index without reading the rest."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self._make_tree(tmpdir)
+            stream = io.BytesIO()
+            CodeAggregator(directory=tmpdir, output_format="binary").write_to_stream(
+                stream
+            )
+
+            index = BinaryRecordFormatter.read_index(stream)
+            path = os.path.join("web", "main.js")
+            record = BinaryRecordFormatter.read_record(stream, index[path])
+            assert record["content"] == 'let s = "é";\n'
+            assert record["size"] == len('let s = "é";\n'.encode("utf-8"))
+
+            records = list(BinaryRecordFormatter.iter_records(stream))
+            assert [r["type"] for r in records] == ["tree", "file", "file"]
+            assert records[1]["content"] == "# note\nx = 1\n"
+
+    def test_binary_is_not_returned_as_text(self):
+        """Test that aggregate_code refuses binary output."""
+        with pytest.raises(ValueError, match="Binary output"):
+            CodeAggregator(output_format="binary").aggregate_code()
+
+
+def test_highlighted_styles_emitted_once():
+    """Test that a highlighted page carries one stylesheet however many files it has."""
+    pytest.importorskip("pygments")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for i in range(5):
+            with open(os.path.join(tmpdir, f"m{i}.py"), "w") as f:
+                f.write(f"x = {i}\n")
+        output = CodeAggregator(
+            directory=tmpdir, output_format="highlighted"
+        ).aggregate_code()
+
+        assert output.count("<style>") == 2  # The page's own styles and Pygments'
+        assert output.count('class="source"') == 5
+
+
+def test_highlighted_lexers_are_cached():
+    """Test that lexers are looked up once per extension, or per name when it matters."""
+    lexers = pytest.importorskip("pygments.lexers")
+    formatter = HighlightedFormatter()
+    with mock.patch(
+        "pygments.lexers.get_lexer_for_filename",
+        wraps=lexers.get_lexer_for_filename,
+    ) as lookup:
+        for name in ("a.py", "b.py", "pkg/c.py", "d.js", "Makefile"):
+            formatter.format_code_content("x = 1", name)
+    assert lookup.call_count == 3
+
+    notes = formatter._lexer_for("notes.txt")
+    assert formatter._lexer_for("CMakeLists.txt").name == "CMake"
+    assert formatter._lexer_for("other.txt") is notes
+    assert formatter._lexer_for("pkg/Dockerfile").name == "Docker"
+
+
+def test_custom_template_highlighted_styles():
+    """Test that a highlighted custom template carries the stylesheet once."""
+    pytest.importorskip("pygments")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        template_file = os.path.join(tmpdir, "page.tpl")
+        with open(template_file, "w") as f:
+            f.write("<html>${FILES}</html>")
+        formatter = CustomTemplateFormatter(template_file, base_format="highlighted")
+        files = {"a.py": "x = 1\n", "b.py": "y = 2\n"}
+
+        for _ in range(2):
+            output = formatter.render_template("", files, {}, [])
+            assert output.count("<style>") == 1
+            assert output.index("<style>") < output.index('class="source"')
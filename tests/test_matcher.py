@@ -0,0 +1,161 @@
+import os
+import tempfile
+
+from promptprep.aggregator import CodeAggregator
+from promptprep.matcher import IgnoreRules, PathMatcher
+from promptprep.scanner import DirectorySnapshot
+
+
+def _write(path, text=""):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+class TestPathMatcher:
+    """Tests for the compiled include/exclude rules."""
+
+    def test_exact_names_and_globs(self):
+        """Test that plain names and glob patterns can be mixed."""
+        matcher = PathMatcher(
+            exclude_dirs={"build", "*.egg-info"},
+            exclude_files={"secrets.py", "*_pb2.py"},
+            include_files={"main.py", "src/*.py"},
+            extensions={".py", ".JS"},
+        )
+
+        assert matcher.is_excluded_dir("build")
+        assert matcher.is_excluded_dir("promptprep.egg-info")
+        assert not matcher.is_excluded_dir("src")
+        assert matcher.is_excluded_file("api_pb2.py")
+        assert not matcher.is_excluded_file("api.py")
+        assert matcher.is_included("main.py")
+        assert matcher.is_included("src/app.py")
+        assert not matcher.is_included("lib/app.py")
+        assert matcher.is_programming_file("app.js")
+        assert not matcher.is_programming_file("notes.txt")
+
+    def test_globs_stay_within_directories(self):
+        """Test that * doesn't cross / in include globs and only ** does."""
+        matcher = PathMatcher(include_files={"src/*.py", "lib/**/*.js"})
+
+        assert matcher.is_included("src/app.py")
+        assert not matcher.is_included("src/a/b/c.py")
+        assert matcher.is_included("lib/index.js")
+        assert matcher.is_included("lib/a/b/c.js")
+        assert not matcher.is_included("lib/a/b/c.py")
+
+    def test_no_extensions_means_any_file(self):
+        """Test that every file counts as code when no extensions are given."""
+        matcher = PathMatcher()
+        assert matcher.is_programming_file("README")
+        assert matcher.is_included("anything/at/all.txt")
+
+    def test_excludes_path(self):
+        """Test that a path is excluded by any of its directories or its name."""
+        matcher = PathMatcher(exclude_dirs={"node_modules"}, exclude_files={"*.lock"})
+        assert matcher.excludes_path(os.path.join("web", "node_modules", "x.js"))
+        assert matcher.excludes_path("yarn.lock")
+        assert not matcher.excludes_path(os.path.join("web", "app.js"))
+
+
+class TestIgnoreRules:
+    """Tests for gitignore-style pattern files."""
+
+    def test_basic_patterns(self):
+        """Test unanchored, anchored and double-star patterns."""
+        rules = IgnoreRules(["# comment", "", "*.log", "/dist", "docs/**/*.tmp"])
+
+        assert rules.match("debug.log", False)
+        assert rules.match("a/b/debug.log", False)
+        assert rules.match("dist", True)
+        assert rules.match("dist/bundle.js", False)
+        assert rules.match("src/dist", True) is None
+        assert rules.match("docs/x.tmp", False)
+        assert rules.match("docs/a/b/x.tmp", False)
+        assert rules.match("main.py", False) is None
+
+    def test_negation_last_rule_wins(self):
+        """Test that a later negated rule re-includes a file."""
+        rules = IgnoreRules(["*.log", "!keep.log"])
+
+        assert rules.match("debug.log", False) is True
+        assert rules.match("keep.log", False) is False
+
+    def test_directory_only_rules(self):
+        """Test that a trailing slash only matches directories."""
+        rules = IgnoreRules(["cache/"])
+
+        assert rules.match("cache", True)
+        assert rules.match("cache", False) is None
+        assert rules.match("cache/data.py", False)
+
+
+class TestIgnoreFiles:
+    """Tests for ignore files found while scanning."""
+
+    def test_nested_ignore_files_and_pruning(self):
+        """Test that ignore files apply below their directory and prune ignored dirs."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _write(os.path.join(tmpdir, ".promptprepignore"), "generated/\n*.tmp.py\n")
+            _write(os.path.join(tmpdir, "main.py"))
+            _write(os.path.join(tmpdir, "scratch.tmp.py"))
+            _write(os.path.join(tmpdir, "generated", "out.py"))
+            _write(os.path.join(tmpdir, "pkg", ".promptprepignore"), "!keep.tmp.py\n")
+            _write(os.path.join(tmpdir, "pkg", "keep.tmp.py"))
+            _write(os.path.join(tmpdir, "pkg", "drop.tmp.py"))
+
+            snapshot = DirectorySnapshot.scan(tmpdir, matcher=PathMatcher())
+            paths = {f.rel_path for f in snapshot.iter_files()}
+
+            assert os.path.join("pkg", "keep.tmp.py") in paths
+            assert "main.py" in paths
+            assert "scratch.tmp.py" not in paths
+            assert os.path.join("pkg", "drop.tmp.py") not in paths
+            assert not any(d.name == "generated" for d in snapshot.directories)
+
+    def test_gitignore_is_opt_in(self):
+        """Test that .gitignore is only honoured when asked for."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _write(os.path.join(tmpdir, ".gitignore"), "local.py\n")
+            _write(os.path.join(tmpdir, "local.py"), "x = 1\n")
+            _write(os.path.join(tmpdir, "main.py"), "y = 2\n")
+
+            default = CodeAggregator(directory=tmpdir).aggregate_code()
+            assert "File: local.py" in default
+
+            aggregator = CodeAggregator(directory=tmpdir, use_gitignore=True)
+            result = aggregator.aggregate_code()
+            # Left out of both the tree and the file sections
+            assert "local.py" not in result
+            assert "File: main.py" in result
+
+    def test_promptprepignore_overrides_gitignore(self):
+        """Test that .promptprepignore can re-include what .gitignore drops."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _write(os.path.join(tmpdir, ".gitignore"), "*.py\n")
+            _write(os.path.join(tmpdir, ".promptprepignore"), "!main.py\n")
+            _write(os.path.join(tmpdir, "main.py"), "y = 2\n")
+            _write(os.path.join(tmpdir, "other.py"), "z = 3\n")
+
+            result = CodeAggregator(
+                directory=tmpdir, use_gitignore=True
+            ).aggregate_code()
+            assert "File: main.py" in result
+            assert "File: other.py" not in result
+
+
+class TestAggregatorRules:
+    """Tests for how the aggregator keeps its compiled rules in step."""
+
+    def test_replacing_a_rule_set_recompiles(self):
+        """Test that assigning a new rule set takes effect immediately."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            aggregator = CodeAggregator(directory=tmpdir, include_files={"a.py"})
+            assert not aggregator.should_include(os.path.join(tmpdir, "b.py"))
+
+            aggregator.include_files = {"*.py"}
+            assert aggregator.should_include(os.path.join(tmpdir, "b.py"))
+
+            aggregator.exclude_files = {"b.py"}
+            assert aggregator.should_exclude("b.py")
@@ -0,0 +1,79 @@
+import os
+import tempfile
+from unittest import mock
+
+from promptprep.aggregator import CodeAggregator
+from promptprep.comments import LineCounts
+from promptprep.metadata import CodebaseStats
+
+
+class TestCodebaseStats:
+    """Tests for the running metadata totals."""
+
+    def test_totals_and_languages(self):
+        """Test that files add up overall and per extension."""
+        stats = CodebaseStats()
+        stats.add("src/a.py", 100, LineCounts(6, 2, 2))
+        stats.add("src/b.py", 50, LineCounts(3, 0, 1))
+        stats.add("web/app.js", 10, LineCounts(1, 0, 0))
+        stats.add("broken.py", 5, None)
+
+        metadata = stats.to_dict()
+        assert metadata["code_files"] == 3
+        assert metadata["total_bytes"] == 160
+        assert metadata["total_lines"] == 15
+        assert metadata["code_lines"] == 10
+        assert metadata["comment_lines"] == 2
+        assert metadata["blank_lines"] == 3
+        assert metadata["languages"] == ".py: 2 files, 14 lines; .js: 1 file, 1 line"
+
+
+class TestMetadataCollection:
+    """Tests for the metadata gathered while an output is written."""
+
+    def test_counts_match_emitted_files(self):
+        """Test that files over the size limit are neither read nor counted."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, "small.py"), "w") as f:
+                f.write("# note\nx = 1\n\ny = 2  # two\n")
+            with open(os.path.join(tmpdir, "large.py"), "w") as f:
+                f.write("z = 3\n" * 400000)
+
+            aggregator = CodeAggregator(
+                directory=tmpdir, collect_metadata=True, max_file_size_mb=1
+            )
+            with mock.patch.object(
+                aggregator, "_read_source", wraps=aggregator._read_source
+            ) as read:
+                result = aggregator.aggregate_code()
+
+            assert [os.path.basename(c.args[0]) for c in read.call_args_list] == [
+                "small.py"
+            ]
+            assert aggregator.stats.to_dict()["total_lines"] == 4
+            assert "# Code Files: 1\n" in result
+            assert "# Code Lines: 2\n" in result
+            assert "# Comment Lines: 1\n" in result
+            assert "# Blank Lines: 1\n" in result
+            assert result.index("Codebase Metadata") < result.index("Directory Tree")
+
+    def test_metadata_tokens_are_counted(self):
+        """Test that the total token count includes the metadata block."""
+        encoding = mock.Mock()
+        encoding.encode.side_effect = lambda text: text.split()
+        with (
+            tempfile.TemporaryDirectory() as tmpdir,
+            mock.patch("tiktoken.get_encoding", return_value=encoding),
+        ):
+            with open(os.path.join(tmpdir, "a.py"), "w") as f:
+                f.write("x = 1\n")
+
+            without = CodeAggregator(directory=tmpdir, count_tokens=True)
+            without.aggregate_code()
+            aggregator = CodeAggregator(
+                directory=tmpdir, count_tokens=True, collect_metadata=True
+            )
+            result = aggregator.aggregate_code()
+
+            assert aggregator.total_tokens > without.total_tokens
+            assert f"# Total Tokens: {aggregator.total_tokens:,}\n" in result
@@ -0,0 +1,260 @@
+import ast
+import os
+import tempfile
+from unittest import mock
+
+import pytest
+
+from promptprep.aggregator import CodeAggregator
+from promptprep.outline import (
+    OutlineCache,
+    UnsupportedLanguageError,
+    extract_outline,
+    get_extractor,
+    register_extractor,
+)
+
+
+class TestBraceOutlines:
+    """Tests for the outlines of languages that use braces."""
+
+    def test_typescript(self):
+        """Test that bodies are dropped and class members are listed."""
+        source = (
+            'import { a } from "./a";\n'
+            "\n"
+            "export function helper(value: number): number {\n"
+            '  const s = "} not a brace";\n'
+            "  return value;\n"
+            "}\n"
+            "\n"
+            "export class Widget extends Base {\n"
+            "  private count = 0;\n"
+            "\n"
+            "  async render(\n"
+            "    target: HTMLElement,\n"
+            "  ): Promise<void> {\n"
+            "    target.innerHTML = `${this.count}`;\n"
+            "  }\n"
+            "}\n"
+            "\n"
+            'describe("x", () => {\n'
+            "  it();\n"
+            "});\n"
+        )
+        assert extract_outline(source, "widget.ts") == (
+            'import { a } from "./a";\n'
+            "export function helper(value: number): number { ... }\n"
+            "\n"
+            "export class Widget extends Base {\n"
+            "    private count = 0;\n"
+            "    async render(target: HTMLElement): Promise<void> { ... }\n"
+            "}\n"
+        )
+
+    def test_go(self):
+        """Test that struct fields and function signatures are kept."""
+        source = (
+            "package main\n"
+            "\n"
+            "// Server serves.\n"
+            "type Server struct {\n"
+            "\tName string\n"
+            "}\n"
+            "\n"
+            "func (s *Server) Start(port int) error {\n"
+            '\treturn fmt.Errorf("{")\n'
+            "}\n"
+        )
+        assert extract_outline(source, "main.go") == (
+            "package main\n"
+            "type Server struct {\n"
+            "    Name string\n"
+            "}\n"
+            "\n"
+            "func (s *Server) Start(port int) error { ... }\n"
+        )
+
+    def test_rust(self):
+        """Test impl blocks, trait methods and use lists with braces."""
+        source = (
+            "use std::{fmt, io};\n"
+            "\n"
+            "impl<'a> Point<'a> {\n"
+            "    pub fn new(x: i64) -> Self {\n"
+            "        Point { x }\n"
+            "    }\n"
+            "}\n"
+            "\n"
+            "pub trait Area {\n"
+            "    fn area(&self) -> f64;\n"
+            "}\n"
+        )
+        assert extract_outline(source, "lib.rs") == (
+            "use std::{fmt, io};\n"
+            "impl<'a> Point<'a> {\n"
+            "    pub fn new(x: i64) -> Self { ... }\n"
+            "}\n"
+            "\n"
+            "pub trait Area {\n"
+            "    fn area(&self) -> f64;\n"
+            "}\n"
+        )
+
+    def test_java(self):
+        """Test annotations, fields, nested types and one-line containers."""
+        source = (
+            "package com.example;\n"
+            "\n"
+            "@Entity\n"
+            "public class Account {\n"
+            "    private String name;\n"
+            "\n"
+            "    @Override\n"
+            "    public String toString() {\n"
+            '        return "Account{" + name + "}";\n'
+            "    }\n"
+            "\n"
+            "    public enum Kind { CHECKING, SAVINGS }\n"
+            "}\n"
+        )
+        assert extract_outline(source, "Account.java") == (
+            "package com.example;\n"
+            "@Entity\n"
+            "public class Account {\n"
+            "    private String name;\n"
+            "    @Override\n"
+            "    public String toString() { ... }\n"
+            "    public enum Kind { CHECKING, SAVINGS }\n"
+            "}\n"
+        )
+
+    def test_c_family(self):
+        """Test includes, macros, typedefs and braces on their own line."""
+        source = (
+            "#include <stdio.h>\n"
+            "#define MAX(a, b) \\\n"
+            "    ((a) > (b) ? (a) : (b))\n"
+            "\n"
+            "typedef struct {\n"
+            "    int w;\n"
+            "} Size;\n"
+            "\n"
+            "static int add(int a,\n"
+            "               int b)\n"
+            "{\n"
+            "    return a + b;\n"
+            "}\n"
+        )
+        assert extract_outline(source, "util.c") == (
+            "#include <stdio.h>\n"
+            "#define MAX(a, b)\n"
+            "typedef struct {\n"
+            "    int w;\n"
+            "} Size;\n"
+            "\n"
+            "static int add(int a, int b) { ... }\n"
+        )
+
+
+class TestRegistry:
+    """Tests for looking up and registering extractors."""
+
+    def test_unknown_extension(self):
+        """Test that files without an extractor raise UnsupportedLanguageError."""
+        assert get_extractor("notes.txt") is None
+        with pytest.raises(UnsupportedLanguageError):
+            extract_outline("text", "notes.txt")
+
+    def test_register_extractor(self):
+        """Test that a registered extractor is used for its extensions."""
+        with mock.patch.dict("promptprep.outline._EXTRACTORS"):
+            register_extractor(".upper")(lambda text, path: text.upper())
+            assert extract_outline("abc", "x.UPPER") == "ABC"
+        assert get_extractor("x.upper") is None
+
+    def test_cache_reuses_identical_content(self):
+        """Test that the same content is only outlined once."""
+        cache = OutlineCache()
+        extractor = mock.Mock(return_value="outline")
+        with mock.patch.dict("promptprep.outline._EXTRACTORS"):
+            register_extractor(".cached")(extractor)
+            assert cache.extract("same", "a.cached") == "outline"
+            assert cache.extract("same", "b.cached") == "outline"
+            cache.extract("different", "a.cached")
+
+        assert extractor.call_count == 2
+        assert (cache.hits, cache.misses) == (1, 2)
+
+
+class TestSummaryMode:
+    """Tests for summary mode on files other than Python."""
+
+    def test_polyglot_summary(self):
+        """Test that summary mode outlines each language and notes the rest."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, "main.go"), "w") as f:
+                f.write('package main\n\nfunc main() {\n\tprintln("hi")\n}\n')
+            with open(os.path.join(tmpdir, "notes.md"), "w") as f:
+                f.write("# Notes\n")
+
+            result = CodeAggregator(
+                directory=tmpdir, summary_mode=True
+            ).aggregate_code()
+
+            assert "func main() { ... }" in result
+            assert 'println("hi")' not in result
+            assert "No summary available for notes.md" in result
+
+
+class TestPythonOutline:
+    """Tests for Python summaries."""
+
+    def test_signatures_bases_and_constants(self):
+        """Test that arguments, annotations, bases, decorators and constants are kept."""
+        source = (
+            "import os\n"
+            "\n"
+            "MAX_SIZE: int = 10\n"
+            "LOOKUP = {" + ", ".join(f"'k{i}': {i}" for i in range(40)) + "}\n"
+            "counter = 0\n"
+            "\n"
+            "\n"
+            "class Point(Base, metaclass=Meta):\n"
+            '    """A point."""\n'
+            "\n"
+            "    x: float\n"
+            "    y: float = 0.0\n"
+            "\n"
+            "    @functools.lru_cache(maxsize=None)\n"
+            "    def distance(self, other: 'Point', *, exact: bool = False) -> float:\n"
+            "        return 0.0\n"
+            "\n"
+            "\n"
+            "async def fetch(url, *args, timeout=5, **kwargs):\n"
+            '    """Fetches url."""\n'
+            "    return None\n"
+        )
+        assert extract_outline(source, "point.py") == (
+            "MAX_SIZE: int = 10\n"
+            "LOOKUP = {...}\n"
+            "\n"
+            "class Point(Base, metaclass=Meta):\n"
+            '    """A point."""\n'
+            "    x: float\n"
+            "    y: float = 0.0\n"
+            "    @functools.lru_cache(maxsize=None)\n"
+            "    def distance(self, other: 'Point', *, exact: bool=False) -> float:\n"
+            "\n"
+            "async def fetch(url, *args, timeout=5, **kwargs):\n"
+            '    """Fetches url."""\n'
+        )
+
+    def test_identical_files_are_parsed_once(self):
+        """Test that Python files with the same contents share one parse."""
+        cache = OutlineCache()
+        source = "def f(a, b=1):\n    return a\n"
+        with mock.patch("ast.parse", wraps=ast.parse) as parse:
+            assert cache.extract(source, "a.py") == "def f(a, b=1):\n"
+            assert cache.extract(source, "b.py") == "def f(a, b=1):\n"
+        assert parse.call_count == 1
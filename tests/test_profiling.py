@@ -0,0 +1,125 @@
+import json
+import os
+import pstats
+import tempfile
+
+import pytest
+
+from promptprep.aggregator import CodeAggregator
+from promptprep.profiling import NullProfiler, Profiler
+
+
+def _make_project(tmpdir):
+    for name in ("a.py", "b.py"):
+        with open(os.path.join(tmpdir, name), "w") as f:
+            f.write("# comment\ndef f():\n    return 1\n")
+
+
+class TestProfiler:
+    """Tests for the stage timers and counters."""
+
+    def test_stages_and_counters_are_totalled(self):
+        """Test that repeated stages add up and counters accumulate."""
+        profiler = Profiler()
+        for _ in range(3):
+            with profiler.stage("read"):
+                pass
+        with profiler.stage("write"):
+            pass
+        profiler.count("files_read", 2)
+        profiler.count("files_read")
+
+        totals = profiler.stage_totals()
+        assert list(totals) == ["read", "write"]
+        assert totals["read"]["calls"] == 3
+        assert profiler.counters["files_read"] == 3
+        assert "read" in profiler.format_report()
+        # Only the totals are kept unless a trace was asked for
+        assert profiler.spans == []
+        with pytest.raises(ValueError):
+            profiler.to_chrome_trace()
+
+    def test_null_profiler_records_nothing(self):
+        """Test that the default profiler accepts every call and keeps nothing."""
+        profiler = NullProfiler()
+        with profiler.session():
+            with profiler.stage("read"):
+                profiler.count("files_read")
+        assert not profiler.enabled
+        assert not hasattr(profiler, "spans")
+
+    def test_write_json_and_chrome_trace(self):
+        """Test both output formats."""
+        profiler = Profiler(keep_spans=True)
+        with profiler.session():
+            with profiler.stage("scan"):
+                pass
+        profiler.count("files_scanned", 5)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            json_path = os.path.join(tmpdir, "profile.json")
+            trace_path = os.path.join(tmpdir, "trace.json")
+            profiler.write(json_path)
+            profiler.write(trace_path, "chrome")
+
+            with open(json_path) as f:
+                data = json.load(f)
+            assert data["stages"]["scan"]["calls"] == 1
+            assert data["counters"] == {"files_scanned": 5}
+            assert data["wall_seconds"] >= data["stages"]["scan"]["seconds"]
+
+            with open(trace_path) as f:
+                events = json.load(f)["traceEvents"]
+            spans = [e for e in events if e["ph"] == "X"]
+            assert [e["name"] for e in spans] == ["scan"]
+            assert spans[0]["dur"] >= 0
+
+
+class TestAggregatorProfiling:
+    """Tests for profiling a real run."""
+
+    def test_run_reports_stages_and_counters(self):
+        """Test that each stage of a run is timed and its work counted."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _make_project(tmpdir)
+            profiler = Profiler()
+            aggregator = CodeAggregator(
+                directory=tmpdir,
+                summary_mode=True,
+                include_comments=False,
+                profiler=profiler,
+            )
+            result = aggregator.aggregate_code()
+
+            stages = profiler.stage_totals()
+            for stage in ("scan", "tree", "select", "read", "comments", "summary"):
+                assert stage in stages, stage
+            assert stages["read"]["calls"] == 2
+            assert profiler.counters["files_scanned"] == 2
+            assert profiler.counters["files_read"] == 2
+            assert profiler.counters["bytes_read"] == 2 * len(
+                "# comment\ndef f():\n    return 1\n"
+            )
+            assert profiler.counters["bytes_written"] == len(result.encode("utf-8"))
+
+    def test_profiling_does_not_change_output(self):
+        """Test that a profiled run writes exactly what an unprofiled one does."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _make_project(tmpdir)
+            plain = CodeAggregator(directory=tmpdir).aggregate_code()
+            profiled = CodeAggregator(
+                directory=tmpdir, profiler=Profiler()
+            ).aggregate_code()
+            assert profiled == plain
+
+    def test_cprofile_hook(self):
+        """Test that the run can be wrapped in cProfile."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _make_project(tmpdir)
+            stats_path = os.path.join(tmpdir, "run.prof")
+            profiler = Profiler(cprofile_output=stats_path)
+            CodeAggregator(directory=tmpdir, profiler=profiler).aggregate_code()
+
+            stats = pstats.Stats(stats_path)
+            functions = {name for _, _, name in stats.stats}
+            assert "_write_document" in functions
@@ -0,0 +1,102 @@
+import mmap
+import threading
+import time
+
+import pytest
+
+from promptprep.readahead import read_ahead
+
+
+class TestReadAhead:
+    """Tests for the background reader stage."""
+
+    def test_results_come_back_in_order(self):
+        """Test that slow early reads don't let later files overtake them."""
+        paths = [f"file{i}" for i in range(20)]
+
+        def read(path):
+            time.sleep(0.01 * (20 - int(path[4:])) / 20)
+            return path.upper()
+
+        assert list(read_ahead(paths, read, depth=6)) == [
+            (path, path.upper()) for path in paths
+        ]
+
+    def test_errors_are_yielded(self):
+        """Test that a failed read is handed over without stopping the rest."""
+
+        def read(path):
+            if path == "bad":
+                raise OSError("unreadable")
+            return path
+
+        results = list(read_ahead(["a", "bad", "c"], read))
+
+        assert results[0] == ("a", "a")
+        assert isinstance(results[1][1], OSError)
+        assert results[2] == ("c", "c")
+
+    @pytest.mark.parametrize("depth", [1, 4])
+    def test_reads_stay_within_depth(self, depth):
+        """Test that no more than depth files are read ahead of the consumer."""
+        lock = threading.Lock()
+        started = []
+
+        def read(path):
+            with lock:
+                started.append(path)
+            return path
+
+        paths = [str(i) for i in range(50)]
+        reader = read_ahead(paths, read, depth=depth)
+        for consumed, _ in enumerate(reader, 1):
+            time.sleep(0.001)
+            with lock:
+                assert len(started) <= consumed + depth
+            if consumed == 10:
+                break
+        reader.close()
+
+        assert len(started) <= 10 + depth
+
+    def test_lazy_paths_are_advanced_within_depth(self):
+        """Test that a generator of paths is only pulled as far as depth allows."""
+        pulled = []
+
+        def paths():
+            for i in range(50):
+                pulled.append(i)
+                yield str(i)
+
+        reader = read_ahead(paths(), lambda path: path, depth=3)
+        for consumed, _ in enumerate(reader, 1):
+            time.sleep(0.001)
+            assert len(pulled) <= consumed + 3
+            if consumed == 5:
+                break
+        reader.close()
+
+        assert len(pulled) <= 5 + 3
+        assert list(read_ahead(iter([]), lambda path: path)) == []
+
+    def test_unconsumed_maps_are_closed_on_early_stop(self, tmp_path):
+        """Test that reads finished ahead of a consumer that stops early are let go."""
+        path = tmp_path / "data.bin"
+        path.write_bytes(b"x" * 4096)
+        maps = []
+
+        def read(_):
+            with open(path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            maps.append(data)
+            return data
+
+        reader = read_ahead([str(i) for i in range(10)], read, depth=4)
+        _, first = next(reader)
+        while len(maps) < 4:
+            time.sleep(0.001)
+        reader.close()
+
+        assert not first.closed
+        assert all(data.closed for data in maps[1:])
+        first.close()
@@ -0,0 +1,88 @@
+import os
+import tempfile
+from unittest import mock
+
+from promptprep.aggregator import CodeAggregator, DirectoryTreeGenerator
+from promptprep.scanner import DirectorySnapshot
+
+
+class TestDirectorySnapshot:
+    """Tests for the single-pass directory scan."""
+
+    def test_scan_records_files_and_stats(self):
+        """Test that files are recorded with their size and relative path."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.makedirs(os.path.join(tmpdir, "src"))
+            with open(os.path.join(tmpdir, "src", "main.py"), "w") as f:
+                f.write("print('hi')")
+
+            snapshot = DirectorySnapshot.scan(tmpdir)
+            files = list(snapshot.iter_files())
+
+            assert len(files) == 1
+            assert files[0].rel_path == os.path.join("src", "main.py")
+            assert files[0].size == len("print('hi')")
+            assert snapshot.get(os.path.join(tmpdir, "src", "main.py")) == files[0]
+
+    def test_scan_does_not_enter_excluded_dirs(self):
+        """Test that excluded directories are marked but not walked."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.makedirs(os.path.join(tmpdir, "node_modules", "pkg"))
+            open(os.path.join(tmpdir, "node_modules", "pkg", "index.js"), "w").close()
+
+            snapshot = DirectorySnapshot.scan(tmpdir, {"node_modules"})
+
+            excluded = [d for d in snapshot.directories if d.excluded]
+            assert [d.name for d in excluded] == ["node_modules"]
+            assert len(snapshot) == 0
+
+    def test_scan_reuses_directory_entry_stats(self):
+        """Test that excluded dirs aren't listed and files aren't stat-ed again."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.makedirs(os.path.join(tmpdir, "node_modules", "pkg"))
+            os.makedirs(os.path.join(tmpdir, "src"))
+            with open(os.path.join(tmpdir, "src", "main.py"), "w") as f:
+                f.write("print('hi')")
+
+            with (
+                mock.patch(
+                    "promptprep.scanner.os.scandir", side_effect=os.scandir
+                ) as mock_scandir,
+                mock.patch("os.stat", side_effect=os.stat) as mock_stat,
+            ):
+                snapshot = DirectorySnapshot.scan(tmpdir, {"node_modules"})
+
+            listed = [c.args[0] for c in mock_scandir.call_args_list]
+            assert listed == [tmpdir, os.path.join(tmpdir, "src")]
+            assert mock_stat.call_count == 0
+            assert [f.size for f in snapshot.iter_files()] == [len("print('hi')")]
+
+    def test_tree_from_snapshot_matches_fresh_walk(self):
+        """Test that the tree drawn from a snapshot matches a direct walk."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.makedirs(os.path.join(tmpdir, "a", "b"))
+            open(os.path.join(tmpdir, "a", "b", "c.py"), "w").close()
+            open(os.path.join(tmpdir, "top.py"), "w").close()
+
+            tree_gen = DirectoryTreeGenerator()
+            snapshot = DirectorySnapshot.scan(tmpdir, tree_gen.exclude_dirs)
+
+            assert tree_gen.generate(tmpdir, snapshot=snapshot) == tree_gen.generate(
+                tmpdir
+            )
+
+    def test_aggregate_code_walks_once(self):
+        """Test that tree, file selection and metadata share one walk."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, "test.py"), "w") as f:
+                f.write("# comment\nprint('hi')\n")
+
+            aggregator = CodeAggregator(directory=tmpdir, collect_metadata=True)
+            with mock.patch(
+                "promptprep.scanner.os.scandir", side_effect=os.scandir
+            ) as mock_scandir:
+                result = aggregator.aggregate_code()
+
+            assert mock_scandir.call_count == 1
+            assert "print('hi')" in result
+            assert "Codebase Metadata" in result
@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Only needed by some runs, so they must not be loaded just by starting the CLI
+LAZY_MODULES = {
+    "tiktoken",
+    "tqdm",
+    "pygments",
+    "difflib",
+    "ast",
+    "tokenize",
+    "concurrent.futures",
+    "multiprocessing",
+    "importlib.metadata",
+}
+
+# Generous, so slow CI machines pass; a regression to eager imports costs far more
+MAX_STARTUP_SECONDS = 1.0
+
+
+def import_times(module):
+    """Imports module in a fresh interpreter and returns {name: cumulative µs}.
+
+    Uses python -X importtime. Modules loaded while the interpreter itself
+    starts up (anything up to and including site) are left out.
+    """
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = os.environ.copy()
+    env["PYTHONPATH"] = project_root
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    assert result.returncode == 0, result.stderr
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # The header line
+        if name.strip() == "site":
+            times = {}
+            continue
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.fixture(scope="module")
+def cli_import_times():
+    return import_times("promptprep.cli")
+
+
+def test_cli_does_not_import_heavy_dependencies(cli_import_times):
+    """Starting the CLI shouldn't load tokenizers, progress bars or highlighters."""
+    loaded = {
+        name
+        for name in cli_import_times
+        if name in LAZY_MODULES or name.split(".")[0] in LAZY_MODULES
+    }
+    assert not loaded
+
+
+def test_cli_import_time(cli_import_times):
+    """Guards the cold-start cost of the CLI entry point."""
+    assert "promptprep.cli" in cli_import_times
+    assert cli_import_times["promptprep.cli"] < MAX_STARTUP_SECONDS * 1_000_000
@@ -138,11 +138,15 @@ class TestFileSelector:
             else:
                 # Second call after directory change - return mock files
                 # The actual function will add '..' for parent directory navigation
-                return ["mock_file"]
+                entry = mock.Mock(path=os.path.join(parent_path, "mock_file"))
+                entry.is_dir.return_value = False
+                listing = mock.MagicMock()
+                listing.__enter__.return_value = iter([entry])
+                return listing
 
-        # Mock os.listdir to simulate permission error and os.path.dirname for navigation
+        # Mock os.scandir to simulate permission error and os.path.dirname for navigation
         with (
-            mock.patch("os.listdir", side_effect=mock_get_contents),
+            mock.patch("os.scandir", side_effect=mock_get_contents),
             mock.patch("os.path.dirname", return_value=parent_path),
         ):
             # Call should handle the permission error and update directory